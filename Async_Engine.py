@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+"""
+Reads every sensor from a single asyncio event loop, instead of giving each sensor its own thread.
+
+Each serial port is opened without blocking and watched by the event loop, which wakes up only when a port has data.
+The data is handed to a coroutine for each sensor which parses it with the sensor's own Batch method,
+and puts the readings into the same pipeline the database writer drains.
+Nothing on the event loop blocks: when the pipeline is full and a sensor's overload policy is to wait for room,
+the wait happens in a worker thread, so only that sensor's coroutine waits and every other sensor is still read.
+"""
+
+try:
+    import asyncio
+except ImportError as message:
+    print("Failed to import asyncio, maybe it is not installed correctly? Error was: {}".format(message))
+
+from queue import Full
+
+try:
+    import serial
+except ImportError as message:
+    print("Failed to import serial, maybe it is not installed correctly? Error was: {}".format(message))
+
+
+class AsyncSensorReader(object):
+    """
+    Connects one sensor's serial port to the event loop.
+
+    When the event loop sees data waiting on the port, everything waiting is read straight away and put on a queue
+    for the sensor's coroutine to parse.
+    """
+
+    def __init__(self, sensorObject, serialReader, sensorType, sensorID):
+        self.sensorObject = sensorObject
+        self.serialReader = serialReader
+        self.sensorType = sensorType
+        self.sensorID = sensorID
+        self.chunks = asyncio.Queue()
+
+    def DataWaiting(self):
+        """
+        Called by the event loop when the serial port can be read from.
+        A None on the queue tells the coroutine the port has failed.
+        """
+        try:
+            bitOfData = self.serialReader.read(max(1, self.serialReader.in_waiting))
+            if(len(bitOfData) > 0):
+                self.chunks.put_nowait(bitOfData)
+        except serial.SerialException as message:
+            print("Did not read data from sensor {} ID:{} properly, error was: {}".format(self.sensorType, self.sensorID, message))
+            self.chunks.put_nowait(None)
+
+    async def Run(self, pipeline):
+        """
+        Coroutine which parses the data read from the sensor and puts the readings from each read into the pipeline as one batch,
+        until the serial port fails or the coroutine is cancelled.
+
+        Each batch is put without blocking. If the pipeline is full and the sensor's policy is to wait for room,
+        the put is handed to a worker thread and awaited, so the event loop carries on reading the other sensors.
+        """
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.serialReader.fileno(), self.DataWaiting)
+        try:
+            while True:
+                bitOfData = await self.chunks.get()
+                if(bitOfData is None):
+                    break
+                batch = self.sensorObject.Batch(bitOfData)
+                if(batch is not None):
+                    try:
+                        pipeline.put(batch, block=False)
+                    except Full:
+                        await loop.run_in_executor(None, pipeline.put, batch)
+        finally:
+            loop.remove_reader(self.serialReader.fileno())
+            self.serialReader.close()
+            print("Async reader {} ID:{} has stopped.".format(self.sensorType, self.sensorID))
+
+
+async def RunSensors(asyncSensors, pipeline, endEvent):
+    """
+    Coroutine which runs a reader for each sensor until the end event is set.
+    """
+    loop = asyncio.get_running_loop()
+    readers = []
+    for sensorObject, serialReader, sensorType, sensorID in asyncSensors:
+        reader = AsyncSensorReader(sensorObject, serialReader, sensorType, sensorID)
+        readers.append(asyncio.ensure_future(reader.Run(pipeline)))
+
+    # The end event is a threading event, so wait for it in a worker thread rather than on the event loop.
+    await loop.run_in_executor(None, endEvent.wait)
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    print("Async engine received end event. Exiting.")
+
+
+def AsyncEngine(asyncSensors, pipeline, endEvent):
+    """
+    Run every sensor passed in on one event loop in the calling thread, until the end event is set.
+
+    asyncSensors is a list of [sensor object, serial port opened with a timeout of 0, sensor type, sensor ID].
+    """
+    asyncio.run(RunSensors(asyncSensors, pipeline, endEvent))
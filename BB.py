@@ -45,74 +45,8 @@ class BB(BBX):
 
     The waiting timer is adjusted to avoid unnecessary CPU usage on the Raspberry Pi.
     """
-    def __init__(self, port):
-        self.port = port
-
-    def Reading(self):
-        """
-        Generator function to read in data from the sensor.
-        
-        Uses a time taken per line read formula to adjust the time to wait between making checks.
-
-        Reads in all the data in the buffer, then splits it up into lines, and processs them individually.
-        
-        """
-        # Initialise values
-        leftoverData = ""
-        lineOfData = b''
-        bitOfData = b''
-        numberOfChecksToMake = 10
-        timeToSleep = 1
-        targetChecksPerLine = 1.3
-        targetLinesPerCheck = 1/targetChecksPerLine
-
-        try:
-            myPort = '/dev/'+self.port
-            ser = serial.Serial(myPort,self.baudRate,timeout=self.timeoutLength)
-            #ser = DummyBBSensor()
-
-            while True:  
-
-                lineCount = 0          
-                # The number of checks to make 
-                for i in range(numberOfChecksToMake):
-                    time.sleep(timeToSleep)
-                    # This if statement is specific for this sensor, everything else here can be used with other sensors.
-                    if ser.in_waiting != 0:
-                        bitOfData = ser.read(ser.in_waiting)
-                        lineOfData = lineOfData + bitOfData
-                        bitOfData = ""
-                        # Checking if there is a carrage return and new line in the line, as that is used to signal the end of a reading.
-                        if(b"\r\n" in lineOfData):                                 
-                            #break up by /r/n              
-                            stringLine = lineOfData.decode('utf-8')
-                            listOfLines = stringLine.split("\r\n")
-                            # If there is more than one item in the list, it may not be full so store the last bit and add it on to the next reading
-                            if(len(listOfLines) > 1):
-                                listOfLines[0] = leftoverData + listOfLines[0]
-                                leftoverData = listOfLines[-1]                  
-                                del listOfLines[-1]
-                            # If there is something in the list yield the line back to sensor manager
-                            if(len(listOfLines) > 0):
-                                for singleLine in listOfLines:
-                                    lineCount += 1
-                                    stringLine = singleLine.split()
-                                    yield (stringLine)
-                                lineOfData = b"" 
-                        else:
-                            pass
-                
-                linesPerCheck = lineCount / numberOfChecksToMake
-            
-                print("Time of {}s gave us {} lines per check".format(timeToSleep, linesPerCheck ))
-                #Formula for new timer.
-                newtimeToSleep = timeToSleep * ( targetLinesPerCheck / linesPerCheck )
-
-                timeToSleep = newtimeToSleep
-                if(numberOfChecksToMake < 100):
-                    numberOfChecksToMake += 10
-        
-        except ValueError as message:
-            print("Did not manage to connect to sensor properly, check your settings. Error was: {}".format(message))
-        except serial.SerialException as message:
-            print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
\ No newline at end of file
+    sensorType = "BB"
+    #            date  time  scattering reference  scattering signal  thermistor
+    fieldTypes = (str, str,  int,                  int,               int)
+    def __init__(self, port, readMode="poll"):
+        super().__init__(port, readMode)
@@ -42,77 +42,18 @@ class BB3(BBX):
 
     The waiting timer is adjusted to avoid unnecessary CPU usage on the Raspberry Pi.
     """
+    sensorType = "BB3"
+    # The date is replaced with a date object by ParseLine, which str turns back into yyyy-mm-dd for the database.
+    #            date  time  wavelength  value  wavelength  value  wavelength  value  temperature
+    fieldTypes = (str, str,  int,        int,   int,        int,   int,        int,   int)
 
-    def __init__(self, port):
-        self.port = port
+    def __init__(self, port, readMode="poll"):
+        super().__init__(port, readMode)
 
-    def Reading(self):
+    def ParseLine(self, singleLine):
         """
-        Generator function to read in data from the sensor.
-        
-        Uses a time taken per line read formula to adjust the time to wait between making checks.
-
-        Reads in all the data in the buffer, then splits it up into lines, and processs them individually.
-        
+        Split a line from the BB3 into its values, replacing the date with today's date.
         """
-        # Initialise values
-        leftoverData = ""
-        lineOfData = b''
-        bitOfData = b''
-        numberOfChecksToMake = 10
-        timeToSleep = 1
-        targetChecksPerLine = 1.3
-        targetLinesPerCheck = 1/targetChecksPerLine
-
-        try:
-            myPort = '/dev/'+self.port
-            serialReader = serial.Serial(myPort,self.baudRate,timeout=self.timeoutLength)
-            #serialReader = DummyBB3Sensor()
-
-            # Endlessly read data from the sensor until the reading object has been ended in the sensor manager.
-            while True:  
-
-                lineCount = 0          
-                # The number of checks to make 
-                for i in range(numberOfChecksToMake):
-                    time.sleep(timeToSleep)
-                    # This if statement is specific for this sensor, everything else here can be used with other sensors.
-                    if serialReader.in_waiting != 0:
-                        bitOfData = serialReader.read(serialReader.in_waiting)
-                        lineOfData = lineOfData + bitOfData
-                        bitOfData = ""
-                        # Checking if there is a carrage return and new line in the line, as that is used to signal the end of a reading.
-                        if(b"\r\n" in lineOfData):                                 
-                            #break up by /r/n              
-                            stringLine = lineOfData.decode('utf-8')
-                            listOfLines = stringLine.split("\r\n")
-                            # If there is more than one item in the list, it may not be full so store the last bitOfData and add it on to the next reading
-                            if(len(listOfLines) > 1):
-                                listOfLines[0] = leftoverData + listOfLines[0]
-                                leftoverData = listOfLines[-1]                  
-                                del listOfLines[-1]
-                            # If there is something in the list yield the line back to sensor manager
-                            if(len(listOfLines) > 0):
-                                for singleLine in listOfLines:
-                                    lineCount += 1
-                                    stringLine = singleLine.split()
-                                    stringLine[0] = datetime.date.today()
-                                    yield (stringLine)
-                                lineOfData = b"" 
-                        else:
-                            pass
-                
-                linesPerCheck = lineCount / numberOfChecksToMake
-            
-                print( "Time of {}s gave us {} lines per check".format(timeToSleep, linesPerCheck ))
-                #Formula for new timer.
-                newtimeToSleep = timeToSleep * ( targetLinesPerCheck / linesPerCheck )
-
-                timeToSleep = newtimeToSleep
-                if(numberOfChecksToMake < 100):
-                    numberOfChecksToMake += 10
-        
-        except ValueError as message:
-            print("Did not manage to connect to sensor properly, check your settings. Error was: {}".format(message))
-        except serialReader.serialReaderException as message:
-            print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
\ No newline at end of file
+        stringLine = singleLine.split()
+        stringLine[0] = datetime.date.today()
+        return stringLine
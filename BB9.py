@@ -35,10 +35,37 @@ try:
 except ImportError as message:
     print("Failed to import DummyBB9Sensor from dummy_sensors, maybe file is missing? Error was: {}".format(message))
 
-try:
-    from functools import reduce
-except ImportError as message:
-    print("Failed to import reduce from functools. Error message was {}.".format(message))
+
+def FrameChecksum(body):
+    """
+    Return the checksum of the start of a BB9 frame as the meter writes it, the sum of its bytes in lower case hex.
+    body is the bytes of the frame up to and including the tab before the checksum, as bytes, a bytearray or a memoryview.
+    """
+    return "{:x}".format(sum(body))
+
+
+def CheckFrame(frame):
+    """
+    Return True if one BB9 frame, as text or bytes without its terminator, ends with the checksum of the rest of it.
+    """
+    if(isinstance(frame, str)):
+        frame = frame.encode("utf-8")
+    frame = frame.strip()
+    tab = frame.rfind(b"\t") + 1
+    return frame[tab:] == FrameChecksum(frame[:tab]).encode("ascii")
+
+
+def CheckFrames(buffer, terminator=b"\r\n"):
+    """
+    Check every complete frame in a buffer of many BB9 frames, as read from the serial port or a capture of it,
+    returning True or False for each in order. Anything after the last terminator is left out.
+    The buffer is split once and each frame is checked in one pass of a comprehension, so no text is decoded.
+    """
+    frames = bytes(buffer).split(terminator)
+    del frames[-1]
+    # Whitespace around a frame isn't part of it, as ParseLine strips it.
+    return [written.strip() == b"%x" % (sum(body.lstrip()) + sum(tab))
+            for body, tab, written in [frame.rpartition(b"\t") for frame in frames]]
 
 
 class BB9(BBX):
@@ -49,108 +76,35 @@ class BB9(BBX):
 
     Reads in all the data in the buffer, then splits it up into lines, and processes them individually.
     """
+    sensorType = "BB9"
+    #            header  meter type  columns  packet version  record counter  9 wavelength and signal pairs  checksum
+    fieldTypes = (str,   str,        int,     int,            int) + (int,) * 18 + (str,)
 
-    def __init__(self, port):
-        self.port = port
+    def __init__(self, port, readMode="poll"):
+        super().__init__(port, readMode)
 
     def CreateChecksum(self, currentLine):
-
         """
-        calculates the checksum based off the rest of the data bassed in.
-                    
-        :param self: DESCRIBE PARAMETERE
-        :param type: PARAMTER TYPE
-
-        :param  currentLine: DESCRIBE PARAMETERE
-        :param type: PARAMTER TYPE
+        Return the checksum of a frame split into its fields, leaving out the checksum itself,
+        as it is the sum of the bytes of each field followed by a tab.
         """
-        delim = '\t'
-        line = reduce(lambda x,y: str(x) + delim + str(y), currentLine, "" )
-        # now reduce wasn't a perfect choice due to our inital value
-        # so we still need to move the \t from the begining to the end
-        #line = line[1:] + "\t" ## actually we don't as addition is commuatble
-        stringList = list( line )
-        byteList   = list( map( ord, stringList ))
-        #hexList = list(map( lambda x: hex(x), byteList ))
-        checkSum = reduce(lambda x,y: x + y, byteList, 0)
-        hexSum = "{:x}".format(checkSum)
-        return hexSum
-
-    def Reading(self):
+        return FrameChecksum("".join([str(field) + "\t" for field in currentLine]).encode("utf-8"))
 
+    def ParseLine(self, singleLine):
         """
-        Generator function to read in data from the sensor.
-
-        Uses a time taken per line read formula to adjust the time to wait between making checks.
-
-        Reads in all the data in the buffer, then splits it up into lines, and processes them individually.   
+        Split a line from the BB9 into its values, and check it against its checksum.
+        The header and meter type are split into separate values.
+        Raises ValueError if the line is currupted, so it is quarantined.
         """
-
-        #Initialise values
-        leftoverData = ""
-        lineOfData = b''
-        bitOfData = b''
-        numberOfChecksToMake = 10
-        timeToSleep = 1
-        targetCheckPerLine = 1.3
-        targetLinePerCheck = 1 / targetCheckPerLine
-
-        try:
-            myPort = '/dev/'+self.port
-            serialReader = serial.Serial(myPort,self.baudRate,timeout=self.timeoutLength)
-            #serialReader = DummyBB9Sensor()
-
-            # Constantly run the loop to read data from the sensor.
-            while True:
-                lineCount = 0
-                # The number of checks to make
-                for i in range(numberOfChecksToMake):
-                    time.sleep(timeToSleep)
-                    
-                    # If there is any data in the buffer continue
-                    if serialReader.in_waiting != 0:
-                        bitOfData = serialReader.read(serialReader.in_waiting)
-                        lineOfData = lineOfData + bitOfData
-                        bitOfData = b""
-                        
-                        # If there is a full line in the data taken out of the buffer
-                        if(b"\r\n" in lineOfData):
-                            stringLine = lineOfData.decode('utf-8')
-                            listOfLines = stringLine.split("\r\n")
-                            
-                            # Check if there is any data from the next line stored, if so put it on the next item.
-                            if(len(listOfLines) > 1):
-                                listOfLines[0] = leftoverData + listOfLines[0]
-                                leftoverData = listOfLines[-1]
-                                del listOfLines[-1]
-                            
-                            # For each line of data stored (one or more), yield it off to the sensor manager.
-                            if(len(listOfLines) > 0):
-                                for singleLine in listOfLines:
-                                    lineCount += 1
-                                    stringLine = singleLine.split()
-                                    checkSum = self.CreateChecksum(stringLine[0:len(stringLine)-1])
-                                    if(stringLine[-1] == checkSum):
-                                        HeaderAndMeterType = stringLine[0].split("_")
-                                        stringLine.inserialReadert(0, HeaderAndMeterType[0])
-                                        stringLine.inserialReadert(1, HeaderAndMeterType[1])
-                                        del stringLine[2]
-                                        yield (stringLine)
-                                    else:
-                                        print("Line of data is currupted.")
-                                lineOfData = b""
-                        else:
-                            pass
-                
-                # Calculate the time needed to wait between checking the buffer, and adjust accordingly
-                linesPerCheck = lineCount / numberOfChecksToMake
-                print("Time of {}s gave us {} lines per check".format(timeToSleep, linesPerCheck))
-                newTimeToSleep = timeToSleep * (targetLinePerCheck / linesPerCheck)
-                timeToSleep = newTimeToSleep
-                if(numberOfChecksToMake < 100):
-                    numberOfChecksToMake += 10
-
-        except ValueError as message:
-            print("Did not manage to connect to sensor properly, check your settings. Error was: {}".format(message))
-        except serialReader.serialReaderialException as message:
-            print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
+        # The checksum is summed straight off the bytes before the last tab, rather than from the fields once they are split.
+        body, tab, written = singleLine.strip().rpartition("\t")
+        checkSum = FrameChecksum((body + tab).encode("utf-8"))
+        if(written == checkSum):
+            stringLine = singleLine.split()
+            HeaderAndMeterType = stringLine[0].split("_")
+            stringLine.insert(0, HeaderAndMeterType[0])
+            stringLine.insert(1, HeaderAndMeterType[1])
+            del stringLine[2]
+            return stringLine
+        else:
+            raise ValueError("checksum {} does not match {}".format(written, checkSum))
@@ -1,8 +1,264 @@
+try:
+    import serial
+except ImportError as message:
+    print("Failed to import serial, maybe it is not installed correctly? Error was: {}".format(message))
+
+try:
+    import time
+except ImportError as message:
+    print("Failed to import time, maybe it is not installed correctly? Error was: {}".format(message))
+
+try:
+    from Sensor_Record import SensorRecord, SensorBatch
+except ImportError as message:
+    print("Failed to import SensorRecord and SensorBatch from Sensor_Record, maybe file is missing? Error was: {}".format(message))
+
+
+def ReadChunks(serialReader):
+    """
+    Generator which blocks on the serial port until data arrives, then yields everything that is waiting in the buffer.
+
+    The read blocks for at most the timeout the port was opened with. If nothing arrives in that time an empty bytes is yielded,
+    so a caller reading a quiet sensor still gets a chance to stop every timeout, but no time is spent sleeping
+    or checking an empty buffer in between.
+    """
+    while True:
+        # read blocks until at least one byte has arrived, then take the rest of what is waiting along with it.
+        yield serialReader.read(max(1, serialReader.in_waiting))
+
+
+class LineFramer(object):
+    """
+    Splits the data read from a sensor into lines, holding it in one reusable bytearray.
+
+    Data is added to the end of the buffer as it is read, and each search for a terminator starts where the last one
+    stopped, so nothing is searched or copied twice however small the pieces the data arrives in.
+    The lines are handed back as memoryview slices of the buffer rather than copies.
+    """
+
+    def __init__(self, terminator=b"\r\n"):
+        self.terminator = terminator
+        self.buffer = bytearray()
+        # Where the next search for a terminator starts, everything before it has already been searched.
+        self.scanFrom = 0
+
+    def Frames(self, bitOfData):
+        """
+        Generator which adds the data read to the buffer and yields a memoryview of each complete line, without its terminator.
+
+        Each memoryview is released once the next one is asked for, so anything that needs keeping must be copied
+        or decoded out of it first. Once every line has been handed back the buffer is trimmed to the incomplete line left over.
+        """
+        self.buffer += bitOfData
+        terminatorLength = len(self.terminator)
+        start = 0
+        try:
+            with memoryview(self.buffer) as view:
+                while True:
+                    end = self.buffer.find(self.terminator, self.scanFrom)
+                    if(end == -1):
+                        # A terminator could be split across this read and the next, so search the end of this one again.
+                        self.scanFrom = max(start, len(self.buffer) - terminatorLength + 1)
+                        break
+                    frame = view[start:end]
+                    start = end + terminatorLength
+                    self.scanFrom = start
+                    try:
+                        yield frame
+                    finally:
+                        frame.release()
+        finally:
+            # Drop the lines that have been handed back, keeping anything not yet handed back.
+            del self.buffer[:start]
+            self.scanFrom -= start
+
+
 class BBX(object):
-    def __init__(self):
+    """
+    Base class for the wetlabs sensors which send one line of data at a time, ending in a carriage return and new line.
+
+    readMode selects how the serial port is read:
+    poll sleeps between checks of the buffer, adjusting the time it sleeps to how often lines arrive.
+    blocking waits on the serial port and hands each line on as soon as its terminator arrives.
+
+    Readings are handed on as SensorRecords, tagged with the sensor's type and its ID in the Sensors table.
+    Subclasses set fieldTypes to the type of each field in a parsed line, so the values are converted to int or float once, as they are read.
+    Lines which can't be parsed or converted are counted in malformed and handed on as a record for the Quarantine table.
+    BatchReading hands on every reading completed by one read of the serial port together in a SensorBatch,
+    Reading hands them on one at a time.
+    """
+    terminator = b"\r\n"
+    sensorType = None
+    fieldTypes = None
+
+    def __init__(self, port=None, readMode="poll"):
         self.USB_PORT = '/dev/ttyUSB0'
         self.baudRate = 19200
         self.timeoutLength = 1
+        self.port = port
+        self.readMode = readMode
+        self.sensorID = None
+        self.framer = LineFramer(self.terminator)
+        self.malformed = 0
+
+    def OpenPort(self, timeout=None):
+        """
+        Open the serial port this sensor is plugged into.
+        The timeout defaults to the sensor's own, a timeout of 0 opens the port without blocking.
+        """
+        if(timeout is None):
+            timeout = self.timeoutLength
+        myPort = '/dev/'+self.port
+        return serial.Serial(myPort,self.baudRate,timeout=timeout)
+
+    def Frames(self, bitOfData):
+        """
+        Add the data read from the sensor onto anything left over from the last read,
+        and return every complete line in it as text. The incomplete end of the data is kept for next time.
+        """
+        # Bytes which aren't utf-8 are replaced rather than stopping the reader, and the line is quarantined when it fails to parse.
+        return [str(frame, 'utf-8', 'replace') for frame in self.framer.Frames(bitOfData)]
+
+    def ParseLine(self, singleLine):
+        """
+        Turn a line of text from the sensor into the list of values sent to the sensor manager.
+        Returns None if the line should be skipped, and raises ValueError if it is malformed.
+        """
+        return singleLine.split()
+
+    def TypeFields(self, stringLine):
+        """
+        Convert each field of a parsed line to the type in fieldTypes, and return them as a tuple.
+        Any fields after the ones in fieldTypes are kept as they are.
+        Raises ValueError if the line has too few fields, or a field can't be converted.
+        """
+        if(self.fieldTypes is None):
+            return tuple(stringLine)
+        if(len(stringLine) < len(self.fieldTypes)):
+            raise ValueError("line has {} of {} fields".format(len(stringLine), len(self.fieldTypes)))
+        # Well formed lines are converted in one pass, the fields are only looked at one by one to say which failed.
+        try:
+            values = [fieldType(value) for fieldType, value in zip(self.fieldTypes, stringLine)]
+        except (TypeError, ValueError):
+            for index, (fieldType, value) in enumerate(zip(self.fieldTypes, stringLine)):
+                try:
+                    fieldType(value)
+                except (TypeError, ValueError):
+                    raise ValueError("field {} is {!r}, expected {}".format(index, value, fieldType.__name__))
+            raise
+        values.extend(stringLine[len(self.fieldTypes):])
+        return tuple(values)
+
+    def Record(self, stringLine):
+        """
+        Wrap a parsed line of data in the record it travels through the pipeline in.
+        """
+        return SensorRecord(self.sensorType, self.sensorID, self.TypeFields(stringLine))
+
+    def Quarantine(self, singleLine, reason):
+        """
+        Count a malformed line, and wrap it in a record for the Quarantine table along with why it was rejected.
+        """
+        self.malformed += 1
+        return SensorRecord("Quarantine", self.sensorID, (self.sensorType, singleLine, str(reason)))
+
+    def Feed(self, bitOfData):
+        """
+        Take the next piece of data read from the sensor, and return a list of records for every reading it completed.
+        """
+        readings = []
+        for singleLine in self.Frames(bitOfData):
+            if(singleLine.strip() == ""):
+                continue
+            try:
+                stringLine = self.ParseLine(singleLine)
+                if(stringLine is not None):
+                    readings.append(self.Record(stringLine))
+            except (IndexError, ValueError) as message:
+                readings.append(self.Quarantine(singleLine, message))
+        return readings
+
+    def Batch(self, bitOfData):
+        """
+        Take the next piece of data read from the sensor, and return a batch of every reading it completed,
+        or None if it did not complete any.
+        """
+        readings = self.Feed(bitOfData)
+        if(len(readings) == 0):
+            return None
+        return SensorBatch(self.sensorType, self.sensorID, readings)
+
+    def BlockingReading(self):
+        """
+        Generator function which blocks on the serial port and yields a batch of readings as soon as a line is complete.
+        Yields None when a read times out without completing a reading, so the caller can check whether to stop.
+        """
+        try:
+            serialReader = self.OpenPort()
+            for bitOfData in ReadChunks(serialReader):
+                yield self.Batch(bitOfData)
+
+        except ValueError as message:
+            print("Did not manage to connect to sensor properly, check your settings. Error was: {}".format(message))
+        except serial.SerialException as message:
+            print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
+
+    def PollingReading(self, serialReader):
+        """
+        Generator function which checks the serial port for data every so often, and yields a batch of the readings in it.
+        Yields None after a check which completed no readings, so the caller can check whether to stop.
+
+        Uses a time taken per line read formula to adjust the time to wait between making checks,
+        to avoid unnecessary CPU usage on the Raspberry Pi.
+        """
+        numberOfChecksToMake = 10
+        timeToSleep = 1
+        targetChecksPerLine = 1.3
+        targetLinesPerCheck = 1/targetChecksPerLine
+
+        while True:
+            lineCount = 0
+            # The number of checks to make
+            for i in range(numberOfChecksToMake):
+                time.sleep(timeToSleep)
+                batch = None
+                if serialReader.in_waiting != 0:
+                    batch = self.Batch(serialReader.read(serialReader.in_waiting))
+                    if(batch is not None):
+                        lineCount += batch.Count()
+                yield batch
+
+            linesPerCheck = lineCount / numberOfChecksToMake
+            print( "Time of {}s gave us {} lines per check".format(timeToSleep, linesPerCheck ))
+            #Formula for new timer. If no lines came in keep the same timer, rather than dividing by zero.
+            if(linesPerCheck > 0):
+                newtimeToSleep = timeToSleep * ( targetLinesPerCheck / linesPerCheck )
+                timeToSleep = newtimeToSleep
+            if(numberOfChecksToMake < 100):
+                numberOfChecksToMake += 10
+
+    def BatchReading(self):
+        """
+        Generator function to read in data from the sensor, either polling or blocking on the serial port depending on readMode,
+        yielding a batch of every reading completed by each read, or None when a read completed none.
+        """
+        if(self.readMode == "blocking"):
+            yield from self.BlockingReading()
+            return
+
+        try:
+            serialReader = self.OpenPort()
+            yield from self.PollingReading(serialReader)
+
+        except ValueError as message:
+            print("Did not manage to connect to sensor properly, check your settings. Error was: {}".format(message))
+        except serial.SerialException as message:
+            print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
 
     def Reading(self):
-        pass 
\ No newline at end of file
+        """
+        Generator function to read in data from the sensor one reading at a time.
+        """
+        for batch in self.BatchReading():
+            if(batch is not None):
+                yield from batch.Records()
@@ -0,0 +1,125 @@
+#! /usr/bin/env python3
+"""
+Benchmarks for the hot paths of the sensor recorder, run from the command line:
+
+    python3 Benchmarks.py
+
+Uses the dummy sensors to make realistic lines of data, so no sensors need to be plugged in.
+"""
+
+import time
+import tracemalloc
+
+from dummy_sensors import DummyBB9Sensor, DummyGPS
+from Sensor_Record import SensorRecord, SensorBatch
+from BB9 import BB9
+from GPS_ublox7 import GPS_UBLOX7
+from BB9 import CheckFrame, CheckFrames
+from NMEA_Parser import NMEAParser
+
+
+def BytesPerItem(makeItems, count):
+    """
+    Measure how many bytes of memory are held per item by the list of count items makeItems returns.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = makeItems(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def RecordMemoryBenchmark(count=20000, batchSize=20):
+    """
+    Compare the bytes per queued reading of the old [sensorType, values, sensorID] lists, of one SensorRecord per reading,
+    and of SensorBatches of batchSize readings, for parsed BB9 lines and GPS fixes.
+    """
+    # The readings are parsed inside each measurement, so only what the items keep hold of is counted.
+    bb9Data = b"".join(DummyBB9Sensor()._genLine() for _ in range(count))
+    gpsData = b"".join(DummyGPS()._genLine() for _ in range(count + 1))
+
+    results = []
+    for sensorType, driver, data in (("BB9", BB9, bb9Data), ("GPS_UBLOX7", GPS_UBLOX7, gpsData)):
+        def ListItems(n):
+            return [[sensorType, list(record.values), 1] for record in driver(None).Feed(data)[:n]]
+
+        def RecordItems(n):
+            return driver(None).Feed(data)[:n]
+
+        def BatchItems(n):
+            records = driver(None).Feed(data)[:n]
+            return [SensorBatch(sensorType, 1, records[start:start + batchSize]) for start in range(0, n, batchSize)]
+
+        listBytes = BytesPerItem(ListItems, count)
+        recordBytes = BytesPerItem(RecordItems, count)
+        batchBytes = BytesPerItem(BatchItems, count)
+        results.append((sensorType, listBytes, recordBytes, batchBytes))
+        print("{}: list item {:.0f} bytes per reading, SensorRecord {:.0f} ({:.0f}% smaller), packed SensorBatch of {} {:.0f} ({:.0f}% smaller)".format(
+            sensorType, listBytes, recordBytes, 100 * (listBytes - recordBytes) / listBytes,
+            batchSize, batchBytes, 100 * (listBytes - batchBytes) / listBytes))
+    return results
+
+
+def FramesPerSecond(check, frames, repeat=5):
+    """
+    Time check over every frame in the list, returning the best of repeat runs in frames per second.
+    """
+    best = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        for frame in frames:
+            check(frame)
+        elapsed = time.perf_counter() - startTime
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best
+
+
+def ChecksumBenchmark(count=20000):
+    """
+    Compare how many BB9 frames a second the checksum checks one frame at a time, as text and as bytes, and over a buffer of frames.
+    That they agree with the checksum as it was first worked out is checked by tests/test_bb9_checksum.py.
+    """
+    bb9 = DummyBB9Sensor()
+    frames = [bb9._genLine() for _ in range(count)]
+    lines = [frame.decode("utf-8").rstrip("\r\n") for frame in frames]
+    rawFrames = [frame.rstrip(b"\r\n") for frame in frames]
+    buffer = b"".join(frames)
+
+    textRate = FramesPerSecond(CheckFrame, lines)
+    bytesRate = FramesPerSecond(CheckFrame, rawFrames)
+    batchRate = FramesPerSecond(CheckFrames, [buffer]) * count
+    print("BB9 checksum: text {:.0f} frames/s, bytes {:.0f} frames/s, buffer of frames {:.0f} frames/s ({:.1f}x text)".format(
+        textRate, bytesRate, batchRate, batchRate / textRate))
+    return textRate, bytesRate, batchRate
+
+
+def NMEAParserBenchmark(counts=(1000, 10000), chunkSize=64):
+    """
+    Feed a stream of count fixes from the dummy GPS to the NMEA parser chunkSize bytes at a time, as the serial port hands it over,
+    and report the fixes parsed a second. The rate stays the same however long the stream is, as each byte is only looked at once.
+    """
+    gps = DummyGPS()
+    fix = gps._genLine()
+    results = []
+    for count in counts:
+        stream = fix * count
+        parser = NMEAParser()
+        parsed = 0
+        startTime = time.perf_counter()
+        for start in range(0, len(stream), chunkSize):
+            fixes, rejected = parser.Feed(stream[start:start + chunkSize])
+            parsed += len(fixes)
+        elapsed = time.perf_counter() - startTime
+        if(parsed != count or parser.badChecksums != 0):
+            raise AssertionError("parsed {} of {} fixes with {} bad checksums".format(parsed, count, parser.badChecksums))
+        results.append((count, count / elapsed))
+        print("NMEA parser: {} fixes in {} byte reads, {:.0f} fixes/s".format(count, chunkSize, count / elapsed))
+    return results
+
+
+if __name__ == "__main__":
+    RecordMemoryBenchmark()
+    ChecksumBenchmark()
+    NMEAParserBenchmark()
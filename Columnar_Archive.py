@@ -0,0 +1,278 @@
+#! /usr/bin/env python3
+"""
+Archives the readings of closed time partitions in a columnar layout, which can be sliced without loading them into Python objects.
+
+Each archived partition is a directory named after the day it starts on, holding for every sensor table:
+    TABLE.json           the manifest: the time range, the number of rows, where each sensor's rows are and the type of each column
+    TABLE.timestamp.i8   the timestamps in milliseconds since the epoch, as one contiguous array of 64 bit integers
+    TABLE.sensor_ID.i8   the sensor ID of each row
+    TABLE.COLUMN.f8      each numeric column as one contiguous array of 64 bit floats, with NaN where the value was missing
+The rows are sorted by sensor and then by time, so one sensor's readings over any time range are a contiguous slice of every array.
+
+The exporter only needs the standard library. The reader maps the files with numpy.memmap if numpy is installed,
+and falls back to a memoryview of an mmap of the file otherwise.
+"""
+
+import os
+import sys
+import json
+import mmap
+import array
+import bisect
+import collections
+import datetime
+from sqlite3 import Error
+
+try:
+    import numpy
+except ImportError as message:
+    numpy = None
+    print("Failed to import numpy, archives will be read without it. Error was: {}".format(message))
+
+from Connection_Manager import manager
+from SQL_queries import timestampTables
+from SQL_queries import partitions
+from SQL_queries import EpochMillis
+
+# Column types sqlite tables declare for numbers, every other column is left out of the archive.
+NUMERIC_TYPES = ("NUMERIC", "INTEGER", "REAL")
+
+# The typecode for the array module and the dtype for numpy of each kind of file.
+fileTypes = {'i8': ('q', '<i8'), 'f8': ('d', '<f8')}
+
+
+def SegmentName(start):
+    """
+    The name of the directory holding the archive of the partition starting at start.
+    """
+    return datetime.datetime.fromtimestamp(start / 1000, datetime.timezone.utc).strftime("%Y%m%d")
+
+
+def NumericColumns(conn, schema, table):
+    """
+    Return the names of the numeric columns of a table, leaving out its key, sensor ID and timestamp which are archived separately.
+    """
+    columns = []
+    for column in conn.execute("PRAGMA {}.table_info({})".format(schema, table)):
+        name, declaredType = column[1], column[2].upper()
+        if(name in ("id", "EntryID", "sensor_ID", "timestamp")):
+            continue
+        if(declaredType in NUMERIC_TYPES):
+            columns.append(name)
+    return columns
+
+
+def ExportTable(conn, schema, table, start, end, directory, chunkSize=10000):
+    """
+    Write the rows of one table with a timestamp from start up to but not including end into columnar files in directory,
+    streaming them a chunk at a time so a whole partition never has to fit in memory. Returns the number of rows written.
+
+    A NUMERIC column can still hold text, such as a malformed reading written before fields were converted when parsed.
+    Values which aren't numbers are written as NaN, and how many there were in each column is printed.
+    """
+    columns = NumericColumns(conn, schema, table)
+    select = "SELECT {} FROM {}.{} WHERE timestamp >= (?) AND timestamp < (?) ORDER BY sensor_ID, timestamp".format(
+        ", ".join(["sensor_ID", "timestamp"] + columns), schema, table)
+    files = {'sensor_ID': 'i8', 'timestamp': 'i8'}
+    for column in columns:
+        files[column] = 'f8'
+
+    handles = {}
+    sensors = {}
+    rows = 0
+    notNumbers = collections.Counter()
+    try:
+        for column, kind in files.items():
+            handles[column] = open(os.path.join(directory, "{}.{}.{}".format(table, column, kind)), "wb")
+        cursor = conn.execute(select, (start, end))
+        while True:
+            chunk = cursor.fetchmany(chunkSize)
+            if(len(chunk) == 0):
+                break
+            sensorIDs = array.array('q')
+            timestamps = array.array('q')
+            values = [array.array('d') for column in columns]
+            for row in chunk:
+                sensorID = int(row[0])
+                if(sensorID not in sensors):
+                    sensors[sensorID] = [rows + len(sensorIDs), 0]
+                sensors[sensorID][1] += 1
+                sensorIDs.append(sensorID)
+                timestamps.append(row[1])
+                for index in range(len(columns)):
+                    value = row[index + 2]
+                    if(value is None):
+                        value = float("nan")
+                    else:
+                        try:
+                            value = float(value)
+                        except (TypeError, ValueError):
+                            notNumbers[columns[index]] += 1
+                            value = float("nan")
+                    values[index].append(value)
+            for column, data in zip(['sensor_ID', 'timestamp'] + columns, [sensorIDs, timestamps] + values):
+                if(sys.byteorder != "little"):
+                    data.byteswap()
+                data.tofile(handles[column])
+            rows += len(chunk)
+    finally:
+        for handle in handles.values():
+            handle.close()
+    for column, count in notNumbers.items():
+        print("Archived {} values of {}.{} which aren't numbers as NaN".format(count, table, column))
+
+    manifest = {
+        'table': table,
+        'start': start,
+        'end': end,
+        'rows': rows,
+        'sensors': {str(sensorID): offsetAndCount for sensorID, offsetAndCount in sensors.items()},
+        'columns': files
+    }
+    # The manifest is written last, so a half written archive is never read.
+    temporaryPath = os.path.join(directory, "{}.json.tmp".format(table))
+    with open(temporaryPath, "w") as manifestFile:
+        json.dump(manifest, manifestFile)
+    os.replace(temporaryPath, os.path.join(directory, "{}.json".format(table)))
+    return rows
+
+
+def ExportWindow(conn, schema, start, end, archiveDirectory):
+    """
+    Archive every sensor table of the database attached as schema, for the readings from start up to but not including end.
+    """
+    directory = os.path.join(archiveDirectory, SegmentName(start))
+    os.makedirs(directory, exist_ok=True)
+    for table in timestampTables:
+        rows = ExportTable(conn, schema, table, start, end, directory)
+        print("Archived {} rows of {} into {}".format(rows, table, directory))
+
+
+def ArchiveClosedPartitions(archiveDirectory):
+    """
+    Archive every partition which has ended and has not been archived yet. Returns the number of partitions archived.
+    A partition is left until rotateLead after it ends, since readings arriving late can still be written into it.
+    """
+    archived = 0
+    try:
+        with manager.Reader() as conn:
+            closed = conn.execute("SELECT path, startTime, endTime FROM Partitions WHERE endTime <= (?) ORDER BY startTime",
+                                  (EpochMillis() - partitions.rotateLead,)).fetchall()
+            for path, start, end in closed:
+                directory = os.path.join(archiveDirectory, SegmentName(start))
+                if(all(os.path.exists(os.path.join(directory, "{}.json".format(table))) for table in timestampTables)):
+                    continue
+                with partitions.Attached(conn, path):
+                    ExportWindow(conn, "part", start, end, archiveDirectory)
+                archived += 1
+    except Error as e:
+        print("Did not connect so couldn't archive partitions, error: {}".format(e))
+    return archived
+
+
+def ArchiveExporter(event, archiveDirectory, interval=3600):
+    """
+    Thread which archives closed partitions every interval seconds, until the end event is set.
+    """
+    while not event.is_set():
+        ArchiveClosedPartitions(archiveDirectory)
+        event.wait(interval)
+
+
+class ArchiveSegment(object):
+    """
+    One archived table of one partition, with its columns mapped into memory as they are asked for.
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.table = manifest['table']
+        self.start = manifest['start']
+        self.end = manifest['end']
+        self.columns = {}
+        self.maps = []
+
+    def Column(self, column):
+        """
+        Return a column of the segment as a numpy.memmap, or as a memoryview of the mapped file if numpy isn't installed.
+        """
+        if(column not in self.columns):
+            kind = self.manifest['columns'][column]
+            path = os.path.join(self.directory, "{}.{}.{}".format(self.table, column, kind))
+            if(self.manifest['rows'] == 0):
+                self.columns[column] = numpy.zeros(0, fileTypes[kind][1]) if numpy is not None else memoryview(array.array(fileTypes[kind][0]))
+            elif(numpy is not None):
+                self.columns[column] = numpy.memmap(path, dtype=fileTypes[kind][1], mode="r")
+            else:
+                with open(path, "rb") as columnFile:
+                    mapped = mmap.mmap(columnFile.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps.append(mapped)
+                self.columns[column] = memoryview(mapped).cast(fileTypes[kind][0])
+        return self.columns[column]
+
+    def Slice(self, sensorID, column, start, end):
+        """
+        Return the timestamps and values of one sensor's column from start up to but not including end, as views of the mapped files.
+        """
+        offset, count = self.manifest['sensors'].get(str(sensorID), [0, 0])
+        timestamps = self.Column('timestamp')[offset:offset + count]
+        values = self.Column(column)[offset:offset + count]
+        if(numpy is not None):
+            first, last = numpy.searchsorted(timestamps, [start, end])
+        else:
+            first, last = bisect.bisect_left(timestamps, start), bisect.bisect_left(timestamps, end)
+        return timestamps[first:last], values[first:last]
+
+
+class ArchiveReader(object):
+    """
+    Reads the columnar archive in archiveDirectory, finding the segments which overlap the time asked for from their manifests.
+    """
+
+    def __init__(self, archiveDirectory):
+        self.archiveDirectory = archiveDirectory
+        self.segments = {}
+
+    def Segments(self, table, start, end):
+        """
+        Return the archived segments of a table overlapping start to end, oldest first.
+        """
+        segments = []
+        if(not os.path.isdir(self.archiveDirectory)):
+            return segments
+        for name in sorted(os.listdir(self.archiveDirectory)):
+            manifestPath = os.path.join(self.archiveDirectory, name, "{}.json".format(table))
+            if(manifestPath not in self.segments):
+                if(not os.path.exists(manifestPath)):
+                    continue
+                with open(manifestPath) as manifestFile:
+                    self.segments[manifestPath] = ArchiveSegment(os.path.dirname(manifestPath), json.load(manifestFile))
+            segment = self.segments[manifestPath]
+            if(segment.start < end and segment.end > start):
+                segments.append(segment)
+        return segments
+
+    def Slices(self, table, sensorID, column, start, end):
+        """
+        Return a list of (timestamps, values) views, one for each segment overlapping start to end, without copying anything.
+        """
+        return [segment.Slice(sensorID, column, start, end) for segment in self.Segments(table, start, end)]
+
+    def Read(self, table, sensorID, column, start, end, step=1):
+        """
+        Return the timestamps and values of one sensor's column from start to end joined into single arrays, taking every step-th reading.
+        Returns numpy arrays if numpy is installed, otherwise arrays from the array module.
+        """
+        slices = self.Slices(table, sensorID, column, start, end)
+        if(numpy is not None):
+            if(len(slices) == 0):
+                return numpy.zeros(0, '<i8'), numpy.zeros(0, '<f8')
+            return (numpy.concatenate([timestamps[::step] for timestamps, values in slices]),
+                    numpy.concatenate([values[::step] for timestamps, values in slices]))
+        timestamps = array.array('q')
+        values = array.array('d')
+        for sliceTimestamps, sliceValues in slices:
+            timestamps.extend(sliceTimestamps[::step])
+            values.extend(sliceValues[::step])
+        return timestamps, values
@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+"""
+Keeps the connections to the sensor database open between queries.
+
+Opening a sqlite3 connection for every reading means paying for the connection set up and
+preparing the same statements again each time, so the SQL query functions borrow connections from here instead.
+
+Every connection, including the ones the web app opens, gets the pragma profile from the [database] section
+of the config file. By default the database is put in WAL mode, so the web app reading the latest values
+and the sensor manager writing new ones no longer block each other.
+"""
+
+import sqlite3
+import threading
+import time
+import queue
+import atexit
+from contextlib import contextmanager
+
+from configparser import ConfigParser
+
+parser = ConfigParser()
+
+#parser.read('/home/pi/sensor_recorder/Config.ini')
+parser.read('Config.ini')
+
+
+def PragmaProfile(parser):
+    """
+    Read the pragma profile from the [database] section of the config file, falling back to settings suited to the SD card.
+    """
+    # auto_vacuum has to be set before any tables are made, so it comes first.
+    return {
+        'auto_vacuum': parser.get('database', 'autoVacuum', fallback='INCREMENTAL'),
+        'journal_mode': parser.get('database', 'journalMode', fallback='WAL'),
+        'synchronous': parser.get('database', 'synchronous', fallback='NORMAL'),
+        'cache_size': parser.getint('database', 'cacheSize', fallback=-8000),
+        'mmap_size': parser.getint('database', 'mmapSize', fallback=67108864),
+        'busy_timeout': parser.getint('database', 'busyTimeout', fallback=5000),
+        'wal_autocheckpoint': parser.getint('database', 'checkpointPages', fallback=1000),
+        'journal_size_limit': parser.getint('database', 'journalSizeLimit', fallback=67108864)
+    }
+
+
+def ApplyPragmas(conn, profile):
+    """
+    Set every pragma in the profile on a connection.
+    """
+    for pragma, value in profile.items():
+        conn.execute("PRAGMA {} = {}".format(pragma, value))
+
+
+def Connect(database, profile, cachedStatements=128):
+    """
+    Open a new connection to the database which can be passed between threads, with the pragma profile applied.
+    """
+    conn = sqlite3.connect(database, check_same_thread=False, cached_statements=cachedStatements)
+    try:
+        ApplyPragmas(conn, profile)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+class ConnectionManager(object):
+    """
+    Owns one persistent writer connection and a small pool of reader connections to the database.
+
+    Connections are only opened the first time they are needed, and each keeps its cache of prepared statements,
+    so a query run again on the same connection does not have to be prepared again.
+    All writes go through the single writer connection, which is shared between threads behind a lock.
+
+    In WAL mode the log is checkpointed into the database by sqlite once it grows past the profile's wal_autocheckpoint pages,
+    and the writer also checkpoints it every checkpointInterval seconds. These checkpoints are passive, so they never wait for
+    a reader to finish while the writer lock is held, and the log is started again from the beginning by the next write once it
+    has all been copied, and cut back to the profile's journal_size_limit. The log is only truncated on Close.
+    """
+
+    def __init__(self, database, readerPoolSize=2, cachedStatements=128, profile=None, checkpointInterval=60):
+        self.database = database
+        self.readerPoolSize = readerPoolSize
+        self.cachedStatements = cachedStatements
+        self.profile = profile if profile is not None else {}
+        self.checkpointInterval = checkpointInterval
+        self.lastCheckpoint = time.monotonic()
+        self.writerConnection = None
+        self.writerLock = threading.RLock()
+        self.readerPool = queue.LifoQueue()
+        self.readerCount = 0
+        self.poolLock = threading.Lock()
+        self.openConnections = []
+
+    def Connect(self):
+        """
+        Open a new connection to the database which can be passed between threads.
+        """
+        conn = Connect(self.database, self.profile, self.cachedStatements)
+        with self.poolLock:
+            self.openConnections.append(conn)
+        return conn
+
+    @contextmanager
+    def Writer(self):
+        """
+        Borrow the writer connection for one transaction.
+
+        The transaction is committed when the block finishes, or rolled back if it raised an error.
+        """
+        with self.writerLock:
+            if(self.writerConnection is None):
+                self.writerConnection = self.Connect()
+            with self.writerConnection:
+                yield self.writerConnection
+            if(self.checkpointInterval > 0 and time.monotonic() - self.lastCheckpoint >= self.checkpointInterval):
+                self.Checkpoint()
+
+    def Checkpoint(self, mode="PASSIVE"):
+        """
+        Copy what can be copied of the write ahead log into the database without waiting, or with mode TRUNCATE,
+        wait for readers to finish, copy all of it and truncate the log.
+        Readers part way through a query hold the log back, in which case the checkpoint copies what it can and is tried again next interval.
+        """
+        with self.writerLock:
+            self.lastCheckpoint = time.monotonic()
+            if(self.writerConnection is None or self.profile.get('journal_mode', '').upper() != 'WAL'):
+                return None
+            try:
+                busy, logPages, checkpointedPages = self.writerConnection.execute("PRAGMA wal_checkpoint({})".format(mode)).fetchone()
+            except sqlite3.Error as e:
+                print("Could not checkpoint the database, error: {}".format(e))
+                return None
+            if(busy):
+                print("Checkpoint of the database was held back by a reader, {} of {} pages copied.".format(checkpointedPages, logPages))
+            return checkpointedPages
+
+    @contextmanager
+    def Reader(self):
+        """
+        Borrow a reader connection from the pool, opening a new one if the pool is not full yet.
+        If every reader is in use, wait for one to be handed back.
+        """
+        try:
+            conn = self.readerPool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self.poolLock:
+                if(self.readerCount < self.readerPoolSize):
+                    self.readerCount += 1
+                    openNew = True
+                else:
+                    openNew = False
+            if(openNew):
+                try:
+                    conn = self.Connect()
+                except sqlite3.Error:
+                    with self.poolLock:
+                        self.readerCount -= 1
+                    raise
+            else:
+                conn = self.readerPool.get()
+        try:
+            yield conn
+        finally:
+            # Connections closed by Close() while they were borrowed are not handed back.
+            if(conn in self.openConnections):
+                self.readerPool.put(conn)
+
+    def Close(self):
+        """
+        Close every connection that has been opened, so the database is left cleanly on shutdown.
+        """
+        with self.writerLock:
+            self.Checkpoint("TRUNCATE")
+            with self.poolLock:
+                for conn in self.openConnections:
+                    try:
+                        conn.close()
+                    except sqlite3.Error as e:
+                        print("Could not close database connection, error: {}".format(e))
+                self.openConnections = []
+                self.writerConnection = None
+                self.readerPool = queue.LifoQueue()
+                self.readerCount = 0
+
+
+pragmaProfile = PragmaProfile(parser)
+
+manager = ConnectionManager(parser.get('database', 'connection'),
+                            parser.getint('database', 'readerPoolSize', fallback=2),
+                            parser.getint('database', 'cachedStatements', fallback=128),
+                            pragmaProfile,
+                            parser.getint('database', 'checkpointInterval', fallback=60))
+
+atexit.register(manager.Close)
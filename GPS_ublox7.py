@@ -14,51 +14,11 @@ except ImportError as message:
     print("Failed to import time, maybe it is not installed correctly? Error was: {}".format(message))
 
 from dummy_sensors import DummyGPS
+from BBX_Sensors import ReadChunks
+from Sensor_Record import SensorRecord, SensorBatch
+from NMEA_Parser import NMEAParser
 
 
-def RemoveGPTXT(lines): 
-    """
-    Remove all the GPTXT (device descriptive) lines
-    """
-    linesToRemove = lines.count("$GPTXT")
-    for r in range(linesToRemove):
-        firstRemoveIndex = lines.find("$GPTXT")
-        secondRemoveIndex = lines.find("\n", firstRemoveIndex+1)        
-        lines = lines[:firstRemoveIndex] + lines[secondRemoveIndex:]
-    return (lines)
-
-def FindLeftOverData(all_lines):
-    """
-    Find any data that is part of the next "line" of data and temporarily store it for when the rest comes through.
-    """
-    start = all_lines.rfind("$GPRMC")              
-    leftoverData = all_lines[start:]          
-    all_lines = all_lines[:start]
-    return(all_lines, leftoverData)
-
-def OrderData(splitData, listOfData, NMEA_TAGS, GPRMC):
-    """
-    Go through the data entered, and sort it into a list that is appropriate for sending to the sensor manager.
-    Extract the important data into the first few elements, then store the raw lines into their own elements, sorted by type of NMEA tag.
-    """
-    for lineOfData in splitData:
-        code = lineOfData[:6]
-        code = code[1:]
-        lineOfData = lineOfData.split(",") 
-        for x in range(len(NMEA_TAGS)):
-            if(code == "GPRMC"):
-                listOfData[2] = lineOfData[3]
-                listOfData[3] = lineOfData[4]
-                listOfData[4] = lineOfData[5]
-                listOfData[5] = lineOfData[6]
-                listOfData[0] = lineOfData[1]
-                listOfData[1] = lineOfData[9]
-                listOfData[7] = GPRMC + ",".join(lineOfData)
-            elif(NMEA_TAGS[x][0] == code):
-                listOfData[x+8] = listOfData[x+8] + ",".join(lineOfData)
-                                   
-    return(listOfData)
-
 class GPS_UBLOX7:
     """
     The GPS sensor class to read in data live while in-situ.
@@ -66,24 +26,78 @@ class GPS_UBLOX7:
     Reads in a line of data, then after checking a certain number of times to see if there is data, adjust a waiting timer.
 
     The waiting timer is adjusted to avoid unnecessary CPU usage on the Raspberry Pi.
+    If readMode is blocking it waits on the serial port instead, handing each reading on as soon as the last sentence of its epoch arrives.
     """
-    def __init__(self, port):
+    sensorType = "GPS_UBLOX7"
+
+    def __init__(self, port, readMode="poll"):
         self.port = port
+        self.readMode = readMode
+        self.sensorID = None
+        self.parser = NMEAParser()
+        self.malformed = 0
 
+    def OpenPort(self, timeout=1):
+        """
+        Open the serial port the GPS is plugged into. A timeout of 0 opens the port without blocking.
+        """
+        myPort = '/dev/'+self.port
+        return serial.Serial(myPort, 19200, timeout = timeout)
 
-    def Reading(self):
+    def Feed(self, bitOfData):
+        """
+        Take the next piece of data read from the GPS, and return a list of records for every reading it completed.
+        A reading is complete once the $GPGLL sentence which ends its epoch arrives, or the $GPRMC of the next one.
+        Sentences which fail their checksum or can't be parsed are counted in malformed and handed on as a record for the Quarantine table.
+        """
+        fixes, rejected = self.parser.Feed(bitOfData)
+        records = [SensorRecord(self.sensorType, self.sensorID, tuple(fix)) for fix in fixes]
+        for sentence, reason in rejected:
+            self.malformed += 1
+            records.append(SensorRecord("Quarantine", self.sensorID, (self.sensorType, sentence, reason)))
+        return records
+
+    def Batch(self, bitOfData):
+        """
+        Take the next piece of data read from the GPS, and return a batch of every reading it completed,
+        or None if it did not complete any.
+        """
+        fixes = self.Feed(bitOfData)
+        if(len(fixes) == 0):
+            return None
+        return SensorBatch(self.sensorType, self.sensorID, fixes)
+
+    def BlockingReading(self):
+        """
+        Generator function which blocks on the serial port, and yields a batch of readings from the GPS as soon as each is complete.
+        Yields None when a read times out without completing a reading, so the caller can check whether to stop.
+        """
+        try:
+            ser = self.OpenPort()
+            for bitOfData in ReadChunks(ser):
+                yield self.Batch(bitOfData)
+
+        except ValueError as message:
+            print("Did not manage to connect to sensor properly, check your settings. Error was: {}".format(message))
+        except serial.SerialException as message:
+            print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
+
+    def BatchReading(self):
         """
-        Generator function to read in data from the GPS.
+        Generator function to read in data from the GPS, yielding a batch of every reading completed by each read,
+        or None when a read or check completed none, so the caller can check whether to stop.
         
-        Uses a time taken per line read formula to adjust the time to wait between making checks.
+        Uses a time taken per line read formula to adjust the time to wait between making checks,
+        unless the sensor is set to block on the serial port instead.
 
         Reads in all the data in the buffer, then splits it up into lines, and processs them individually.
         
         """
+        if(self.readMode == "blocking"):
+            yield from self.BlockingReading()
+            return
+
         # Initialise values
-        leftoverData = ""
-        lineOfData = b''
-        bitOfData = b''
         numberOfChecksToMake = 10
         timeToSleep = 1
         targetChecksPerLine = 1.3
@@ -99,73 +113,21 @@ class GPS_UBLOX7:
                 # The number of checks to make 
                 for i in range(numberOfChecksToMake):
                     time.sleep(timeToSleep)
+                    batch = None
                     # Check if there is anything in the buffer to be collected.
                     if ser.in_waiting != 0:
-                        bitOfData = ser.read(ser.in_waiting)
-                        lineOfData = lineOfData + bitOfData
-                        bitOfData = ""
-                        # Checking if there are two $GPRMC tags in the line, as that is used to signal the start and end of a reading.
-                        if(lineOfData.count(b"$GPRMC") >= 2):
-                            
-                            # Sort the data so it is ready to be processed by decoding it, adding any missing data, removing excess data.
-                            all_lines = lineOfData.decode('utf-8')                           
-                            all_lines = leftoverData + all_lines                          
-                            all_lines = RemoveGPTXT(all_lines)
-                            all_lines, leftoverData = FindLeftOverData(all_lines)
-
-                            # Split up data into single readings by the start and end NMAE tags in the block of data.
-                            lineStarts = all_lines.count("$GPRMC")
-                            lineEnds = all_lines.count("$GPGLL")
-                            lineDifference = lineStarts - lineEnds
-                            if(lineDifference > 0):
-                                lineIterations = lineDifference
-                            else:
-                                lineIterations = lineStarts
-                            
-                            # for each reading in the datablock, process it and yield it back to the sensor manager.
-                            for f in range(lineIterations):    
-                                firstIndex = all_lines.find("$GPRMC")
-                                secondIndex = all_lines.find("$GPRMC", firstIndex+1)
-                                dataGroup = all_lines[:secondIndex] 
-                                lineCount += 1
-                              
-                                splitData = dataGroup.split()
-
-                                # set up a case select/switch statement to sort the NMEA data by its tag
-                                GPRMC = ""
-                                GPVTG = ""
-                                GPGGA = ""
-                                GPGSA = ""
-                                GPGSV = ""
-                                GPGLL = ""                 
-                                NMEA_TAGS = [
-                                    ["GPVTG",GPVTG],
-                                    ["GPGGA",GPGGA],
-                                    ["GPGSA",GPGSA],
-                                    ["GPGSV",GPGSV],
-                                    ["GPGLL",GPGLL]
-                                ]
-
-                                #             currentTime   currentDate  latitudeValue  latitudeDirection    longitudeValue     longitudeDirection    numberOfSatelites     GPRMC    GPVTG   GPGGA  GPGSA  GPGSV  GPGLL
-                                listOfData = [0,            0,           0,             "",                  0,                 "",                   0,                    "",      "",     "",    "",    "",    ""]
-
-                                Data = OrderData(splitData, listOfData, NMEA_TAGS, GPRMC)
-
-                                yield(Data)
-                                
-                                # remove the recently inserted row of data from the datablock.
-                                all_lines = all_lines[secondIndex:]                                       
-                            lineOfData = b""
+                        # yield every reading completed by the read back to the sensor manager in one batch.
+                        batch = self.Batch(ser.read(ser.in_waiting))
+                        if(batch is not None):
+                            lineCount += batch.Count()
+                    yield batch
                 
-                try:
-                    #print( "Time of {}s gave us {} lines per check".format(timeToSleep, linesPerCheck ))
-                    linesPerCheck = lineCount / numberOfChecksToMake
-                    #Formula for the timer on how long to wait between checks.
+                #print( "Time of {}s gave us {} lines per check".format(timeToSleep, linesPerCheck ))
+                linesPerCheck = lineCount / numberOfChecksToMake
+                #Formula for the timer on how long to wait between checks. If no readings came in keep the same timer, rather than dividing by zero.
+                if(linesPerCheck > 0):
                     newtimeToSleep = timeToSleep * ( targetLinesPerCheck / linesPerCheck )
-                except:
-                    print("the error is here smart boi")
-
-                timeToSleep = newtimeToSleep
+                    timeToSleep = newtimeToSleep
                 if(numberOfChecksToMake < 100):
                     numberOfChecksToMake += 10
           
@@ -174,6 +136,14 @@ class GPS_UBLOX7:
         except serial.SerialException as message:
             print("Did not read data from sensor properly, check your settings. Error was: {}".format(message))
 
+    def Reading(self):
+        """
+        Generator function to read in data from the GPS one reading at a time.
+        """
+        for batch in self.BatchReading():
+            if(batch is not None):
+                yield from batch.Records()
+
 # gps = GPS2()
 
 # while True:
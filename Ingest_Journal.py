@@ -0,0 +1,241 @@
+#! /usr/bin/env python3
+"""
+An append only journal on disk which the sensor readers write their readings into, in place of the in-memory queue,
+so readings survive the sensor manager being killed or the power being cut before they reach the database.
+
+The journal is a directory of numbered segment files. Each segment starts with a magic number, followed by frames of
+a 4 byte length, a 4 byte CRC32 and the batch of readings encoded as JSON. Frames are written with one unbuffered write,
+so once put returns a reading survives the process being killed, and the segment is fsynced every syncInterval seconds,
+so at most that much is lost if the power is cut. Segments are sealed once they reach segmentBytes or the loader asks
+for them, and the loader applies each sealed segment to the database and then deletes it.
+Segments left by a previous run are sealed when the journal is opened, so the loader replays them first.
+
+Segments are named after the time the journal was opened and their number within that run, so a name is never used twice.
+The loader records each segment's name in the JournalApplied table of every database it writes it to, in the same transaction
+as its readings, so a segment replayed because the power was cut before it was deleted is not written twice.
+A segment which still can't be applied after a number of tries is moved aside with FAILED_SUFFIX on the end of its name,
+so it no longer holds back the segments after it, and can be put back by removing the suffix.
+"""
+
+import os
+import json
+import time
+import zlib
+import struct
+import threading
+
+from Sensor_Record import SensorRecord, SensorBatch
+
+MAGIC = b"SRJ1"
+FRAME_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".journal"
+FAILED_SUFFIX = ".failed"
+
+
+def SegmentID(path):
+    """
+    The name a segment is recorded under in the JournalApplied table once it has been applied.
+    """
+    return os.path.basename(path)[:-len(SEGMENT_SUFFIX)]
+
+
+def EncodeBatch(item):
+    """
+    Encode a SensorRecord or SensorBatch as the payload of one frame.
+    A reading whose sensor type is not the batch's, such as a quarantined line, carries its own on the end.
+    """
+    readings = []
+    for record in item.Records():
+        if(record.sensorType == item.sensorType):
+            readings.append([record.timestamp, record.values])
+        else:
+            readings.append([record.timestamp, record.values, record.sensorType])
+    return json.dumps([item.sensorType, item.sensorID, readings], separators=(",", ":")).encode("utf-8")
+
+
+def DecodeBatch(payload):
+    """
+    Turn the payload of a frame back into a SensorBatch.
+    """
+    sensorType, sensorID, readings = json.loads(payload.decode("utf-8"))
+    return SensorBatch(sensorType, sensorID, [SensorRecord(reading[2] if len(reading) > 2 else sensorType, sensorID, tuple(reading[1]), reading[0])
+                                              for reading in readings])
+
+
+def ReadSegment(path):
+    """
+    Generator yielding the SensorBatch of every whole frame in a segment, in the order they were written.
+    Stops at the first frame which is cut short or fails its CRC, which is where the writer was when it was stopped.
+    """
+    with open(path, "rb") as segment:
+        if(segment.read(len(MAGIC)) != MAGIC):
+            print("Journal segment {} is not a journal, skipping it.".format(path))
+            return
+        while True:
+            header = segment.read(FRAME_HEADER.size)
+            if(len(header) == 0):
+                return
+            if(len(header) < FRAME_HEADER.size):
+                print("Journal segment {} ends part way through a frame header, ignoring the rest.".format(path))
+                return
+            length, crc = FRAME_HEADER.unpack(header)
+            payload = segment.read(length)
+            if(len(payload) < length or zlib.crc32(payload) != crc):
+                print("Journal segment {} has a torn frame, ignoring the rest.".format(path))
+                return
+            yield DecodeBatch(payload)
+
+
+class IngestJournal(object):
+    """
+    Takes the sensor readers' batches with put, like the IngestQueue, but appends them to the journal on disk.
+
+    syncInterval is how many seconds apart the segment is fsynced by the Syncer thread, every batch put in between
+    is made durable by the same fsync. A syncInterval of 0 fsyncs after every put instead.
+    """
+
+    def __init__(self, directory, segmentBytes=1048576, syncInterval=0.2):
+        self.directory = directory
+        self.segmentBytes = segmentBytes
+        self.syncInterval = syncInterval
+        self.lock = threading.Lock()
+        self.sealed = []
+        self.segmentFile = None
+        self.segmentPath = None
+        self.segmentSize = 0
+        self.unsynced = False
+        self.nextSequence = 0
+        self.runStamp = None
+        self.batchesWritten = 0
+        self.bytesWritten = 0
+        self.syncs = 0
+
+    def Path(self, sequence):
+        # The run's stamp comes first, so the segments of every run sort in the order they were written.
+        return os.path.join(self.directory, "{}-{:010d}{}".format(self.runStamp, sequence, SEGMENT_SUFFIX))
+
+    def Open(self):
+        """
+        Open the journal, sealing any segments left by the last run so they are replayed, and start a new segment.
+        Returns the number of segments left by the last run.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            leftOver = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+            self.sealed = [os.path.join(self.directory, name) for name in leftOver]
+            self.runStamp = "{:016x}".format(time.time_ns())
+            self.nextSequence = 0
+            self._openSegment()
+        if(len(leftOver) > 0):
+            print("Journal has {} segments left from the last run to replay.".format(len(leftOver)))
+        return len(leftOver)
+
+    def _openSegment(self):
+        self.segmentPath = self.Path(self.nextSequence)
+        self.nextSequence += 1
+        self.segmentFile = os.open(self.segmentPath, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(self.segmentFile, MAGIC)
+        self.segmentSize = len(MAGIC)
+        # The new file's directory entry has to reach the disk too, or the segment could vanish with the power.
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _sync(self):
+        if(self.unsynced):
+            os.fsync(self.segmentFile)
+            self.unsynced = False
+            self.syncs += 1
+
+    def _seal(self):
+        # Seal the segment being written if anything has been written to it, and start the next one.
+        if(self.segmentSize <= len(MAGIC)):
+            return
+        self._sync()
+        os.close(self.segmentFile)
+        self.sealed.append(self.segmentPath)
+        self._openSegment()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Append a SensorRecord or SensorBatch to the journal. Takes the same arguments as IngestQueue.put,
+        but never blocks for room, as the journal is only limited by the space on the disk.
+        """
+        payload = EncodeBatch(item)
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            os.write(self.segmentFile, frame)
+            self.segmentSize += len(frame)
+            self.unsynced = True
+            self.batchesWritten += 1
+            self.bytesWritten += len(frame)
+            if(self.syncInterval <= 0):
+                self._sync()
+            if(self.segmentSize >= self.segmentBytes):
+                self._seal()
+
+    def Sync(self):
+        """
+        fsync everything written to the journal so far.
+        """
+        with self.lock:
+            if(self.segmentFile is not None):
+                self._sync()
+
+    def Syncer(self, event):
+        """
+        Thread which fsyncs the journal every syncInterval seconds until the end event is set, then once more.
+        """
+        while not event.is_set():
+            event.wait(self.syncInterval if self.syncInterval > 0 else 1)
+            self.Sync()
+
+    def Seal(self):
+        """
+        Seal the segment being written, and return the paths of every sealed segment waiting to be applied, oldest first.
+        """
+        with self.lock:
+            if(self.segmentFile is not None):
+                self._seal()
+            return list(self.sealed)
+
+    def Remove(self, path):
+        """
+        Delete a sealed segment once everything in it has been committed to the database.
+        """
+        with self.lock:
+            self.sealed.remove(path)
+        os.remove(path)
+
+    def MoveAside(self, path):
+        """
+        Rename a sealed segment which can't be applied so it is no longer replayed, returning its new path.
+        """
+        with self.lock:
+            self.sealed.remove(path)
+        os.replace(path, path + FAILED_SUFFIX)
+        return path + FAILED_SUFFIX
+
+    def Close(self):
+        """
+        fsync and close the segment being written. It is left on disk, and replayed if anything is in it.
+        """
+        with self.lock:
+            if(self.segmentFile is None):
+                return
+            self._sync()
+            os.close(self.segmentFile)
+            self.segmentFile = None
+            if(self.segmentSize <= len(MAGIC)):
+                os.remove(self.segmentPath)
+
+    def Report(self):
+        """
+        Print the journal's counters.
+        """
+        with self.lock:
+            waiting = len(self.sealed)
+        print("Ingest journal has written {} batches in {} bytes with {} fsyncs, {} segments waiting to be applied".format(
+            self.batchesWritten, self.bytesWritten, self.syncs, waiting))
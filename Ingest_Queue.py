@@ -0,0 +1,186 @@
+#! /usr/bin/env python3
+"""
+The queue the sensor readers put their readings into, and the database writer takes them out of.
+
+Unlike queue.Queue it has a budget for the memory it holds, measured in bytes, so when the writer stalls
+the readings waiting to be written can't grow until the Raspberry Pi starts swapping.
+What happens to a reading which would go over the budget depends on the overload policy of the sensor it came from.
+"""
+
+import threading
+import collections
+import time
+from queue import Empty, Full
+from Sensor_Record import SensorBatch
+
+# Overload policies a sensor can have.
+POLICY_BLOCK = "block"             # wait for the writer to make room, holding up the sensor's reader.
+POLICY_DROP_OLDEST = "dropOldest"  # throw away the oldest readings in the queue to make room.
+POLICY_DECIMATE = "decimate"       # once the queue is filling up, only keep one in every few readings from the sensor.
+
+overloadPolicies = [POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DECIMATE]
+
+
+class IngestQueue(object):
+    """
+    A first in first out queue of SensorRecords and SensorBatches, holding at most maxBytes of readings.
+
+    Each sensor has an overload policy which says what happens when a reading from it would go over the budget.
+    Sensors without one use defaultPolicy. The decimate policy starts once the queue holds more than
+    decimateThreshold of its budget, and keeps one in every decimation readings from the sensor.
+    Counters of the queue's depth, the bytes it holds, and the readings dropped or decimated are kept for reporting.
+    """
+
+    def __init__(self, maxBytes, defaultPolicy=POLICY_BLOCK, decimateThreshold=0.75):
+        self.maxBytes = maxBytes
+        self.defaultPolicy = defaultPolicy
+        self.decimateThreshold = decimateThreshold
+        self.items = collections.deque()
+        self.bytesHeld = 0
+        self.policies = {}
+        self.decimations = {}
+        self.decimateCounts = collections.Counter()
+        self.dropped = collections.Counter()
+        self.decimated = collections.Counter()
+        self.lock = threading.Lock()
+        self.notEmpty = threading.Condition(self.lock)
+        self.notFull = threading.Condition(self.lock)
+
+    def SetPolicy(self, sensorID, policy, decimation=10):
+        """
+        Set the overload policy for the sensor with this ID.
+        """
+        if(policy not in overloadPolicies):
+            raise ValueError("Unknown overload policy {}, expected one of {}".format(policy, overloadPolicies))
+        with self.lock:
+            self.policies[sensorID] = policy
+            self.decimations[sensorID] = max(1, decimation)
+
+    def _append(self, item, size):
+        self.items.append((item, size))
+        self.bytesHeld += size
+        self.notEmpty.notify()
+
+    def _popleft(self):
+        item, size = self.items.popleft()
+        self.bytesHeld -= size
+        # Readers waiting for room may each need a different amount of it, so wake them all to check.
+        self.notFull.notify_all()
+        return item
+
+    def _decimate(self, item, sensorID):
+        # Keep one in every few readings from the sensor, whether they arrive one at a time or in a batch.
+        decimation = self.decimations.get(sensorID, 10)
+        kept = []
+        for record in item.Records():
+            self.decimateCounts[sensorID] += 1
+            if(self.decimateCounts[sensorID] % decimation == 0):
+                kept.append(record)
+            else:
+                self.decimated[sensorID] += 1
+        if(len(kept) == 0):
+            return None
+        if(len(kept) == item.Count()):
+            return item
+        return SensorBatch(item.sensorType, sensorID, kept)
+
+    def _fits(self, size):
+        # A single item bigger than the whole budget is still let in when the queue is empty, so it can't block forever.
+        return self.bytesHeld + size <= self.maxBytes or len(self.items) == 0
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put an item on the queue, following its sensor's overload policy if it would go over the memory budget.
+        Raises queue.Full if a sensor with the block policy is still waiting for room after timeout seconds,
+        or if block is False.
+        """
+        size = item.Size()
+        sensorID = item.sensorID
+        with self.lock:
+            policy = self.policies.get(sensorID, self.defaultPolicy)
+
+            if(policy == POLICY_DECIMATE and self.bytesHeld > self.maxBytes * self.decimateThreshold):
+                keptItem = self._decimate(item, sensorID)
+                if(keptItem is None):
+                    return
+                if(keptItem is not item):
+                    item = keptItem
+                    size = item.Size()
+
+            if(self._fits(size)):
+                self._append(item, size)
+            elif(policy == POLICY_DROP_OLDEST):
+                while not self._fits(size):
+                    droppedItem = self._popleft()
+                    self.dropped[droppedItem.sensorID] += droppedItem.Count()
+                self._append(item, size)
+            elif(policy == POLICY_DECIMATE):
+                # Even the readings kept by decimating are dropped if there is no room left at all.
+                self.dropped[sensorID] += item.Count()
+            else:
+                if(not block):
+                    raise Full
+                if(timeout is None):
+                    while not self._fits(size):
+                        self.notFull.wait()
+                else:
+                    deadline = time.monotonic() + timeout
+                    while not self._fits(size):
+                        remaining = deadline - time.monotonic()
+                        if(remaining <= 0):
+                            raise Full
+                        self.notFull.wait(remaining)
+                self._append(item, size)
+
+    def get(self, block=True, timeout=None):
+        """
+        Remove and return the oldest item on the queue.
+        Raises queue.Empty if nothing arrives within timeout seconds, or if block is False and the queue is empty.
+        """
+        with self.lock:
+            if(not block):
+                if(len(self.items) == 0):
+                    raise Empty
+            elif(timeout is None):
+                while len(self.items) == 0:
+                    self.notEmpty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while len(self.items) == 0:
+                    remaining = deadline - time.monotonic()
+                    if(remaining <= 0):
+                        raise Empty
+                    self.notEmpty.wait(remaining)
+            return self._popleft()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return len(self.items) == 0
+
+    def Counters(self):
+        """
+        Return the queue's counters: its depth in items, the bytes it holds, and how many readings have been dropped or decimated.
+        """
+        with self.lock:
+            return {
+                'depth': len(self.items),
+                'bytes': self.bytesHeld,
+                'dropped': sum(self.dropped.values()),
+                'decimated': sum(self.decimated.values())
+            }
+
+    def Report(self):
+        """
+        Print the queue's counters.
+        """
+        counters = self.Counters()
+        print("Ingest queue holds {} items in {} of {} bytes, {} dropped, {} decimated".format(
+            counters['depth'], counters['bytes'], self.maxBytes, counters['dropped'], counters['decimated']))
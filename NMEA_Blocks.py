@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+"""
+Packs the raw NMEA sentences of many GPS fixes into one zlib compressed block, and unpacks them again.
+
+NMEA sentences from one receiver repeat the same tags, field layouts and satellite numbers fix after fix, so a block
+is compressed with a preset dictionary of typical u-blox 7 output. The dictionary lets even a block holding a single fix
+compress well, and a full block compresses to a small fraction of its text.
+Each block records which dictionary it was compressed with, so a new dictionary can be added without rewriting old blocks.
+"""
+
+import zlib
+
+# The columns of the sentences in a fix, in the order they are packed.
+NMEA_COLUMNS = ["GPRMC", "GPVTG", "GPGGA", "GPGSA", "GPGSV", "GPGLL"]
+
+# Separates the timestamp and sentences of one fix, and one fix from the next. Neither appears in NMEA.
+FIELD_SEPARATOR = "\x1f"
+FIX_SEPARATOR = "\x1e"
+
+# Dictionaries are never changed once blocks have been written with them, a new one is added with the next number instead.
+# zlib finds the end of the dictionary quickest, so the most common strings go last.
+nmeaDictionaries = {
+    1: FIX_SEPARATOR.join([
+        "$GPTXT,01,01,02,u-blox ag - www.u-blox.com*50",
+        "$GPRMC,,V,,,,,,,,,,N*53",
+        "$GPVTG,,,,,,,,,N*30",
+        "$GPGGA,,,,,,0,00,99.99,,,,,,*48",
+        "$GPGSA,A,1,,,,,,,,,,,,,99.99,99.99,99.99*30",
+        "$GPGSV,1,1,00*79",
+        "$GPGLL,,,,,,V,N*64",
+        "$GPGSV,3,1,12,02,15,039,,05,50,291,36,07,30,160,29,09,02,080,*7A,",
+        "$GPGSV,3,2,12,13,63,226,40,15,31,217,33,20,,,,21,02,316,*71,",
+        "$GPGSV,3,3,12,24,,,,28,,,,29,25,049,,30,81,174,*7F,",
+        "$GPRMC,133407.00,A,5021.96962,N,00408.86041,W,0.012,,260919,,,A*6C,",
+        "$GPVTG,,T,,M,0.012,N,0.022,K,A*24,",
+        "$GPGGA,133407.00,5021.96962,N,00408.86041,W,1,09,0.98,31.2,M,50.4,M,,*7C,",
+        "$GPGSA,A,3,05,13,15,07,30,21,24,29,02,,,,1.73,0.98,1.42*07,",
+        "$GPGLL,5021.96962,N,00408.86041,W,133407.00,A,A*71",
+        "$GPGSV,4,1,14,01,28,130,22,03,63,068,43,06,38,303,39,09,09,36,197,*7B,"
+        "$GPGSV,4,2,14,11,12,153,14,12,07,327,31,14,03,038,,17,46,244,13,*72,"
+        "$GPGSV,4,3,14,18,04,131,12,19,48,270,38,22,42,080,39,23,65,157,*79,"
+        "$GPGSV,4,4,14,25,00,004,,31,16,044,32,*7B,",
+        FIELD_SEPARATOR.join([
+            "1569504848000",
+            "$GPRMC,133408.00,A,5021.96960,N,00408.86047,W,0.247,,260919,,,A*6C,",
+            "$GPVTG,,T,,M,0.247,N,0.457,K,A*24,",
+            "$GPGGA,133408.00,5021.96960,N,00408.86047,W,1,08,2.11,29.8,M,50.4,M,,*7C,",
+            "$GPGSA,A,3,01,31,22,17,03,12,06,19,,,,,3.53,2.11,2.83,*07,",
+            "$GPGSV,4,1,14,01,28,130,22,03,63,068,43,06,38,303,39,09,09,36,197,*7B,"
+            "$GPGSV,4,2,14,11,12,153,14,12,07,327,31,14,03,038,,17,46,244,13,*72,"
+            "$GPGSV,4,3,14,18,04,131,12,19,48,270,38,22,42,080,39,23,65,157,*79,"
+            "$GPGSV,4,4,14,25,00,004,,31,16,044,32,*7B,",
+            "$GPGLL,5021.96960,N,00408.86047,W,133408.00,A,A*71"
+        ])
+    ]).encode("ascii")
+}
+
+CURRENT_DICTIONARY = max(nmeaDictionaries)
+
+
+def PackBlock(fixes, dictionary=CURRENT_DICTIONARY):
+    """
+    Compress a list of (timestamp, sentences) fixes, where sentences holds the text of each of NMEA_COLUMNS or None.
+    """
+    text = FIX_SEPARATOR.join(
+        FIELD_SEPARATOR.join([str(timestamp)] + [sentence or "" for sentence in sentences]) for timestamp, sentences in fixes)
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, nmeaDictionaries[dictionary])
+    return compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+
+def UnpackBlock(data, dictionary):
+    """
+    Decompress a block back into its list of (timestamp, sentences) fixes. Sentences which were empty come back as None.
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS, nmeaDictionaries[dictionary])
+    text = (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+    fixes = []
+    for fix in text.split(FIX_SEPARATOR):
+        fields = fix.split(FIELD_SEPARATOR)
+        fixes.append((int(fields[0]), tuple(sentence or None for sentence in fields[1:])))
+    return fixes
@@ -0,0 +1,168 @@
+#! /usr/bin/env python3
+"""
+Turns the stream of NMEA sentences from a GPS into one fix for each epoch, reading the bytes once as they arrive.
+
+Sentences are framed by a compiled pattern which finds each $ through to the end of its line in one pass of the data read,
+so nothing is searched, decoded or sliced again when more data arrives. Only the start of a sentence which hasn't
+finished arriving is kept for the next read. Each sentence's *hh checksum is checked, then it is handed to the handler
+for its talker and sentence id, looked up in a dictionary.
+
+The parser is a small state machine: it waits for the $GPRMC sentence which starts an epoch, collects the epoch's other
+sentences into the fix, and hands the fix on when the $GPGLL which ends the epoch arrives, or the next $GPRMC does.
+Sentences arriving while no epoch is open belong to one whose $GPRMC was missed, so they are dropped.
+"""
+
+import re
+from functools import reduce
+from operator import xor
+
+from NMEA_Blocks import NMEA_COLUMNS
+
+# A sentence is a $, its body, a * and its checksum, then the end of its line. A $ part way through means the sentence before was cut short.
+SENTENCE = re.compile(rb"\$([^$\r\n*]*)(?:\*([^$\r\n]*))?[\r\n]")
+
+# NMEA sentences are at most 82 characters, anything longer without an end of line is noise and is dropped.
+MAX_SENTENCE = 256
+
+# Where the raw text of the sentences starts in a fix, after the parsed values, and where each sentence's goes.
+SENTENCES_START = 9
+sentenceIndexes = {tag: SENTENCES_START + index for index, tag in enumerate(NMEA_COLUMNS)}
+
+
+def NMEAChecksum(body):
+    """
+    Return the checksum of the bytes of a sentence between the $ and the *, which is all of them XORed together.
+    """
+    return reduce(xor, body, 0)
+
+
+def DegreesAndMinutes(value):
+    """
+    Read an NMEA latitude or longitude as the unsigned ddmm.mmmm number it is sent as, which is how the GPS table has always kept it.
+    Returns None if the GPS has no fix, and raises ValueError if the value is malformed.
+    """
+    if(value == ""):
+        return None
+    return float(value)
+
+
+def DecimalDegrees(value, direction):
+    """
+    Turn an NMEA latitude or longitude, in degrees and minutes as ddmm.mmmm, into signed decimal degrees.
+    South and west are negative. Returns None if the GPS has no fix, and raises ValueError if the value is malformed.
+    """
+    if(value == ""):
+        return None
+    degreesAndMinutes = float(value)
+    degrees = int(degreesAndMinutes // 100)
+    decimalDegrees = degrees + (degreesAndMinutes - degrees * 100) / 60
+    if(direction in ("S", "W")):
+        return -decimalDegrees
+    return decimalDegrees
+
+
+class NMEAParser(object):
+    """
+    Consumes the bytes read from a GPS with Feed, and returns the fixes each read completed.
+
+    Each fix is a list of the time, date, latitude as ddmm.mmmm and its direction, longitude as dddmm.mmmm and its direction,
+    the number of satellites used, the latitude and longitude in signed decimal degrees, then the raw text of each sentence in NMEA_COLUMNS. The $GPGSV sentences of an epoch are joined into one.
+    Sentences which fail their checksum or can't be parsed are returned alongside the fixes with the reason,
+    and sentences which aren't used, such as $GPTXT, are skipped.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+        self.fix = None
+        self.satellitesInView = []
+        self.fixes = 0
+        self.badChecksums = 0
+        self.orphans = 0
+        self.handlers = {
+            "GPRMC": self.RMC,
+            "GPGGA": self.GGA,
+            "GPVTG": self.Keep,
+            "GPGSA": self.Keep,
+            "GPGSV": self.GSV,
+            "GPGLL": self.GLL
+        }
+
+    def Feed(self, bitOfData):
+        """
+        Take the next piece of data read from the GPS, and return a list of the fixes it completed
+        and a list of (sentence, reason) for each sentence rejected.
+        """
+        completed = []
+        rejected = []
+        data = self.buffer + bitOfData if len(self.buffer) > 0 else bitOfData
+        end = 0
+        for match in SENTENCE.finditer(data):
+            end = match.end()
+            body, written = match.groups()
+            checkSum = NMEAChecksum(body)
+            try:
+                valid = written is not None and int(written, 16) == checkSum
+            except ValueError:
+                valid = False
+            if(not valid):
+                self.badChecksums += 1
+                rejected.append((match.group(0).rstrip().decode("ascii", "replace"),
+                                 "checksum {!r} does not match {:02X}".format((written or b"").decode("ascii", "replace"), checkSum)))
+                continue
+            fields = body.decode("ascii", "replace").split(",")
+            handler = self.handlers.get(fields[0])
+            if(handler is None):
+                continue
+            sentence = match.group(0).rstrip().decode("ascii", "replace")
+            try:
+                handler(fields, sentence, completed)
+            except (IndexError, ValueError) as message:
+                rejected.append((sentence, str(message)))
+        # Keep the sentence still arriving, from its $, for the next read.
+        start = data.rfind(b"$", end)
+        self.buffer = data[start:] if start != -1 and len(data) - start <= MAX_SENTENCE else b""
+        return completed, rejected
+
+    def Finish(self, completed):
+        # Hand on the fix of the epoch that is open, if there is one.
+        if(self.fix is not None):
+            self.fix[sentenceIndexes["GPGSV"]] = "".join(self.satellitesInView)
+            completed.append(self.fix)
+            self.fixes += 1
+            self.fix = None
+
+    def RMC(self, fields, sentence, completed):
+        # $GPRMC starts the next epoch, so the one open is finished even if its $GPGLL was lost.
+        self.Finish(completed)
+        fix = [fields[1], fields[9], DegreesAndMinutes(fields[3]), fields[4], DegreesAndMinutes(fields[5]), fields[6], None,
+               DecimalDegrees(fields[3], fields[4]), DecimalDegrees(fields[5], fields[6])]
+        fix += [""] * len(NMEA_COLUMNS)
+        fix[SENTENCES_START] = sentence
+        self.fix = fix
+        self.satellitesInView = []
+
+    def GGA(self, fields, sentence, completed):
+        if(self.Keep(fields, sentence, completed)):
+            self.fix[6] = int(fields[7]) if fields[7] != "" else None
+
+    def GSV(self, fields, sentence, completed):
+        # An epoch has one $GPGSV for every four satellites in view.
+        if(self.fix is None):
+            self.orphans += 1
+            return
+        self.satellitesInView.append(sentence)
+
+    def GLL(self, fields, sentence, completed):
+        # $GPGLL is the last sentence of each epoch.
+        if(self.Keep(fields, sentence, completed)):
+            self.Finish(completed)
+
+    def Keep(self, fields, sentence, completed):
+        """
+        Store the raw text of a sentence in the fix of the epoch that is open. Returns False if there isn't one.
+        """
+        if(self.fix is None):
+            self.orphans += 1
+            return False
+        self.fix[sentenceIndexes[fields[0]]] = sentence
+        return True
@@ -0,0 +1,170 @@
+#! /usr/bin/env python3
+"""
+Splits the sensor readings into one database file per day or week, instead of one file which grows for the whole deployment.
+
+Each partition file holds the sensor tables for the readings timestamped within its day or week, and is named after
+the main database with the date the partition starts on, such as sensordata_20190926.
+The main database keeps the Sensors table and a catalog of the partitions and the range of time each one holds,
+so queries only need to ATTACH the partitions which overlap the time they ask for.
+"""
+
+import sqlite3
+import threading
+import datetime
+import collections
+from contextlib import contextmanager
+
+from Connection_Manager import Connect, manager
+
+DAY = 24 * 60 * 60 * 1000
+WEEK = 7 * DAY
+# The epoch was a Thursday, so weeks are moved on four days to start on a Monday.
+WEEK_OFFSET = 4 * DAY
+
+periods = {'day': (DAY, 0), 'week': (WEEK, WEEK_OFFSET)}
+
+PARTITION_CATALOG = "CREATE TABLE IF NOT EXISTS Partitions(path TEXT PRIMARY KEY, startTime INTEGER, endTime INTEGER);"
+
+
+class PartitionManager(object):
+    """
+    Owns the writer connections to the partition files, opening the partition a reading belongs in the first time it is needed.
+
+    period is day, week or none, none keeps every reading in the main database as before.
+    schema is the list of statements creating the sensor tables and their indexes in a new partition,
+    or of functions taking the partition's connection for steps which are more than one statement.
+    The writers for the current and previous partitions are kept open, so readings arriving late around the boundary still go to the right file.
+    Rotate opens the next partition ahead of its boundary, so the first readings after it don't wait for the file to be made.
+    """
+
+    def __init__(self, database, period, profile, schema, cachedStatements=128, rotateLead=10 * 60 * 1000):
+        self.database = database
+        self.period = period
+        self.length, self.offset = periods.get(period, (None, 0))
+        self.profile = profile
+        self.schema = schema
+        self.cachedStatements = cachedStatements
+        self.rotateLead = rotateLead
+        self.writers = collections.OrderedDict()
+        self.lock = threading.RLock()
+        self.catalogMade = False
+
+    def Enabled(self):
+        return self.length is not None
+
+    def Start(self, timestamp):
+        """
+        The timestamp in milliseconds the partition holding timestamp starts at.
+        """
+        return (timestamp - self.offset) // self.length * self.length + self.offset
+
+    def Path(self, start):
+        """
+        The file the partition starting at start is kept in.
+        """
+        return "{}_{}".format(self.database, datetime.datetime.fromtimestamp(start / 1000, datetime.timezone.utc).strftime("%Y%m%d"))
+
+    def Catalog(self, conn):
+        if(not self.catalogMade):
+            conn.execute(PARTITION_CATALOG)
+            self.catalogMade = True
+
+    def _open(self, start):
+        # Make the partition's tables if it is new, and add it to the catalog in the main database.
+        conn = Connect(self.Path(start), self.profile, self.cachedStatements)
+        with conn:
+            for statement in self.schema:
+                if(callable(statement)):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+        with manager.Writer() as catalog:
+            self.Catalog(catalog)
+            catalog.execute("INSERT OR IGNORE INTO Partitions(path, startTime, endTime) VALUES((?),(?),(?))",
+                            (self.Path(start), start, start + self.length))
+        self.writers[start] = conn
+        print("Opened partition {}".format(self.Path(start)))
+        return conn
+
+    @contextmanager
+    def Writer(self, start):
+        """
+        Borrow the writer connection for the partition starting at start for one transaction,
+        opening the partition if it isn't open yet. The transaction is committed when the block finishes, or rolled back if it raised an error.
+        """
+        with self.lock:
+            conn = self.writers.get(start)
+            if(conn is None):
+                conn = self._open(start)
+            with conn:
+                yield conn
+
+    def Split(self, groups, timestampIndex=1):
+        """
+        Split a dictionary of insert statement -> list of rows into one dictionary for each partition the rows belong in,
+        keyed by the partition's start. The timestamp of a row is at timestampIndex.
+        """
+        partitionGroups = {}
+        for statement, rows in groups.items():
+            for row in rows:
+                start = self.Start(row[timestampIndex])
+                partitionGroups.setdefault(start, {}).setdefault(statement, []).append(row)
+        return partitionGroups
+
+    def Rotate(self, now):
+        """
+        Open the next partition once its boundary is within rotateLead milliseconds,
+        and close the writers for partitions older than the previous one.
+        """
+        with self.lock:
+            current = self.Start(now)
+            if(current + self.length - now <= self.rotateLead and (current + self.length) not in self.writers):
+                self._open(current + self.length)
+            for start in list(self.writers):
+                if(start < current - self.length):
+                    self.writers.pop(start).close()
+                    print("Closed partition {}".format(self.Path(start)))
+
+    def Release(self, start):
+        """
+        Close the writer for the partition starting at start if it is open, so the partition can be removed.
+        """
+        with self.lock:
+            conn = self.writers.pop(start, None)
+            if(conn is not None):
+                conn.close()
+
+    def Expired(self, conn, cutoff):
+        """
+        Return the path and start of every partition which only holds readings from before cutoff, oldest first.
+        """
+        self.Catalog(conn)
+        return conn.execute("SELECT path, startTime FROM Partitions WHERE endTime <= (?) ORDER BY startTime", (cutoff,)).fetchall()
+
+    def Overlapping(self, conn, start, end):
+        """
+        Return the path of every partition holding readings from start up to but not including end, oldest first.
+        """
+        self.Catalog(conn)
+        return [row[0] for row in conn.execute(
+            "SELECT path FROM Partitions WHERE startTime < (?) AND endTime > (?) ORDER BY startTime", (end, start))]
+
+    @contextmanager
+    def Attached(self, conn, path):
+        """
+        ATTACH a partition to a reader connection as the schema part for the length of the block.
+        """
+        conn.execute("ATTACH DATABASE (?) AS part", (path,))
+        try:
+            yield conn
+        finally:
+            conn.execute("DETACH DATABASE part")
+
+    def Close(self):
+        with self.lock:
+            for conn in self.writers.values():
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    print("Could not close partition connection, error: {}".format(e))
+            self.writers = collections.OrderedDict()
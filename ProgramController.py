@@ -1,11 +1,17 @@
 from Sensor_Manager import Main
+from Sensor_Manager import Supervisor
+from Sensor_Manager import InstallSignalHandlers
+from Sensor_Manager import StopAndWait
 import application
 import threading
 import concurrent.futures
 from application import app
 
-def pythonThread():
-    Main()
+# How long to wait for the sensor threads to finish after SIGTERM or SIGINT before leaving without them.
+STOP_TIMEOUT = 40
+
+def pythonThread(supervisor):
+    Main(supervisor)
 
 
 
@@ -16,8 +22,20 @@ if __name__ == "__main__":
     import logging
     print(psutil.Process(os.getpid()))
 
-    x = threading.Thread(target=pythonThread)
+    supervisor = Supervisor()
+    x = threading.Thread(target=pythonThread, args=(supervisor,))
+
+    def StopProgram():
+        """
+        Stop the sensor threads and wait for them to finish before leaving the web app.
+        If they haven't finished after STOP_TIMEOUT seconds the program exits without them.
+        """
+        if(StopAndWait(supervisor, x, STOP_TIMEOUT)):
+            sys.exit(0)
+        print("Sensor threads did not finish within {}s, exiting without them.".format(STOP_TIMEOUT))
+        os._exit(1)
+
+    InstallSignalHandlers(StopProgram)
     x.start()
 
     app.run(host='0.0.0.0')
-
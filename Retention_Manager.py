@@ -0,0 +1,187 @@
+#! /usr/bin/env python3
+"""
+Deletes old readings a small chunk at a time, so the SD card never fills up and the sensor manager's writes
+are never held up by one giant DELETE or VACUUM.
+
+Raw readings are kept forever unless rawDays is set, then for rawDays days, and the rollup tables are kept forever. The compressed blocks of the GPS's
+raw NMEA sentences are kept for nmeaDays days. When the database is partitioned,
+partitions which only hold expired readings are removed whole, after their rollups are merged into the main database.
+Space freed by the deletes is handed back a few pages at a time by incremental vacuum. Only a database made with
+auto_vacuum set to INCREMENTAL has pages to hand back. An older one keeps its size and reuses the freed pages,
+until it is converted once while stopped by setting auto_vacuum to INCREMENTAL and running VACUUM.
+"""
+
+import os
+import time
+from sqlite3 import Error
+
+from Connection_Manager import manager
+from SQL_queries import timestampTables
+from SQL_queries import partitions
+from SQL_queries import rollupResolutions
+from SQL_queries import ROLLUP_COLUMNS, ROLLUP_MERGE
+from SQL_queries import EpochMillis
+
+DAY = 24 * 60 * 60 * 1000
+
+
+class RetentionEngine(object):
+    """
+    Runs a retention pass every interval seconds until the end event is set.
+
+    Each pass walks every sensor table from its oldest row by key, chunkSize rows at a time, in a short writer transaction each,
+    pausing in between. Rows without a timestamp were written before the timestamp column existed, so are older than the
+    timestamped rows after them and are deleted along with them.
+    """
+
+    def __init__(self, rawDays=0, nmeaDays=0, chunkSize=2000, interval=300, vacuumPages=256, pause=0.05):
+        self.rawDays = rawDays
+        self.nmeaDays = nmeaDays
+        self.chunkSize = chunkSize
+        self.interval = interval
+        self.vacuumPages = vacuumPages
+        self.pause = pause
+        # Set by Run once it has checked the database was made with incremental auto_vacuum.
+        self.incremental = True
+        self.tables = [[table.table, table.key] for table in timestampTables.values()] + [["Quarantine", "id"]]
+
+    def Vacuum(self, conn):
+        """
+        Hand back up to vacuumPages free pages to the file system. Skipped unless the database was made with auto_vacuum set to INCREMENTAL,
+        as incremental_vacuum does nothing in one which wasn't.
+        """
+        if(self.vacuumPages > 0 and self.incremental):
+            conn.execute("PRAGMA incremental_vacuum({})".format(int(self.vacuumPages))).fetchall()
+
+    def DeleteExpired(self, writer, table, key, cutoff, event):
+        """
+        Delete the rows of a table with a timestamp before cutoff, oldest first, stopping at the first row which is kept.
+        writer is a function returning the writer context for the database the table is in. Returns the number of rows deleted.
+        """
+        select = "SELECT {0}, timestamp FROM {1} WHERE {0} > (?) ORDER BY {0} LIMIT (?)".format(key, table)
+        delete = "DELETE FROM {} WHERE {} = (?)".format(table, key)
+        deleted = 0
+        lastKey = -1
+        waitingKeys = []
+        while not event.is_set():
+            finished = False
+            with writer() as conn:
+                rows = conn.execute(select, (lastKey, self.chunkSize)).fetchall()
+                if(len(rows) < self.chunkSize):
+                    finished = True
+                expired = []
+                for rowKey, timestamp in rows:
+                    if(timestamp is None):
+                        # Kept waiting until a timestamped row after it says whether it has expired.
+                        waitingKeys.append(rowKey)
+                    elif(timestamp < cutoff):
+                        expired.extend(waitingKeys)
+                        waitingKeys = []
+                        expired.append(rowKey)
+                    else:
+                        finished = True
+                        break
+                if(len(rows) > 0):
+                    lastKey = rows[-1][0]
+                if(len(expired) > 0):
+                    conn.executemany(delete, [(rowKey,) for rowKey in expired])
+                    self.Vacuum(conn)
+                    deleted += len(expired)
+            if(finished):
+                break
+            event.wait(self.pause)
+        return deleted
+
+    def DeleteNMEA(self, writer, cutoff, event):
+        """
+        Delete the blocks of raw NMEA sentences whose newest fix is from before cutoff, chunkSize blocks at a time,
+        then the staged sentences from before cutoff, of which there are fewer than a block per sensor.
+        writer is a function returning the writer context for the database the blocks are in. Returns the number of blocks deleted.
+        """
+        select = "SELECT blockID FROM GPS_NMEA WHERE lastTimestamp < (?) LIMIT (?)"
+        delete = "DELETE FROM GPS_NMEA WHERE blockID = (?)"
+        deleted = 0
+        while not event.is_set():
+            with writer() as conn:
+                blocks = conn.execute(select, (cutoff, self.chunkSize)).fetchall()
+                if(len(blocks) > 0):
+                    conn.executemany(delete, blocks)
+                    self.Vacuum(conn)
+                    deleted += len(blocks)
+            if(len(blocks) < self.chunkSize):
+                with writer() as conn:
+                    conn.execute("DELETE FROM GPS_NMEA_staged WHERE timestamp < (?)", (cutoff,))
+                break
+            event.wait(self.pause)
+        return deleted
+
+    def DropPartition(self, path, start):
+        """
+        Merge a partition's rollups into the main database's rollup tables, then remove it from the catalog and delete its files.
+        """
+        partitions.Release(start)
+        with manager.Writer() as conn:
+            conn.execute("ATTACH DATABASE (?) AS part", (path,))
+            try:
+                for resolution in rollupResolutions:
+                    # WHERE true stops sqlite reading ON CONFLICT as part of the SELECT.
+                    conn.execute("INSERT INTO main.Rollup_{0} ({1}) SELECT {1} FROM part.Rollup_{0} WHERE true {2}".format(
+                        resolution, ROLLUP_COLUMNS, ROLLUP_MERGE))
+                conn.commit()
+            finally:
+                conn.execute("DETACH DATABASE part")
+            conn.execute("DELETE FROM Partitions WHERE path = (?)", (path,))
+        for suffix in ("", "-wal", "-shm"):
+            if(os.path.exists(path + suffix)):
+                os.remove(path + suffix)
+        print("Removed expired partition {}".format(path))
+
+    def Pass(self, event):
+        """
+        Make one retention pass over the database, and over the partitions when it is partitioned.
+        """
+        now = EpochMillis()
+        startTime = time.perf_counter()
+        deleted = 0
+        nmeaDeleted = 0
+        try:
+            if(self.rawDays > 0):
+                cutoff = now - self.rawDays * DAY
+                if(partitions.Enabled()):
+                    with manager.Reader() as conn:
+                        expiredPartitions = partitions.Expired(conn, cutoff)
+                    for path, start in expiredPartitions:
+                        if(event.is_set()):
+                            return
+                        self.DropPartition(path, start)
+                for table, key in self.tables:
+                    deleted += self.DeleteExpired(manager.Writer, table, key, cutoff, event)
+
+            nmeaCutoff = now - self.nmeaDays * DAY
+            nmeaDeleted += self.DeleteNMEA(manager.Writer, nmeaCutoff, event)
+            if(partitions.Enabled()):
+                with manager.Reader() as conn:
+                    olderPartitions = conn.execute("SELECT path, startTime FROM Partitions WHERE startTime < (?) ORDER BY startTime", (nmeaCutoff,)).fetchall()
+                for path, start in olderPartitions:
+                    nmeaDeleted += self.DeleteNMEA(lambda start=start: partitions.Writer(start), nmeaCutoff, event)
+        except Error as e:
+            print("Did not connect so couldn't apply retention, error: {}".format(e))
+            return
+        if(deleted > 0 or nmeaDeleted > 0):
+            print("Retention deleted {} rows and {} NMEA blocks in {:.1f}s".format(deleted, nmeaDeleted, time.perf_counter() - startTime))
+
+    def Run(self, event):
+        """
+        Thread which makes a retention pass every interval seconds, until the end event is set.
+        """
+        try:
+            with manager.Reader() as conn:
+                self.incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            if(not self.incremental):
+                print("The database was made without incremental auto_vacuum, so freed space is reused but not handed back. "
+                      "To hand it back, stop the sensor manager and run PRAGMA auto_vacuum = INCREMENTAL then VACUUM once.")
+        except Error as e:
+            print("Did not connect, error: {}".format(e))
+        while not event.is_set():
+            self.Pass(event)
+            event.wait(self.interval)
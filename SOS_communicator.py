@@ -44,8 +44,9 @@ basexmlString = '''
 </sos:InsertResult>
 '''
 
-newRow = []
+# The rows are streamed from the database, so each one is built and sent on its own however long the history is.
 for row in data:
+    newRow = []
     newRow.append(row[0]+"T"+row[1])
     newRow.append(row[0]+"T"+row[1])
     newRow.append(row[0]+"T"+row[1])
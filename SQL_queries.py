@@ -3,8 +3,15 @@ import sqlite3
 from sqlite3 import Error
 import datetime
 import time
+import collections
+import atexit
 
 from configparser import ConfigParser
+from Connection_Manager import manager, pragmaProfile
+from Partition_Manager import PartitionManager
+from Sensor_Registry import SensorRegistry
+from NMEA_Blocks import NMEA_COLUMNS, CURRENT_DICTIONARY, PackBlock, UnpackBlock
+from NMEA_Parser import DecimalDegrees
 
 #Linux database location is /users/rsg/jkb/Documents/Monocle/sensordata
 #Pi database location is /home/pi/Documents/Sensors.db
@@ -14,33 +21,46 @@ parser = ConfigParser()
 #parser.read('/home/pi/sensor_recorder/Config.ini')
 parser.read('Config.ini')
 
+def EpochMillis():
+    """
+    The current time as milliseconds since the epoch, the unit of the timestamp column on every sensor table.
+    """
+    return time.time_ns() // 1000000
+
+def TimestampOrNow(timestamp):
+    """
+    The timestamp passed in, or the current time if there isn't one.
+    """
+    if(timestamp is None):
+        return EpochMillis()
+    return timestamp
+
 def Sensors_Select():
     """
     Select all sensors in the database and return the data
     """
+    return sensorRegistry.All()
+
+def BumpSensorsGeneration(conn):
+    # Tells the registry in every process that the Sensors table has changed.
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT * FROM Sensors")
-        rows = cur.fetchall()
-        conn.close()
-        if(rows == None): 
-            rows=[]
-        return rows
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+        conn.execute("UPDATE SensorsGeneration SET generation = generation + 1")
+    except sqlite3.OperationalError:
+        # The schema hasn't been migrated yet, other processes will see the change when they next load the table.
+        pass
 
 def Sensors_Update(port, sensorID):
     """
-    Select all sensors in the database and return the data
+    Change the port a sensor is on.
     """
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()     
-        data = (port, sensorID)
-        cur.execute("UPDATE Sensors SET port = (?) WHERE id = (?)", data)
-        conn.commit()
-        conn.close()
+        data = (port, sensorID, port)
+        with manager.Writer() as conn:
+            changed = conn.execute("UPDATE Sensors SET port = (?) WHERE id = (?) AND port IS NOT (?)", data).rowcount
+            if(changed > 0):
+                BumpSensorsGeneration(conn)
+        if(changed > 0):
+            sensorRegistry.Invalidate()
     except Error as e:
         print("Did not connect, error: {}".format(e))
 
@@ -48,11 +68,11 @@ def Sensors_insert(sensorType, sensorPort, uniqueName):
     """
     Insert a new sensor into the Sensors table.
     """
-    try:      
-        conn=sqlite3.connect(parser.get('database','connection'))
-        conn.execute("INSERT INTO Sensors(sensorType, port, uniqueName) VALUES((?),(?),(?))", (sensorType,sensorPort,uniqueName,))
-        conn.commit()
-        conn.close()
+    try:
+        with manager.Writer() as conn:
+            conn.execute("INSERT INTO Sensors(sensorType, port, uniqueName) VALUES((?),(?),(?))", (sensorType,sensorPort,uniqueName,))
+            BumpSensorsGeneration(conn)
+        sensorRegistry.Invalidate()
     except Error as e:
         print("Did not connect to database so couldn't insert new sensor, error: {}".format(e))
 
@@ -60,73 +80,56 @@ def Sensors_select_type():
     """
     Select all sensors in the database and return their type
     """
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT sensorType FROM Sensors")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+    return [(row[1],) for row in sensorRegistry.All()]
 
 def Sensors_select_id():
     """
     Select all sensors in the database and return their ID
     """
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT id FROM Sensors")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+    return [(row[0],) for row in sensorRegistry.All()]
 
 def Sensors_select_port():
     """
     Select all sensors in the database and return their associated port
     """
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT port FROM Sensors")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+    return [(row[2],) for row in sensorRegistry.All()]
 
-def BB3_select():
+def BB3_select(sensorID=None, start=None, end=None):
     """
-    Select all the data from the BB3 table in the database.
+    Stream the date, time, values and temperature of the rows in the BB3 table, optionally only from one sensor
+    and from start up to but not including end. Returns a generator, see Stream_select.
     """
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT currentdate, currenttime, value1, value2, value3, temperature FROM BB3")
-        rows = cur.fetchall()
-        conn.close()
-        return rows
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+    return Stream_select("BB3", "currentdate, currenttime, value1, value2, value3, temperature", sensorID, start, end)
 
 
+BB3_INSERT = "INSERT INTO BB3(sensor_ID, timestamp, currentdate, currenttime, value1, value2, value3, temperature) VALUES((?),(?),(?),(?),(?),(?),(?),(?))"
+
+def BB3_columns(Line, sensorID, timestamp=None):
+    """
+    Map a line of BB3 data onto the columns of the BB3 table.
+    """
+    return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[3], Line[5], Line[7], Line[8])
+
 def BB3_insert(Line, sensorID):
     """
     Parameters: date, time, 3 values of readings, temperature
     Inserts the passed data into the database.
     """
-    try:      
-        conn=sqlite3.connect(parser.get('database','connection'))
-        conn.execute("INSERT INTO BB3(sensor_ID, currentdate, currenttime, value1, value2, value3, temperature) VALUES((?),(?),(?),(?),(?),(?),(?))", (sensorID, Line[0], Line[1], Line[3], Line[5], Line[7], Line[8]))
-        conn.commit()
-        conn.close()
+    try:
+        with manager.Writer() as conn:
+            conn.execute(BB3_INSERT, BB3_columns(Line, sensorID))
     except Error as e:
         print("Did not connect, error: {}".format(e))
 
 
+BB9_INSERT = "INSERT OR IGNORE INTO BB9(sensor_ID, timestamp, Header, Meter_Type_and_SN, Number_Of_Columns, Packet_Version, Record_Counter, Reference_1, Signal_1, Reference_2, Signal_2, Reference_3, Signal_3, Reference_4, Signal_4, Reference_5, Signal_5, Reference_6, Signal_6, Reference_7, Signal_7, Reference_8, Signal_8, Reference_9, Signal_9, CheckSum) VALUES((?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?))"
+
+def BB9_columns(Line, sensorID, timestamp=None):
+    """
+    Map a line of BB9 data onto the columns of the BB9 table.
+    """
+    return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[2], Line[3], Line[4], Line[5], Line[6], Line[7], Line[8], Line[9], Line[10], Line[11], Line[12], Line[13], Line[14], Line[15], Line[16], Line[17], Line[18], Line[19], Line[20], Line[21], Line[22], Line[23])
+
 def BB9_insert(Line, sensorID):
     """
     Parameters: date, time, 3 values of readings, temperature
@@ -135,47 +138,39 @@ def BB9_insert(Line, sensorID):
 
     """
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))     
-        conn.execute("INSERT INTO BB9(sensor_ID, Header, Meter_Type_and_SN, Number_Of_Columns, Packet_Version, Record_Counter, Reference_1, Signal_1, Reference_2, Signal_2, Reference_3, Signal_3, Reference_4, Signal_4, Reference_5, Signal_5, Reference_6, Signal_6, Reference_7, Signal_7, Reference_8, Signal_8, Reference_9, Signal_9, CheckSum) VALUES((?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?))", (sensorID, Line[0], Line[1], Line[2], Line[3], Line[4], Line[5], Line[6], Line[7], Line[8], Line[9], Line[10], Line[11], Line[12], Line[13], Line[14], Line[15], Line[16], Line[17], Line[18], Line[19], Line[20], Line[21], Line[22], Line[23]))
-        conn.commit()
-        conn.close()
+        with manager.Writer() as conn:
+            conn.execute(BB9_INSERT, BB9_columns(Line, sensorID))
     except Error as e:
         print("Did not connect, error: {}".format(e))
 
 
-def BB9_select():
+def BB9_select(sensorID=None, start=None, end=None):
     """
-    Select all the data from the BB9 table in the database.
+    Print the rows in the BB9 table, optionally only from one sensor and from start up to but not including end,
+    streaming them so the table never has to fit in memory.
 
     """
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT * FROM BB9")
-        rows = cur.fetchall()
-        for row in rows:   
-            print(row)
-        conn.close()
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+    for row in Stream_select("BB9", "*", sensorID, start, end):
+        print(row)
 
-def BB_select():
+def BB_select(sensorID=None, start=None, end=None):
     """
-    Select all the data from the BB table in the database.
+    Print the rows in the BB table, optionally only from one sensor and from start up to but not including end,
+    streaming them so the table never has to fit in memory.
 
     """
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()     
-        conn.execute("SELECT * FROM BB")
-        rows = cur.fetchall()
-        for row in rows:   
-            print(row)
-        conn.close()
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
+    for row in Stream_select("BB", "*", sensorID, start, end):
+        print(row)
+
 
 
+BB_INSERT = "INSERT INTO BB(sensor_ID, timestamp, currentdate, currenttime, scattering_reference, scattering_signal, thermistor) VALUES((?),(?),(?),(?),(?),(?),(?))"
+
+def BB_columns(Line, sensorID, timestamp=None):
+    """
+    Map a line of BB data onto the columns of the BB table.
+    """
+    return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[2], Line[3], Line[4])
 
 def BB_insert(Line, sensorID):
     """
@@ -185,13 +180,19 @@ def BB_insert(Line, sensorID):
 
     """
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))     
-        conn.execute("INSERT INTO BB(sensor_ID, currentdate, currenttime, scattering_reference, scattering_signal, thermistor) VALUES((?),(?),(?),(?),(?),(?))", (sensorID, Line[0], Line[1], Line[2], Line[3], Line[4]))
-        conn.commit()
-        conn.close()
+        with manager.Writer() as conn:
+            conn.execute(BB_INSERT, BB_columns(Line, sensorID))
     except Error as e:
         print("Did not connect, error: {}".format(e))
 
+NTU_INSERT = "INSERT INTO NTU(sensor_ID, timestamp, currentdate, currenttime, lambda, NTU_Signal, Thermistor) VALUES((?),(?),(?),(?),(?),(?),(?))"
+
+def NTU_columns(Line, sensorID, timestamp=None):
+    """
+    Map a line of NTU data onto the columns of the NTU table.
+    """
+    return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[2], Line[4], Line[5])
+
 def NTU_insert(Line, sensorID):
     """
     Parameters: date, time, NTU signal, thermistor
@@ -200,78 +201,1018 @@ def NTU_insert(Line, sensorID):
 
     """
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))      
-        conn.execute("INSERT INTO NTU(sensor_ID, date, time, lambda, NTU_Signal, Thermistor) VALUES((?),(?),(?),(?),(?),(?))", (sensorID, Line[0], Line[1], Line[2], Line[4], Line[5]))
-        conn.commit()
-        conn.close()
+        with manager.Writer() as conn:
+            conn.execute(NTU_INSERT, NTU_columns(Line, sensorID))
     except Error as e:
         print("Did not connect, error: {}".format(e))
 
-def NTU_select(Line):
+def NTU_select(sensorID=None, start=None, end=None):
+    """
+    Print the rows in the NTU table, optionally only from one sensor and from start up to but not including end,
+    streaming them so the table never has to fit in memory.
+
+    """
+    for row in Stream_select("NTU", "*", sensorID, start, end):
+        print(row)
+
+GPS_INSERT = "INSERT OR IGNORE INTO GPS(sensor_ID, timestamp, Time, Date, Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction, Number_Of_Satelites, Latitude, Longitude) VALUES((?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?))"
+
+# The number of values in a GPS row which go into the GPS table, the raw NMEA sentences are carried after them to the GPS_NMEA table.
+GPS_TABLE_COLUMNS = 11
+
+# The raw NMEA sentences are only stored if the retention settings keep them for some days, otherwise they are dropped once parsed.
+keepNMEA = parser.getint('retention', 'nmeaDays', fallback=0) > 0
+
+def GPS_columns(Line, sensorID, timestamp=None):
+    """
+    Map a GPS reading onto the columns of the GPS table, followed by its raw NMEA sentences when they are kept.
+    Latitude_Value and Longitude_Value keep the unsigned ddmm.mmmm the GPS sends, with their direction,
+    and Latitude and Longitude the same position in signed decimal degrees.
+    """
+    if(not keepNMEA):
+        return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[2], Line[3], Line[4], Line[5], Line[6], Line[7], Line[8])
+    return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[2], Line[3], Line[4], Line[5], Line[6], Line[7], Line[8],
+            Line[9], Line[10], Line[11], Line[12], Line[13], Line[14])
+
+def GPS_insert(Line, sensorID):
+    """
+    Parameters: a fix from the NMEA parser (time, date, latitude and longitude as ddmm.mmmm with their directions,
+    number of satellites, latitude and longitude in decimal degrees, then the raw NMEA sentences)
+
+    Inserts the fix into the narrow GPS table, and its raw sentences into the GPS_NMEA blocks when they are kept.
+
+    """
+
+    Row_insert(GPS_INSERT, GPS_columns(Line, sensorID))
+
+
+QUARANTINE_INSERT = "INSERT INTO Quarantine(sensor_ID, timestamp, sensorType, line, reason) VALUES((?),(?),(?),(?),(?))"
+
+def Quarantine_columns(Line, sensorID, timestamp=None):
+    """
+    Map a malformed line, quarantined by a sensor reader along with its sensor type and why it was rejected, onto the columns of the Quarantine table.
+    """
+    return (sensorID, TimestampOrNow(timestamp), Line[0], Line[1], Line[2])
+
+
+def Write_groups(conn, groups):
+    """
+    Insert the rows in a dictionary of insert statement -> list of rows with one executemany per table,
+    then add them to the rollup tables and the GPS's raw NMEA sentences to their blocks, all using the connection of one transaction.
+
+    A row of a table with a natural key which its INSERT OR IGNORE leaves out, because the unique index already holds its key,
+    is not added to the rollups or the NMEA blocks, so replaying a journal or a backfill never counts a reading twice.
+    How many were left out is read off the connection's total_changes, and only when some were are the rows written looked up.
+    Their number is added to the registry's ignored count.
+    """
+    written = {}
+    for statement, rows in groups.items():
+        query = insertRegistry.statements.get(statement)
+        tableRows = rows
+        if(query is not None and query.tableColumns is not None):
+            tableRows = [row[:query.tableColumns] for row in rows]
+        if(query is not None and query.naturalKey is not None):
+            lastKey = query.naturalKey.LastKey(conn)
+            changes = conn.total_changes
+            conn.executemany(statement, tableRows)
+            ignored = len(rows) - (conn.total_changes - changes)
+            if(ignored > 0):
+                insertRegistry.ignored[query.sensorType] += ignored
+                rows = [rows[position] for position in query.naturalKey.Inserted(conn, query.tableColumnNames, tableRows, lastKey)]
+        else:
+            conn.executemany(statement, tableRows)
+        if(len(rows) > 0):
+            written[statement] = rows
+    Rollup_upsert(conn, written)
+    NMEA_store(conn, written)
+
+
+# Errors a bad row can raise part way through a batch, from sqlite binding or constraining it, or from adding it to the rollups.
+ROW_ERRORS = (Error, IndexError, TypeError, ValueError)
+
+def Write_rows(conn, groups):
+    """
+    Insert the rows of a batch which failed as a whole one at a time, each under its own savepoint in the same transaction.
+    A row which fails is rolled back on its own and put in the Quarantine table with the error, so the rest of the batch is still written.
+    Returns the number of rows quarantined.
+    """
+    if(not conn.in_transaction):
+        # Otherwise releasing the first savepoint would commit it.
+        conn.execute("BEGIN")
+    quarantined = 0
+    for statement, rows in groups.items():
+        query = insertRegistry.statements.get(statement)
+        for row in rows:
+            conn.execute("SAVEPOINT row_insert")
+            try:
+                Write_groups(conn, {statement: [row]})
+            except ROW_ERRORS as e:
+                conn.execute("ROLLBACK TO row_insert")
+                conn.execute(QUARANTINE_INSERT, (row[0], row[1], query.sensorType if query is not None else None, repr(row[2:]),
+                                                 "could not be written, error: {}".format(e)))
+                quarantined += 1
+            conn.execute("RELEASE row_insert")
+    return quarantined
+
+
+def Row_insert(statement, row):
+    """
+    Insert a single row of column values using the insert statement passed in, and add it to the rollup tables.
+    When the database is partitioned the row goes into the partition for its timestamp.
+    A row which can't be written is put in the Quarantine table, as by Batch_insert.
+    """
+    Batch_insert({statement: [row]})
+
+
+def ClaimSegment(conn, segment):
+    """
+    Record a journal segment as applied to the database conn is connected to, in the transaction writing its readings,
+    and return True. Returns False if it already was, when the segment is being replayed after a crash.
+    Segments are applied oldest first, so the records of the segments before it are no longer needed and are deleted.
+    """
+    if(conn.execute("SELECT 1 FROM JournalApplied WHERE segment = (?)", (segment,)).fetchone() is not None):
+        return False
+    conn.execute("DELETE FROM JournalApplied WHERE segment < (?)", (segment,))
+    conn.execute("INSERT INTO JournalApplied(segment, appliedAt) VALUES((?),(?))", (segment, EpochMillis()))
+    return True
+
+
+def Batch_insert(groups, segment=None):
+    """
+    Insert a batch of rows grouped by table, using one executemany per table inside a single transaction,
+    and add the rows to the rollup tables and the NMEA blocks in the same transaction.
+    When the database is partitioned the batch is split by the partition each row's timestamp falls in, with a transaction for each partition.
+
+    If a transaction fails it is written again a row at a time by Write_rows, so one bad reading only quarantines itself
+    rather than losing the whole batch.
+
+    groups is a dictionary of insert statement -> list of row tuples. segment is the name of the journal segment
+    the batch was read from, which is recorded in each transaction so it is only ever written to each database once.
+    Returns the number of seconds taken to write and commit the batch, or None if it couldn't be written at all.
+    """
+    if(partitions.Enabled()):
+        transactions = [(lambda start=start: partitions.Writer(start), partitionGroups) for start, partitionGroups in partitions.Split(groups).items()]
+    else:
+        transactions = [(manager.Writer, groups)]
+    try:
+        startTime = time.perf_counter()
+        for writer, transactionGroups in transactions:
+            try:
+                with writer() as conn:
+                    if(segment is not None and not ClaimSegment(conn, segment)):
+                        print("Journal segment {} was already applied, leaving it out.".format(segment))
+                        continue
+                    Write_groups(conn, transactionGroups)
+            except ROW_ERRORS as e:
+                print("Could not insert batch, error: {}. Writing its rows one at a time.".format(e))
+                with writer() as conn:
+                    if(segment is not None):
+                        ClaimSegment(conn, segment)
+                    quarantined = Write_rows(conn, transactionGroups)
+                if(quarantined > 0):
+                    print("Quarantined {} rows of the batch which could not be written.".format(quarantined))
+        commitTime = time.perf_counter() - startTime
+        return commitTime
+    except Error as e:
+        print("Did not connect so couldn't insert batch, error: {}".format(e))
+
+
+def PartitionRotator(event, interval=60):
+    """
+    Thread which opens the next partition ahead of its boundary every interval seconds, so ingest never waits for a new file,
+    and closes the writers for old partitions. Runs until the end event is set.
+    """
+    while not event.is_set():
+        try:
+            partitions.Rotate(EpochMillis())
+        except Error as e:
+            print("Did not connect so couldn't rotate partitions, error: {}".format(e))
+        event.wait(interval)
+
+
+def CurrentSchemaVersion(conn):
+    """
+    Return the version of the schema the database is at, 0 if it was made before schema versions were kept.
+    """
+    try:
+        return conn.execute("SELECT MAX(version) FROM SchemaVersion").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def SchemaLooper():
+    """
+    Bring the database schema up to the latest version by applying the migrations it hasn't had yet, in order.
+
+    When the schema is already current this is a single read of the SchemaVersion table.
+    Otherwise every migration needed is applied in one transaction, so a failed migration leaves the schema as it was.
+    """
+    startTime = time.perf_counter()
+    latest = schemaMigrations[-1].version
+    try:
+        with manager.Reader() as conn:
+            version = CurrentSchemaVersion(conn)
+        if(version < latest):
+            with manager.Writer() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                # Read again now the database is locked, in case another process migrated it in between.
+                version = CurrentSchemaVersion(conn)
+                conn.execute("CREATE TABLE IF NOT EXISTS SchemaVersion(version INTEGER PRIMARY KEY, description TEXT, appliedAt INTEGER);")
+                for migration in schemaMigrations:
+                    if(migration.version > version):
+                        migration.apply(conn)
+                        conn.execute("INSERT INTO SchemaVersion(version, description, appliedAt) VALUES((?),(?),(?))",
+                                     (migration.version, migration.description, EpochMillis()))
+                        print("Applied schema migration {}: {}".format(migration.version, migration.description))
+    except Error as e:
+        print("Did not connect so couldn't migrate the schema, error: {}".format(e))
+        return
+    print("Schema is at version {}, checked in {:.1f} ms".format(latest, (time.perf_counter() - startTime) * 1000))
+
+
+def SensorTimeMillis(date, timeOfDay):
+    """
+    Turn the date and time columns written by the BB3, BB and NTU sensors into milliseconds since the epoch.
+    The sensors keep local time, and write the date either as yyyy-mm-dd or mm/dd/yy.
+    Returns None if they can't be read.
+    """
+    for dateFormat in ("%Y-%m-%d %H:%M:%S", "%m/%d/%y %H:%M:%S"):
+        try:
+            return int(datetime.datetime.strptime("{} {}".format(date, timeOfDay), dateFormat).timestamp() * 1000)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def GPSDigits(value):
+    """
+    The six digits of a ddmmyy date or hhmmss time, without the fraction of a second.
+    The GPS table's NUMERIC columns store them as numbers, which drops the leading zero of a time before 10:00 or a date before the 10th.
+    """
+    return "{:06d}".format(int(float(value)))
+
+
+def GPSTimeMillis(date, timeOfDay):
+    """
+    Turn the ddmmyy date and hhmmss.ss time from a $GPRMC sentence, which are in UTC, into milliseconds since the epoch.
+    Either can be the text from the sentence or the number it was stored as. Returns None if they can't be read.
+    """
+    try:
+        reading = datetime.datetime.strptime("{} {}".format(GPSDigits(date), GPSDigits(timeOfDay)), "%d%m%y %H%M%S")
+    except (TypeError, ValueError):
+        return None
+    return int(reading.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+class TimestampTable(object):
+    """
+    A sensor table with a timestamp column: its primary key, and the date and time columns with the function
+    which turns them into a timestamp when backfilling rows written before the column existed.
+    BB9 lines have no date or time, so its old rows are left without a timestamp.
+    """
+
+    def __init__(self, table, key, dateColumn=None, timeColumn=None, toMillis=None):
+        self.table = table
+        self.key = key
+        self.dateColumn = dateColumn
+        self.timeColumn = timeColumn
+        self.toMillis = toMillis
+
+
+timestampTables = collections.OrderedDict([
+    ("BB3", TimestampTable("BB3", "id", "currentdate", "currenttime", SensorTimeMillis)),
+    ("BB9", TimestampTable("BB9", "id")),
+    ("BB", TimestampTable("BB", "id", "currentdate", "currenttime", SensorTimeMillis)),
+    ("NTU", TimestampTable("NTU", "id", "currentdate", "currenttime", SensorTimeMillis)),
+    ("GPS", TimestampTable("GPS", "EntryID", "Date", "Time", GPSTimeMillis))
+])
+
+
+def TimestampMigration(conn):
     """
-    Select all the data from the NTU table in the database.
+    Make sure every sensor table has its timestamp column and an index on (sensor_ID, timestamp).
 
+    Adding a column to an existing table in sqlite only changes the schema, so this is quick however big the table is.
+    The rows already in the table are left for TimestampBackfill, and the range of keys it has to fill in
+    is kept in the Backfill table so it can carry on where it left off after a restart.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS Backfill(tableName TEXT PRIMARY KEY, nextKey INTEGER, lastKey INTEGER);")
+    for timestampTable in timestampTables.values():
+        columns = [column[1] for column in conn.execute("PRAGMA table_info({})".format(timestampTable.table))]
+        if(len(columns) > 0 and "timestamp" not in columns):
+            conn.execute("ALTER TABLE {} ADD COLUMN timestamp INTEGER".format(timestampTable.table))
+            lastKey = conn.execute("SELECT MAX({}) FROM {}".format(timestampTable.key, timestampTable.table)).fetchone()[0]
+            if(lastKey is not None and timestampTable.toMillis is not None):
+                conn.execute("INSERT OR REPLACE INTO Backfill(tableName, nextKey, lastKey) VALUES((?),(?),(?))", (timestampTable.table, 0, lastKey))
+            print("Added timestamp column to {}".format(timestampTable.table))
+        conn.execute("CREATE INDEX IF NOT EXISTS {0}_sensor_timestamp ON {0}(sensor_ID, timestamp)".format(timestampTable.table))
+
+
+def TimestampBackfill(event, chunkSize=5000, pause=0.05):
+    """
+    Fill in the timestamp of rows written before the timestamp column existed, chunkSize rows at a time.
+
+    Each chunk is read through a reader connection and written in its own short transaction, with a pause in between,
+    so the sensor manager's writes are never held up for long. Stops early if the event is set, and carries on from
+    the same place next time.
     """
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT * FROM NTU")
-        rows = cur.fetchall()
-        for row in rows:   
-            print(row)
-        conn.close()
+        with manager.Reader() as conn:
+            pending = conn.execute("SELECT tableName, nextKey, lastKey FROM Backfill WHERE nextKey <= lastKey").fetchall()
     except Error as e:
         print("Did not connect, error: {}".format(e))
+        return
 
-def GPS_insert(Line, sensorID):
+    for tableName, nextKey, lastKey in pending:
+        timestampTable = timestampTables.get(tableName)
+        if(timestampTable is None or timestampTable.toMillis is None):
+            continue
+        select = "SELECT {0}, {1}, {2} FROM {3} WHERE {0} >= (?) AND {0} <= (?) ORDER BY {0} LIMIT (?)".format(
+            timestampTable.key, timestampTable.dateColumn, timestampTable.timeColumn, timestampTable.table)
+        update = "UPDATE {} SET timestamp = (?) WHERE {} = (?) AND timestamp IS NULL".format(timestampTable.table, timestampTable.key)
+        filled = 0
+        startTime = time.perf_counter()
+        while nextKey <= lastKey:
+            if(event.is_set()):
+                print("Timestamp backfill of {} stopped at key {} of {}.".format(tableName, nextKey, lastKey))
+                return
+            try:
+                with manager.Reader() as conn:
+                    rows = conn.execute(select, (nextKey, lastKey, chunkSize)).fetchall()
+                updates = []
+                for key, date, timeOfDay in rows:
+                    millis = timestampTable.toMillis(date, timeOfDay)
+                    if(millis is not None):
+                        updates.append((millis, key))
+                nextKey = rows[-1][0] + 1 if len(rows) > 0 else lastKey + 1
+                with manager.Writer() as conn:
+                    conn.executemany(update, updates)
+                    conn.execute("UPDATE Backfill SET nextKey = (?) WHERE tableName = (?)", (nextKey, tableName))
+                filled += len(updates)
+            except Error as e:
+                print("Did not connect so couldn't backfill timestamps, error: {}".format(e))
+                return
+            event.wait(pause)
+        print("Backfilled {} timestamps in {} in {:.1f}s".format(filled, tableName, time.perf_counter() - startTime))
+
+
+def Latest_select(table, sensorID, count=10, columns="*"):
     """
-    Parameters: date, time, NTU signal, thermistor
+    Select the latest count rows from one sensor, newest first.
+    Uses the (sensor_ID, timestamp) index, so only the rows returned are read however big the table is.
+    When the database is partitioned the partitions are attached newest first until enough rows have been found,
+    then the rows written to the main database before it was partitioned.
+    """
+    if(table not in timestampTables):
+        raise ValueError("{} is not a sensor table".format(table))
+    select = "SELECT {} FROM {{}}.{} WHERE sensor_ID = (?) ORDER BY timestamp DESC LIMIT (?)".format(columns, table)
+    try:
+        with manager.Reader() as conn:
+            rows = []
+            if(partitions.Enabled()):
+                for path in reversed(partitions.Overlapping(conn, 0, EpochMillis() + partitions.length)):
+                    with partitions.Attached(conn, path):
+                        rows.extend(conn.execute(select.format("part"), (sensorID, count - len(rows))).fetchall())
+                    if(len(rows) >= count):
+                        return rows
+            rows.extend(conn.execute(select.format("main"), (sensorID, count - len(rows))).fetchall())
+            return rows
+    except Error as e:
+        print("Did not connect, error: {}".format(e))
 
-    Inserts the passed data into the database.
 
+def Window_select(table, sensorID, start, end, columns="*"):
+    """
+    Select every row from one sensor with a timestamp from start up to but not including end, oldest first.
+    start and end are milliseconds since the epoch.
+    When the database is partitioned only the partitions overlapping the window are attached, one at a time.
+    """
+    if(table not in timestampTables):
+        raise ValueError("{} is not a sensor table".format(table))
+    select = "SELECT {} FROM {{}}.{} WHERE sensor_ID = (?) AND timestamp >= (?) AND timestamp < (?) ORDER BY timestamp".format(columns, table)
+    try:
+        with manager.Reader() as conn:
+            return PartitionedSelect(conn, select, (sensorID, start, end), start, end)
+    except Error as e:
+        print("Did not connect, error: {}".format(e))
+
+
+def PartitionedSelect(conn, select, parameters, start, end):
+    """
+    Run a select over the main database and, when the database is partitioned, every partition overlapping start to end,
+    returning the rows from each in time order. The select has {} where the name of the schema goes.
+    """
+    # Rows written before the database was partitioned are older than any partition.
+    rows = conn.execute(select.format("main"), parameters).fetchall()
+    if(partitions.Enabled()):
+        for path in partitions.Overlapping(conn, start, end):
+            with partitions.Attached(conn, path):
+                rows.extend(conn.execute(select.format("part"), parameters).fetchall())
+    return rows
+
+
+def Stream_select(table, columns="*", sensorID=None, start=None, end=None, chunkSize=1000):
+    """
+    Generator yielding the rows of a sensor table, optionally only from one sensor and with a timestamp from start
+    up to but not including end, in constant memory however big the table is.
+
+    The rows are read chunkSize at a time, each chunk carrying on from the last row of the one before (keyset pagination),
+    so no chunk rereads the rows before it. A reader is only borrowed while a chunk is read, so a slow caller never holds
+    one or stops the write ahead log being checkpointed. With a time window the rows come oldest first using the
+    (sensor_ID, timestamp) index, otherwise in the order they were written.
+    When the database is partitioned the main database is read first, then each partition overlapping the window.
     """
+    if(table not in timestampTables):
+        raise ValueError("{} is not a sensor table".format(table))
+    key = timestampTables[table].key
+    byTime = start is not None or end is not None
+    conditions = []
+    parameters = []
+    if(sensorID is not None):
+        conditions.append("sensor_ID = (?)")
+        parameters.append(sensorID)
+    if(start is not None):
+        conditions.append("timestamp >= (?)")
+        parameters.append(start)
+    if(end is not None):
+        conditions.append("timestamp < (?)")
+        parameters.append(end)
+    if(byTime):
+        # The row value comparison carries on from the last (timestamp, key) read, which the index is already sorted by.
+        after = "(timestamp, {0}) > ((?), (?))".format(key)
+        order = "timestamp, {}".format(key)
+    else:
+        after = "{} > (?)".format(key)
+        order = key
+    select = "SELECT {0}, timestamp, {1} FROM {{}}.{2} WHERE {3} ORDER BY {4} LIMIT (?)".format(
+        key, columns, table, " AND ".join(conditions + [after]), order)
 
     try:
-        conn=sqlite3.connect(parser.get('database','connection'))      
-        conn.execute("INSERT INTO GPS(sensor_ID, TIME, Date, Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction, Number_Of_Satelites, GPRMC, GPVTG, GPGGA, GPGSA, GPGSV, GPGLL) VALUES((?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?),(?))", (sensorID, Line[0], Line[1], Line[2], Line[3], Line[4], Line[5], Line[6], Line[7], Line[8], Line[9], Line[10], Line[11], Line[12]))
-        conn.commit()
-        conn.close()
+        schemas = [None]
+        if(partitions.Enabled()):
+            with manager.Reader() as conn:
+                schemas += partitions.Overlapping(conn, start if start is not None else 0,
+                                                  end if end is not None else EpochMillis() + partitions.length)
+        for path in schemas:
+            position = [-1, -1] if byTime else [-1]
+            while True:
+                with manager.Reader() as conn:
+                    if(path is None):
+                        rows = conn.execute(select.format("main"), parameters + position + [chunkSize]).fetchmany(chunkSize)
+                    else:
+                        with partitions.Attached(conn, path):
+                            rows = conn.execute(select.format("part"), parameters + position + [chunkSize]).fetchmany(chunkSize)
+                for row in rows:
+                    yield row[2:]
+                if(len(rows) < chunkSize):
+                    break
+                position = [rows[-1][1], rows[-1][0]] if byTime else [rows[-1][0]]
     except Error as e:
         print("Did not connect, error: {}".format(e))
 
 
-def SchemaLooper():
-    for schema in SQLSchema:
-        try:
-            conn=sqlite3.connect(parser.get('database','connection'))      
-            conn.execute(schema[1])
-            conn.commit()
-            conn.close()
-            print(schema[0] + " made")
-        except Error as e:
-            print("Did not connect, error: {}".format(e))
+# Resolutions of the rollup tables in milliseconds, finest first.
+rollupResolutions = collections.OrderedDict([("minute", 60 * 1000), ("hour", 60 * 60 * 1000)])
 
+ROLLUP_COLUMNS = "tableName, sensor_ID, channel, bucket, count, min, max, sum, last, lastTimestamp"
 
-# use a switch factory hybrid so the sensor manager knows which insert statement to use for each sensor.
-SQLInsertQueries = [
-    ["BB3",BB3_insert],
-    ["BB9",BB9_insert],
-    ["BB",BB_insert],
-    ["NTU",NTU_insert],
-    ["GPS_UBLOX7",GPS_insert]
-]
+# Merges a bucket being added into the bucket already in the rollup table.
+ROLLUP_MERGE = ("ON CONFLICT(tableName, sensor_ID, channel, bucket) DO UPDATE SET "
+                "count = count + excluded.count, min = min(min, excluded.min), max = max(max, excluded.max), sum = sum + excluded.sum, "
+                "last = CASE WHEN excluded.lastTimestamp >= lastTimestamp THEN excluded.last ELSE last END, "
+                "lastTimestamp = max(lastTimestamp, excluded.lastTimestamp)")
+
+ROLLUP_UPSERT = "INSERT INTO Rollup_{} (" + ROLLUP_COLUMNS + ") VALUES((?),(?),(?),(?),(?),(?),(?),(?),(?),(?)) " + ROLLUP_MERGE
+
+def Rollups(groups):
+    """
+    Aggregate the rows in a dictionary of insert statement -> list of rows into the buckets of each rollup resolution.
+    Returns a dictionary of resolution -> list of rows for its rollup table, one for each table, sensor, channel and bucket.
+    """
+    rollups = {}
+    for resolution, length in rollupResolutions.items():
+        buckets = {}
+        for statement, rows in groups.items():
+            query = insertRegistry.statements.get(statement)
+            if(query is None or len(query.channels) == 0):
+                continue
+            for row in rows:
+                timestamp = row[1]
+                bucket = timestamp - timestamp % length
+                for channel, index in query.channels:
+                    value = row[index]
+                    if(not isinstance(value, (int, float))):
+                        continue
+                    key = (query.table, row[0], channel, bucket)
+                    aggregate = buckets.get(key)
+                    if(aggregate is None):
+                        buckets[key] = [1, value, value, value, value, timestamp]
+                    else:
+                        aggregate[0] += 1
+                        if(value < aggregate[1]):
+                            aggregate[1] = value
+                        if(value > aggregate[2]):
+                            aggregate[2] = value
+                        aggregate[3] += value
+                        if(timestamp >= aggregate[5]):
+                            aggregate[4] = value
+                            aggregate[5] = timestamp
+        rollups[resolution] = [key + tuple(aggregate) for key, aggregate in buckets.items()]
+    return rollups
+
+def Rollup_upsert(conn, groups):
+    """
+    Add the rows being inserted to the rollup tables, using the connection of the transaction inserting them.
+    The rows are aggregated first, so each bucket only needs one upsert however many rows fall in it.
+    """
+    for resolution, rows in Rollups(groups).items():
+        if(len(rows) > 0):
+            conn.executemany(ROLLUP_UPSERT.format(resolution), rows)
+
+
+def Resolution(table, sensorID, start, end, points):
+    """
+    Pick the finest resolution which returns no more than points rows from start to end: raw, minute or hour.
+    The number of raw rows is counted from the hour rollups, so nothing is scanned to decide. Hours are used if nothing fits.
+    """
+    with manager.Reader() as conn:
+        counts = PartitionedSelect(conn, "SELECT SUM(count) FROM {}.Rollup_hour WHERE tableName = (?) AND sensor_ID = (?) AND channel = (?) AND bucket >= (?) AND bucket < (?)",
+                                   (table, sensorID, insertRegistry.Table(table).channels[0][0], start - start % rollupResolutions["hour"], end), start, end)
+    rawCount = sum(count[0] for count in counts if count[0] is not None)
+    if(rawCount <= points):
+        return "raw"
+    for resolution, length in rollupResolutions.items():
+        if((end - start) / length <= points):
+            return resolution
+    return "hour"
+
+
+def Rollup_select(table, sensorID, channel, start, end, points=1000):
+    """
+    Select one channel of one sensor from start up to but not including end, at the finest resolution that fits in points rows.
+
+    Returns the resolution used, and a list of rows of (timestamp, count, min, max, mean, last) in time order.
+    Raw rows have a count of one, with the value as the min, max, mean and last.
+    """
+    query = insertRegistry.Table(table)
+    if(query is None or channel not in [name for name, index in query.channels]):
+        raise ValueError("{} is not a channel of {}".format(channel, table))
+    try:
+        resolution = Resolution(table, sensorID, start, end, points)
+        with manager.Reader() as conn:
+            if(resolution == "raw"):
+                select = "SELECT timestamp, 1, {0}, {0}, {0}, {0} FROM {{}}.{1} WHERE sensor_ID = (?) AND timestamp >= (?) AND timestamp < (?) ORDER BY timestamp".format(channel, table)
+                return resolution, PartitionedSelect(conn, select, (sensorID, start, end), start, end)
+            bucketStart = start - start % rollupResolutions[resolution]
+            select = ("SELECT bucket, count, min, max, sum / count, last FROM {{}}.Rollup_{} WHERE tableName = (?) AND sensor_ID = (?) AND channel = (?) "
+                      "AND bucket >= (?) AND bucket < (?) ORDER BY bucket").format(resolution)
+            return resolution, PartitionedSelect(conn, select, (table, sensorID, channel, bucketStart, end), start, end)
+    except Error as e:
+        print("Did not connect, error: {}".format(e))
+
+
+# The most fixes packed into one block of raw NMEA sentences.
+NMEA_BLOCK_FIXES = 64
+
+NMEA_BLOCK_INSERT = "INSERT INTO GPS_NMEA(sensor_ID, firstTimestamp, lastTimestamp, fixCount, dictionary, data) VALUES((?),(?),(?),(?),(?),(?))"
+
+def NMEA_block_insert(conn, sensorID, fixes):
+    # Pack the fixes into blocks of NMEA_BLOCK_FIXES.
+    for start in range(0, len(fixes), NMEA_BLOCK_FIXES):
+        block = fixes[start:start + NMEA_BLOCK_FIXES]
+        timestamps = [fix[0] for fix in block]
+        conn.execute(NMEA_BLOCK_INSERT, (sensorID, min(timestamps), max(timestamps), len(block), CURRENT_DICTIONARY, PackBlock(block)))
+
+NMEA_STAGED_INSERT = "INSERT INTO GPS_NMEA_staged(sensor_ID, timestamp, {}) VALUES((?),(?),{})".format(
+    ", ".join(NMEA_COLUMNS), ",".join(["(?)"] * len(NMEA_COLUMNS)))
+
+def NMEA_store(conn, groups):
+    """
+    Add the raw NMEA sentences carried on the end of the GPS rows being inserted to the GPS_NMEA table, using the connection of their transaction.
+
+    The sentences are staged uncompressed in the GPS_NMEA_staged table first. Once a sensor has NMEA_BLOCK_FIXES fixes staged
+    they are compressed into a block and taken out of the staging table, so every block is compressed once, when it is full.
+    """
+    fixes = {}
+    for row in groups.get(GPS_INSERT, []):
+        if(len(row) > GPS_TABLE_COLUMNS):
+            fixes.setdefault(row[0], []).append(row[:2] + tuple(row[GPS_TABLE_COLUMNS:]))
+    for sensorID, sensorFixes in fixes.items():
+        conn.executemany(NMEA_STAGED_INSERT, sensorFixes)
+        staged = conn.execute("SELECT COUNT(*) FROM GPS_NMEA_staged WHERE sensor_ID = (?)", (sensorID,)).fetchone()[0]
+        if(staged < NMEA_BLOCK_FIXES):
+            continue
+        full = conn.execute("SELECT rowid, timestamp, {} FROM GPS_NMEA_staged WHERE sensor_ID = (?) ORDER BY timestamp, rowid LIMIT (?)".format(
+            ", ".join(NMEA_COLUMNS)), (sensorID, staged - staged % NMEA_BLOCK_FIXES)).fetchall()
+        NMEA_block_insert(conn, sensorID, [(fix[1], fix[2:]) for fix in full])
+        conn.executemany("DELETE FROM GPS_NMEA_staged WHERE rowid = (?)", [(fix[0],) for fix in full])
+
+def NMEA_select(sensorID, start, end):
+    """
+    Return the raw NMEA sentences of one GPS's fixes from start up to but not including end, oldest first,
+    as a list of (timestamp, sentences) with the sentences in the order of NMEA_COLUMNS.
+    Only the blocks overlapping the window are read and decompressed, along with the fixes still staged for the next block.
+    """
+    select = "SELECT dictionary, data FROM {}.GPS_NMEA WHERE sensor_ID = (?) AND lastTimestamp >= (?) AND firstTimestamp < (?)"
+    selectStaged = "SELECT timestamp, {} FROM {{}}.GPS_NMEA_staged WHERE sensor_ID = (?) AND timestamp >= (?) AND timestamp < (?)".format(
+        ", ".join(NMEA_COLUMNS))
+    blocks = []
+    staged = []
+    try:
+        with manager.Reader() as conn:
+            blocks.extend(conn.execute(select.format("main"), (sensorID, start, end)).fetchall())
+            staged.extend(conn.execute(selectStaged.format("main"), (sensorID, start, end)).fetchall())
+            if(partitions.Enabled()):
+                for path in partitions.Overlapping(conn, start, end):
+                    with partitions.Attached(conn, path):
+                        try:
+                            blocks.extend(conn.execute(select.format("part"), (sensorID, start, end)).fetchall())
+                            staged.extend(conn.execute(selectStaged.format("part"), (sensorID, start, end)).fetchall())
+                        except sqlite3.OperationalError:
+                            # Partitions closed before the GPS_NMEA table existed keep their sentences in their GPS table.
+                            continue
+    except Error as e:
+        print("Did not connect, error: {}".format(e))
+        return []
+    fixes = [fix for dictionary, data in blocks for fix in UnpackBlock(data, dictionary) if start <= fix[0] < end]
+    fixes += [(fix[0], tuple(sentence or None for sentence in fix[1:])) for fix in staged]
+    fixes.sort(key=lambda fix: fix[0])
+    return fixes
+
+
+class NaturalKey(object):
+    """
+    The columns which tell one reading of a sensor table from another however many times it is written,
+    kept unique by a unique index so a replayed or backfilled reading is only stored once.
+
+    columns is a list of the key's column names. where is the condition in SQL the index is limited to,
+    so a row whose key values are empty has nothing to tell it apart by and is always written.
+    The insert statement is INSERT OR IGNORE, so a row whose key is already in the table is left out by sqlite itself.
+    """
+
+    def __init__(self, table, columns, where=None):
+        self.table = table
+        self.columns = columns
+        self.where = where
+        self.name = "{}_natural_key".format(table)
+        # The rows the unique index covers, the same as the condition the index is limited to.
+        self.indexed = " AND ".join(["{} IS NOT NULL".format(column) for column in columns] + ([where] if where is not None else []))
+
+    def LastKey(self, conn):
+        """
+        The largest primary key in the table, which every row inserted after it is given a larger one than.
+        """
+        return conn.execute("SELECT MAX({}) FROM {}".format(timestampTables[self.table].key, self.table)).fetchone()[0] or 0
+
+    def Inserted(self, conn, columnNames, tableRows, lastKey):
+        """
+        Return the positions in tableRows of the rows an executemany of INSERT OR IGNORE wrote, in order, after some were left out.
+
+        The key values of the rows are put in a temporary table with the same column types, so they are stored as the table stores them,
+        and joined with the rows given a primary key above lastKey. Rows outside the unique index are always written.
+        Where the same key is on more than one row, the first was written and the rest were left out.
+        """
+        batch = "temp.{}_batch_keys".format(self.table)
+        columnList = ", ".join(self.columns)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS {}_batch_keys AS SELECT {} FROM {} WHERE 0".format(self.table, columnList, self.table))
+        conn.execute("DELETE FROM {}".format(batch))
+        positions = [columnNames.index(column) for column in self.columns]
+        conn.executemany("INSERT INTO {}(rowid, {}) VALUES({})".format(batch, columnList, ", ".join(["(?)"] * (len(self.columns) + 1))),
+                         [[position] + [tableRow[index] for index in positions] for position, tableRow in enumerate(tableRows)])
+        key = timestampTables[self.table].key
+        unindexed = "SELECT rowid FROM {} WHERE NOT ({})".format(batch, self.indexed)
+        firstOfEachKey = "SELECT MIN(b.position) FROM (SELECT rowid AS position, {} FROM {} WHERE {}) b JOIN {} n ON n.{} > (?) AND {} GROUP BY n.{}".format(
+            columnList, batch, self.indexed, self.table, key, " AND ".join(["n.{0} = b.{0}".format(column) for column in self.columns]), key)
+        inserted = conn.execute("{} UNION {} ORDER BY 1".format(unindexed, firstOfEachKey), (lastKey,)).fetchall()
+        conn.execute("DELETE FROM {}".format(batch))
+        return [position for position, in inserted]
+
+    def Apply(self, conn):
+        """
+        Make the unique index on the key, first deleting every copy of a reading but the one written first.
+        Does nothing if the index is already there, so it is quick to call on every partition as it is opened.
+        """
+        if(conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = (?)", (self.name,)).fetchone() is not None):
+            return
+        key = timestampTables[self.table].key
+        columnNames = ", ".join(self.columns)
+        deleted = conn.execute("DELETE FROM {0} WHERE {1} AND {2} NOT IN (SELECT MIN({2}) FROM {0} WHERE {1} GROUP BY {3})".format(
+            self.table, self.indexed, key, columnNames)).rowcount
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {}({}){}".format(
+            self.name, self.table, columnNames, " WHERE {}".format(self.where) if self.where is not None else ""))
+        if(deleted > 0):
+            print("Deleted {} duplicate rows from {} before making its natural key unique".format(deleted, self.table))
+
+
+# BB9 frames count up from power on, so the counter on its own would repeat after the meter restarts, and nothing else in a frame
+# tells two readings apart: a meter in still water can send the same signals and checksum under the same counter after a restart.
+# So the key includes the timestamp the reading was given when it was read. This leaves out a reading written again with its
+# timestamp, by a journal replay or a backfill, but not a frame the meter sends or is read twice, which is given a new timestamp.
+BB9_NATURAL_KEY = NaturalKey("BB9", ["sensor_ID", "Record_Counter", "timestamp"])
+# A GPS gives one fix a second, stamped with its own UTC date and time. Without a fix they can be empty.
+GPS_NATURAL_KEY = NaturalKey("GPS", ["sensor_ID", "Date", "Time"], "Date <> '' AND Time <> ''")
+
+naturalKeys = [BB9_NATURAL_KEY, GPS_NATURAL_KEY]
+
+
+class InsertQuery(object):
+    """
+    The insert statement for one sensor's table, with the function mapping a line of data onto its columns
+    and the number of fields a line needs before it can be mapped.
+
+    channels is a list of [column name, index in the row] for each numeric column kept in the rollup tables.
+    tableColumns is the number of values at the start of each row which go into the table, when the rows carry more values
+    on the end for a side table, such as the raw NMEA sentences of a GPS fix. None means the whole row goes into the table.
+    naturalKey is the NaturalKey rows already in the table are left out by, None if every row is written.
+    """
+
+    def __init__(self, sensorType, statement, columns, fieldCount, table=None, channels=None, tableColumns=None, naturalKey=None):
+        self.sensorType = sensorType
+        self.statement = statement
+        self.columns = columns
+        self.fieldCount = fieldCount
+        self.table = table
+        self.channels = channels if channels is not None else []
+        self.tableColumns = tableColumns
+        self.naturalKey = naturalKey
+        # The table's columns in the order the statement inserts them.
+        self.tableColumnNames = statement[statement.index("(") + 1:statement.index(")")].split(", ")
+
+
+class InsertRegistry(object):
+    """
+    Looks up the insert query for a sensor type in one step, and keeps count of the rows accepted and rejected for each type.
+
+    A row is rejected if there is no insert query for its sensor type, or the line does not have enough fields for its table.
+    A row is ignored when it is written if it is a duplicate of a reading already in its table, by the table's natural key.
+    """
+
+    def __init__(self, insertQueries):
+        self.queries = {}
+        self.statements = {}
+        for query in insertQueries:
+            self.queries[query.sensorType] = query
+            self.statements[query.statement] = query
+        self.accepted = collections.Counter()
+        self.rejected = collections.Counter()
+        self.ignored = collections.Counter()
+
+    def Row(self, sensorType, line, sensorID, timestamp=None):
+        """
+        Return the insert statement and the row of column values for a line of data read at timestamp,
+        or (None, None) if the line was rejected.
+        """
+        query = self.queries.get(sensorType)
+        if(query is None):
+            self.rejected[sensorType] += 1
+            print("No insert query for sensor {}, line of data rejected.".format(sensorType))
+            return None, None
+        if(len(line) < query.fieldCount):
+            self.rejected[sensorType] += 1
+            print("Line of data from {} has {} of {} fields, rejected.".format(sensorType, len(line), query.fieldCount))
+            return None, None
+        self.accepted[sensorType] += 1
+        return query.statement, query.columns(line, sensorID, timestamp)
+
+    def Table(self, table):
+        """
+        Return the insert query for the table with this name, or None if there isn't one.
+        """
+        for query in self.queries.values():
+            if(query.table == table):
+                return query
+        return None
+
+    def Report(self):
+        """
+        Print the number of rows accepted, rejected and ignored as duplicates for each sensor type, and the number of malformed lines quarantined.
+        """
+        for sensorType in sorted(set(self.accepted) | set(self.rejected) | set(self.ignored)):
+            if(sensorType != "Quarantine"):
+                print("{}: {} rows accepted, {} rejected, {} duplicates ignored".format(
+                    sensorType, self.accepted[sensorType], self.rejected[sensorType], self.ignored[sensorType]))
+        print("{} malformed lines quarantined".format(self.accepted["Quarantine"]))
+
+
+# Built once when the module is loaded so the sensor manager can find the insert query for each sensor by its type.
+# The rows every columns function returns start with the sensor ID and timestamp, so the first channel of each table is at index 2 or later.
+insertRegistry = InsertRegistry([
+    InsertQuery("BB3", BB3_INSERT, BB3_columns, 9, "BB3",
+                [["value1", 4], ["value2", 5], ["value3", 6], ["temperature", 7]]),
+    InsertQuery("BB9", BB9_INSERT, BB9_columns, 24, "BB9",
+                [["Signal_{}".format(signal), 6 + 2 * signal] for signal in range(1, 10)], naturalKey=BB9_NATURAL_KEY),
+    InsertQuery("BB", BB_INSERT, BB_columns, 5, "BB",
+                [["scattering_signal", 5], ["thermistor", 6]]),
+    InsertQuery("NTU", NTU_INSERT, NTU_columns, 6, "NTU",
+                [["NTU_Signal", 5], ["Thermistor", 6]]),
+    InsertQuery("GPS_UBLOX7", GPS_INSERT, GPS_columns, 15, tableColumns=GPS_TABLE_COLUMNS, naturalKey=GPS_NATURAL_KEY),
+    InsertQuery("Quarantine", QUARANTINE_INSERT, Quarantine_columns, 3)
+])
 
 SQLSelectQueries = [
     ["BB3",BB3_select]
 ]
 
 
-# Another switch factory hybrid to create a table when it doesn't exist, feature still needs to be added to sensor manager.
+# The tables as they are now. A new partition is made with these, and a new database by running every schema migration.
 SQLSchema = [
-    ["BB3", "CREATE TABLE BB3(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, currentdate DATE, currenttime TIME, value1 NUMERIC, value2 NUMERIC, value3 NUMERIC, temperature NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
-    ["BB9", "CREATE TABLE BB9(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, Header TEXT, Meter_Type_and_SN TEXT, Number_Of_Columns NUMERIC, Packet_Version NUMERIC, Record_Counter NUMERIC, Reference_1 NUMERIC, Signal_1 NUMERIC, Reference_2 NUMERIC, Signal_2 NUMERIC, Reference_3 NUMERIC, Signal_3 NUMERIC, Reference_4 NUMERIC, Signal_4 NUMERIC, Reference_5 NUMERIC, Signal_5 NUMERIC, Reference_6 NUMERIC, Signal_6 NUMERIC, Reference_7 NUMERIC, Signal_7 NUMERIC, Reference_8 NUMERIC, Signal_8 NUMERIC, Reference_9 NUMERIC, Signal_9 NUMERIC, CheckSum TEXT, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
-    ["BB", "CREATE TABLE BB(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, currentdate DATE, currenttime TIME, scattering_reference NUMERIC, scattering_signal NUMERIC, thermistor NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
-    ["NTU", "CREATE TABLE NTU(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, currentdate DATE, currenttime TIME, lambda NUMERIC, NTU_Signal NUMERIC, Thermistor NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
+    ["BB3", "CREATE TABLE BB3(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, currentdate DATE, currenttime TIME, value1 NUMERIC, value2 NUMERIC, value3 NUMERIC, temperature NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
+    ["BB9", "CREATE TABLE BB9(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, Header TEXT, Meter_Type_and_SN TEXT, Number_Of_Columns NUMERIC, Packet_Version NUMERIC, Record_Counter NUMERIC, Reference_1 NUMERIC, Signal_1 NUMERIC, Reference_2 NUMERIC, Signal_2 NUMERIC, Reference_3 NUMERIC, Signal_3 NUMERIC, Reference_4 NUMERIC, Signal_4 NUMERIC, Reference_5 NUMERIC, Signal_5 NUMERIC, Reference_6 NUMERIC, Signal_6 NUMERIC, Reference_7 NUMERIC, Signal_7 NUMERIC, Reference_8 NUMERIC, Signal_8 NUMERIC, Reference_9 NUMERIC, Signal_9 NUMERIC, CheckSum TEXT, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
+    ["BB", "CREATE TABLE BB(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, currentdate DATE, currenttime TIME, scattering_reference NUMERIC, scattering_signal NUMERIC, thermistor NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
+    ["NTU", "CREATE TABLE NTU(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, currentdate DATE, currenttime TIME, lambda NUMERIC, NTU_Signal NUMERIC, Thermistor NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
     ["Sensors", "CREATE TABLE Sensors(id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE, sensorType TEXT, port TEXT, uniqueName TEXT);"],
-    ["GPS", "CREATE TABLE GPS(EntryID INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, Time TIME, Date DATE, Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction, Number_Of_Satelites, GPRMC, GPVTG, GPGGA, GPGSA, GPGSV, GPGLL, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"]    
-]
\ No newline at end of file
+    ["GPS", "CREATE TABLE GPS(EntryID INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, Time TIME, Date DATE, Latitude_Value REAL, Latitude_Direction, Longitude_Value REAL, Longitude_Direction, Number_Of_Satelites INTEGER, Latitude REAL, Longitude REAL, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
+    ["GPS_NMEA", "CREATE TABLE GPS_NMEA(blockID INTEGER PRIMARY KEY, sensor_ID INTEGER, firstTimestamp INTEGER, lastTimestamp INTEGER, fixCount INTEGER, dictionary INTEGER, data BLOB);"],
+    ["Quarantine", "CREATE TABLE Quarantine(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, sensorType TEXT, line TEXT, reason TEXT, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));"],
+    ["Rollup_minute", "CREATE TABLE Rollup_minute(tableName TEXT, sensor_ID INTEGER, channel TEXT, bucket INTEGER, count INTEGER, min REAL, max REAL, sum REAL, last REAL, lastTimestamp INTEGER, PRIMARY KEY (tableName, sensor_ID, channel, bucket)) WITHOUT ROWID;"],
+    ["Rollup_hour", "CREATE TABLE Rollup_hour(tableName TEXT, sensor_ID INTEGER, channel TEXT, bucket INTEGER, count INTEGER, min REAL, max REAL, sum REAL, last REAL, lastTimestamp INTEGER, PRIMARY KEY (tableName, sensor_ID, channel, bucket)) WITHOUT ROWID;"],
+    ["JournalApplied", "CREATE TABLE JournalApplied(segment TEXT PRIMARY KEY, appliedAt INTEGER);"],
+    ["GPS_NMEA_staged", "CREATE TABLE GPS_NMEA_staged(sensor_ID INTEGER, timestamp INTEGER, GPRMC TEXT, GPVTG TEXT, GPGGA TEXT, GPGSA TEXT, GPGSV TEXT, GPGLL TEXT);"]
+]
+
+
+# The tables as the first schema migration makes them, kept as they were when it was released. Later migrations change them from here.
+CREATE_TABLES = [
+    "CREATE TABLE BB3(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, currentdate DATE, currenttime TIME, value1 NUMERIC, value2 NUMERIC, value3 NUMERIC, temperature NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));",
+    "CREATE TABLE BB9(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, Header TEXT, Meter_Type_and_SN TEXT, Number_Of_Columns NUMERIC, Packet_Version NUMERIC, Record_Counter NUMERIC, Reference_1 NUMERIC, Signal_1 NUMERIC, Reference_2 NUMERIC, Signal_2 NUMERIC, Reference_3 NUMERIC, Signal_3 NUMERIC, Reference_4 NUMERIC, Signal_4 NUMERIC, Reference_5 NUMERIC, Signal_5 NUMERIC, Reference_6 NUMERIC, Signal_6 NUMERIC, Reference_7 NUMERIC, Signal_7 NUMERIC, Reference_8 NUMERIC, Signal_8 NUMERIC, Reference_9 NUMERIC, Signal_9 NUMERIC, CheckSum TEXT, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));",
+    "CREATE TABLE BB(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, currentdate DATE, currenttime TIME, scattering_reference NUMERIC, scattering_signal NUMERIC, thermistor NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));",
+    "CREATE TABLE NTU(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, currentdate DATE, currenttime TIME, lambda NUMERIC, NTU_Signal NUMERIC, Thermistor NUMERIC, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));",
+    "CREATE TABLE Sensors(id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE, sensorType TEXT, port TEXT, uniqueName TEXT);",
+    "CREATE TABLE GPS(EntryID INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, Time TIME, Date DATE, Latitude_Value REAL, Latitude_Direction, Longitude_Value REAL, Longitude_Direction, Number_Of_Satelites INTEGER, GPRMC, GPVTG, GPGGA, GPGSA, GPGSV, GPGLL, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));",
+    "CREATE TABLE Quarantine(id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, sensorType TEXT, line TEXT, reason TEXT, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));",
+    "CREATE TABLE Rollup_minute(tableName TEXT, sensor_ID INTEGER, channel TEXT, bucket INTEGER, count INTEGER, min REAL, max REAL, sum REAL, last REAL, lastTimestamp INTEGER, PRIMARY KEY (tableName, sensor_ID, channel, bucket)) WITHOUT ROWID;",
+    "CREATE TABLE Rollup_hour(tableName TEXT, sensor_ID INTEGER, channel TEXT, bucket INTEGER, count INTEGER, min REAL, max REAL, sum REAL, last REAL, lastTimestamp INTEGER, PRIMARY KEY (tableName, sensor_ID, channel, bucket)) WITHOUT ROWID;"
+]
+
+
+def CreateTables(conn):
+    """
+    Make every table in CREATE_TABLES. Databases made before schema versions were kept already have some of them.
+    """
+    for statement in CREATE_TABLES:
+        conn.execute(statement.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1))
+
+
+def SensorsGenerationMigration(conn):
+    """
+    Make the SensorsGeneration table, which holds one row counting the changes made to the Sensors table.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS SensorsGeneration(generation INTEGER NOT NULL);")
+    if(conn.execute("SELECT COUNT(*) FROM SensorsGeneration").fetchone()[0] == 0):
+        conn.execute("INSERT INTO SensorsGeneration(generation) VALUES(0)")
+
+
+GPS_NMEA_INDEX = "CREATE INDEX IF NOT EXISTS GPS_NMEA_sensor_time ON GPS_NMEA(sensor_ID, lastTimestamp)"
+NMEA_STAGED_INDEX = "CREATE INDEX IF NOT EXISTS GPS_NMEA_staged_sensor_time ON GPS_NMEA_staged(sensor_ID, timestamp)"
+
+def NMEAMigration(conn):
+    """
+    Make the GPS_NMEA table. A GPS table made before it has its raw NMEA sentences moved into compressed blocks,
+    then is rebuilt without the sentence columns, which reads and rewrites the whole GPS table once.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS GPS_NMEA(blockID INTEGER PRIMARY KEY, sensor_ID INTEGER, firstTimestamp INTEGER, lastTimestamp INTEGER, fixCount INTEGER, dictionary INTEGER, data BLOB);")
+    conn.execute("CREATE INDEX IF NOT EXISTS GPS_NMEA_sensor_time ON GPS_NMEA(sensor_ID, lastTimestamp)")
+    if("GPRMC" not in [column[1] for column in conn.execute("PRAGMA table_info(GPS)")]):
+        return
+    cursor = conn.execute("SELECT sensor_ID, timestamp, Date, Time, {0} FROM GPS WHERE COALESCE({0}) IS NOT NULL ORDER BY EntryID".format(
+        ", ".join(NMEA_COLUMNS)))
+    fixes = {}
+    moved = 0
+    while True:
+        rows = cursor.fetchmany(NMEA_BLOCK_FIXES * 16)
+        if(len(rows) == 0):
+            break
+        for row in rows:
+            # Rows not backfilled yet are given their timestamp from their $GPRMC date and time.
+            timestamp = row[1] if row[1] is not None else (GPSTimeMillis(row[2], row[3]) or 0)
+            sensorFixes = fixes.setdefault(row[0], [])
+            sensorFixes.append((timestamp, row[4:]))
+            if(len(sensorFixes) == NMEA_BLOCK_FIXES):
+                NMEA_block_insert(conn, row[0], sensorFixes)
+                moved += len(sensorFixes)
+                fixes[row[0]] = []
+    for sensorID, sensorFixes in fixes.items():
+        NMEA_block_insert(conn, sensorID, sensorFixes)
+        moved += len(sensorFixes)
+    narrowColumns = "EntryID, sensor_ID, timestamp, Time, Date, Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction, Number_Of_Satelites"
+    conn.execute("CREATE TABLE GPS_narrow(EntryID INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, Time TIME, Date DATE, Latitude_Value REAL, Latitude_Direction, Longitude_Value REAL, Longitude_Direction, Number_Of_Satelites INTEGER, FOREIGN KEY (sensor_ID) REFERENCES Sensors(id));")
+    conn.execute("INSERT INTO GPS_narrow({0}) SELECT {0} FROM GPS".format(narrowColumns))
+    conn.execute("DROP TABLE GPS")
+    conn.execute("ALTER TABLE GPS_narrow RENAME TO GPS")
+    conn.execute("CREATE INDEX IF NOT EXISTS GPS_sensor_timestamp ON GPS(sensor_ID, timestamp)")
+    print("Moved the raw NMEA sentences of {} GPS fixes into compressed blocks".format(moved))
+
+
+def SQLDecimalDegrees(value, direction):
+    # DecimalDegrees for use in SQL, giving NULL for a value it can't read.
+    try:
+        return DecimalDegrees("" if value is None else str(value), direction)
+    except ValueError:
+        return None
+
+
+def GPSDegreesColumns(conn):
+    """
+    Add the Latitude and Longitude columns, in signed decimal degrees, to a GPS table made before them.
+    Returns True if they were added, so a partition opened again is only checked.
+    """
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(GPS)")]
+    if(len(columns) == 0 or "Latitude" in columns):
+        return False
+    conn.execute("ALTER TABLE GPS ADD COLUMN Latitude REAL")
+    conn.execute("ALTER TABLE GPS ADD COLUMN Longitude REAL")
+    return True
+
+
+def GPSDegreesFill(conn):
+    """
+    Fill in Latitude and Longitude from the unsigned ddmm.mmmm Latitude_Value and Longitude_Value and their directions,
+    for the fixes written before they existed.
+    """
+    conn.create_function("DecimalDegrees", 2, SQLDecimalDegrees, deterministic=True)
+    filled = conn.execute("UPDATE GPS SET Latitude = DecimalDegrees(Latitude_Value, Latitude_Direction), "
+                          "Longitude = DecimalDegrees(Longitude_Value, Longitude_Direction) "
+                          "WHERE Latitude IS NULL AND Longitude IS NULL AND (Latitude_Value IS NOT NULL OR Longitude_Value IS NOT NULL)").rowcount
+    print("Filled in the decimal degrees of {} GPS fixes".format(filled))
+
+
+def GPSDegreesMigration(conn):
+    """
+    Give the GPS table its position in signed decimal degrees alongside the ddmm.mmmm values, filled in for the fixes already written.
+    """
+    if(len(conn.execute("PRAGMA table_info(GPS)").fetchall()) > 0):
+        GPSDegreesColumns(conn)
+        GPSDegreesFill(conn)
+
+
+def PartitionGPSDegrees(conn):
+    # A partition made before the decimal degree columns gets them, and its fixes filled in, the first time it is opened.
+    if(GPSDegreesColumns(conn)):
+        GPSDegreesFill(conn)
+
+
+# The natural keys as the sixth schema migration makes them, kept as they were when it was released.
+NATURAL_KEYS_MIGRATION = [
+    NaturalKey("BB9", ["sensor_ID", "Record_Counter", "timestamp"]),
+    NaturalKey("GPS", ["sensor_ID", "Date", "Time"], "Date <> '' AND Time <> ''")
+]
+
+
+def NMEAStagingMigration(conn):
+    """
+    Make the GPS_NMEA_staged table the raw NMEA sentences wait in until there are enough for a block.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS GPS_NMEA_staged(sensor_ID INTEGER, timestamp INTEGER, GPRMC TEXT, GPVTG TEXT, GPGGA TEXT, GPGSA TEXT, GPGSV TEXT, GPGLL TEXT);")
+    conn.execute("CREATE INDEX IF NOT EXISTS GPS_NMEA_staged_sensor_time ON GPS_NMEA_staged(sensor_ID, timestamp)")
+
+
+def NaturalKeyMigration(conn):
+    """
+    Make the unique index on every natural key in NATURAL_KEYS_MIGRATION, deleting the duplicates already written.
+    """
+    for naturalKey in NATURAL_KEYS_MIGRATION:
+        naturalKey.Apply(conn)
+
+
+class Migration(object):
+    """
+    One step in the history of the schema. apply is called with the writer connection, inside the migration's transaction.
+    """
+
+    def __init__(self, version, description, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+# Every change to the schema is added to the end of this list with the next version, and never changed once released.
+# So each migration spells out the statements it runs, rather than using SQLSchema or any other definition which changes later.
+schemaMigrations = [
+    Migration(1, "Make the sensor, quarantine and rollup tables", CreateTables),
+    Migration(2, "Add timestamp columns and (sensor_ID, timestamp) indexes", TimestampMigration),
+    Migration(3, "Make the partition catalog", lambda conn: conn.execute("CREATE TABLE IF NOT EXISTS Partitions(path TEXT PRIMARY KEY, startTime INTEGER, endTime INTEGER);")),
+    Migration(4, "Keep a generation number for the Sensors table", SensorsGenerationMigration),
+    Migration(5, "Move the raw NMEA sentences out of the GPS table into compressed blocks", NMEAMigration),
+    Migration(6, "Make the natural keys of the BB9 and GPS tables unique", NaturalKeyMigration),
+    Migration(7, "Add the GPS position in signed decimal degrees alongside the ddmm.mmmm values", GPSDegreesMigration),
+    Migration(8, "Keep the journal segments applied", lambda conn: conn.execute("CREATE TABLE IF NOT EXISTS JournalApplied(segment TEXT PRIMARY KEY, appliedAt INTEGER);")),
+    Migration(9, "Stage the raw NMEA sentences uncompressed until a block is full", NMEAStagingMigration)
+]
+
+
+# Each partition holds its own copy of the sensor tables and their indexes.
+partitionSchema = [schema[1].replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1) for schema in SQLSchema if schema[0] != "Sensors"]
+partitionSchema += ["CREATE INDEX IF NOT EXISTS {0}_sensor_timestamp ON {0}(sensor_ID, timestamp)".format(table) for table in timestampTables]
+partitionSchema += [GPS_NMEA_INDEX, NMEA_STAGED_INDEX, PartitionGPSDegrees]
+partitionSchema += [naturalKey.Apply for naturalKey in naturalKeys]
+
+partitions = PartitionManager(parser.get('database', 'connection'),
+                              parser.get('database', 'partition', fallback='none'),
+                              pragmaProfile,
+                              partitionSchema,
+                              parser.getint('database', 'cachedStatements', fallback=128))
+
+atexit.register(partitions.Close)
+
+# The Sensors table kept in memory, shared by the sensor manager and the web app.
+sensorRegistry = SensorRegistry(manager)
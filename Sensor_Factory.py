@@ -23,9 +23,10 @@ sensors = {
     CONST_GPS_UBLOX7: GPS_UBLOX7
 }
 
-def factory(type, port):
+def factory(type, port, readMode="poll"):
     """
     When a sensor name is passed in, return an object of that sensor.
+    readMode is either poll or blocking, and sets how the sensor reads its serial port.
     """
     if type in sensors.keys():
-        return sensors[type](port)
\ No newline at end of file
+        return sensors[type](port, readMode)
\ No newline at end of file
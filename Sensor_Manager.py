@@ -7,15 +7,31 @@ from SQL_queries import Sensors_select_type
 from SQL_queries import Sensors_select_id
 from SQL_queries import Sensors_select_port
 from SQL_queries import Sensors_Update
-from functools import partial
-from SQL_queries import SQLInsertQueries
+from SQL_queries import insertRegistry
+from SQL_queries import Row_insert
+from SQL_queries import Batch_insert
 from configparser import ConfigParser
 import threading
 import collections
 import concurrent.futures
 import queue
+from queue import Empty
 import time
+import signal
 from SQL_queries import SchemaLooper 
+from SQL_queries import TimestampBackfill
+from SQL_queries import PartitionRotator
+from SQL_queries import partitions
+from Connection_Manager import manager
+from Async_Engine import AsyncEngine
+from Ingest_Queue import IngestQueue
+from Ingest_Queue import POLICY_BLOCK
+from Ingest_Journal import IngestJournal
+from Ingest_Journal import ReadSegment
+from Ingest_Journal import SegmentID
+from Sensor_Record import SingleLineBatches
+from Retention_Manager import RetentionEngine
+from Columnar_Archive import ArchiveExporter
 
 portsTaken = [["ttyACM0",False],["ttyACM1",False],["ttyUSB0",False],["ttyUSB1",False]]
 
@@ -33,13 +49,18 @@ class SensorThreader(threading.Thread):
     def sensorThread(self, queue, event, sensorObject, sensorType, sensorID):
         """
         This is a thread that will remain active until an 'end event' has been triggered.
-        It will continously read data from the sensor that has been passed in, and put that data into a queue.
+        It will continously read batches of data from the sensor that has been passed in, and put each batch into a queue as one item.
+        The sensor yields None when a read completes no readings, so a quiet sensor still gets back to checking the end event.
         """
         while not event.is_set():
             try:
-                line = next(sensorObject)
-                sensorData = [sensorType, line, sensorID]
-                queue.put(sensorData)
+                batch = next(sensorObject)
+                if(batch is not None):
+                    queue.put(batch)
+            except StopIteration:
+                # The reader has given up on the sensor, so let the supervisor know this thread has ended.
+                print("sensorThread {} ID:{} reader has stopped. Exiting.".format(sensorType, sensorID))
+                return
             except Exception as message:
                 print(message)
                 print(type(message))
@@ -48,28 +69,265 @@ class SensorThreader(threading.Thread):
             
         print("sensorThread {} ID:{} received end event. Exiting.".format(sensorType, sensorID))
 
+class Supervisor(object):
+    """
+    Keeps track of every thread the sensor manager starts, and waits for them without using any CPU.
+
+    Every function submitted gets a thread of its own, as most of them run until the program stops,
+    so however many sensors and background tasks there are none is left waiting for a thread to free up.
+    The supervisor sleeps until a thread exits or the program is asked to stop, reporting the state of the threads
+    when either happens and every reportInterval seconds in between.
+    Once stopped it sets the end event, so the threads finish up, and waits up to stopTimeout seconds for them.
+    The threads are daemon threads, so one stuck on a sensor can't stop the program exiting after that.
+    """
+
+    def __init__(self, reportInterval=60, stopTimeout=30):
+        self.reportInterval = reportInterval
+        self.stopTimeout = stopTimeout
+        self.endEvent = threading.Event()
+        self.futures = collections.OrderedDict()
+        self.reports = []
+        # Exited threads and stop requests are put on this queue to wake the supervisor up.
+        self.wakeups = queue.Queue()
+
+    def Submit(self, name, function, *args):
+        """
+        Run a function in a thread of its own, and keep track of it under the name passed in.
+        Returns a future which is done once the function returns or raises.
+        """
+        future = concurrent.futures.Future()
+
+        def RunFunction():
+            if(not future.set_running_or_notify_cancel()):
+                return
+            try:
+                result = function(*args)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        self.futures[future] = name
+        future.add_done_callback(self.wakeups.put)
+        threading.Thread(target=RunFunction, name=name, daemon=True).start()
+        return future
+
+    def AddReport(self, report):
+        """
+        Add a function to be called whenever the supervisor reports, such as one printing the pipeline's counters.
+        """
+        self.reports.append(report)
+
+    def Stop(self):
+        """
+        Ask every thread to finish and wake the supervisor up so it can wait for them.
+        Safe to call from a signal handler.
+        """
+        self.endEvent.set()
+        self.wakeups.put(None)
+
+    def ThreadStates(self):
+        """
+        Return a list of the name and current state of every thread being tracked.
+        """
+        states = []
+        for future, name in self.futures.items():
+            if(future.running()):
+                state = "running"
+            elif(not future.done()):
+                state = "waiting"
+            elif(future.cancelled()):
+                state = "cancelled"
+            elif(future.exception() is not None):
+                state = "failed: {}".format(future.exception())
+            else:
+                state = "finished"
+            states.append((name, state))
+        return states
+
+    def Report(self):
+        """
+        Print the state of every thread being tracked.
+        """
+        for name, state in self.ThreadStates():
+            print("Thread {} is {}".format(name, state))
+        for report in self.reports:
+            report()
+
+    def Run(self):
+        """
+        Block until the end event is set, reporting on the threads whenever one of them exits,
+        then wait up to stopTimeout seconds for the threads to finish and close the database.
+        """
+        while not self.endEvent.is_set():
+            try:
+                future = self.wakeups.get(timeout=self.reportInterval)
+            except Empty:
+                self.Report()
+                continue
+            if(future is not None):
+                print("Thread {} has exited.".format(self.futures[future]))
+                self.Report()
+
+        print("Supervisor received end event, waiting for threads to finish.")
+        done, notDone = concurrent.futures.wait(list(self.futures), timeout=self.stopTimeout)
+        for future in notDone:
+            print("Thread {} did not finish within {}s of being stopped, leaving it.".format(self.futures[future], self.stopTimeout))
+        self.Report()
+        partitions.Close()
+        manager.Close()
+
+def InstallSignalHandlers(stop):
+    """
+    Call stop when the program receives SIGTERM or SIGINT, so the threads can be ended cleanly.
+    Signal handlers can only be set from the main thread, so returns False if called from any other thread.
+    """
+    if(threading.current_thread() is not threading.main_thread()):
+        return False
+
+    def HandleSignal(signalNumber, frame):
+        print("Received signal {}, stopping.".format(signalNumber))
+        stop()
+
+    signal.signal(signal.SIGTERM, HandleSignal)
+    signal.signal(signal.SIGINT, HandleSignal)
+    return True
+
+def StopAndWait(supervisor, mainThread, timeout):
+    """
+    Stop the supervisor and wait up to timeout seconds for the thread running Main to finish.
+    Returns True if it finished in time, so a signal handler never waits forever on a sensor which won't stop.
+    """
+    supervisor.Stop()
+    mainThread.join(timeout)
+    return not mainThread.is_alive()
+
 def DatabaseAccessor(queue, event):
     """
     Thread which reads the next item in the queue and sends it to the function SQLFinder which inserts it into the database.
+    A batch of readings from one read of a sensor is written in a single transaction.
     This thread is always active until the 'end event' is trigered, and the queue is empty.
     """
     
     while not event.is_set() or not queue.empty():
-        sensorData = queue.get()
-        #         sensorType     line of data   unique sensor id
-        SQLFinder(sensorData[0], sensorData[1], sensorData[2])
+        # Wake up every so often to check whether the end event has been set.
+        try:
+            item = queue.get(timeout=1)
+        except Empty:
+            continue
+        if(item.Count() == 1):
+            record = item.Records()[0]
+            SQLFinder(record.sensorType, record.values, record.sensorID, record.timestamp)
+        else:
+            groups, rowCount = GroupRows([item])
+            if(rowCount > 0):
+                Batch_insert(groups)
+
+def BatchDatabaseAccessor(queue, event, batchSize, batchTimeout):
+    """
+    Thread which drains the queue in batches and writes each batch into the database in a single transaction.
+    A batch is closed once it holds batchSize readings, or batchTimeout seconds after its first item arrived.
+    This thread is always active until the 'end event' is trigered, and the queue is empty.
+    """
+
+    while not event.is_set() or not queue.empty():
+        batch = DrainQueue(queue, batchSize, batchTimeout)
+        if(len(batch) == 0):
+            continue
+
+        groups, rowCount = GroupRows(batch)
+        if(rowCount == 0):
+            continue
+        commitTime = Batch_insert(groups)
+        if(commitTime is not None):
+            print("Wrote batch of {} rows to {} tables, commit took {:.1f}ms".format(rowCount, len(groups), commitTime * 1000))
+
+def JournalLoader(journal, event, interval, maxAttempts=10):
+    """
+    Thread which applies the journal to the database. Every interval seconds the segment being written is sealed,
+    then each sealed segment is written to the database in one batch and deleted once it has been committed.
+    Segments left by the last run are sealed already, so are replayed first.
+    Once the end event is set whatever is in the journal is applied before the thread exits,
+    and anything put after that is left in the journal for the next run.
+
+    A segment which fails is tried again next interval, holding back the ones after it so they are applied in order.
+    After maxAttempts failures in a row it is moved aside, so one bad segment can't stop the journal being applied.
+    """
+    attempts = {}
+    while True:
+        stopping = event.is_set()
+        for path in journal.Seal():
+            try:
+                groups, rowCount = GroupRows(ReadSegment(path))
+                commitTime = Batch_insert(groups, SegmentID(path)) if rowCount > 0 else 0
+            except (OSError, TypeError, ValueError) as e:
+                print("Could not read journal segment {}, error: {}".format(path, e))
+                commitTime = None
+            if(commitTime is None):
+                attempts[path] = attempts.get(path, 0) + 1
+                if(attempts[path] < maxAttempts):
+                    # Left in the journal to be tried again next time.
+                    break
+                del attempts[path]
+                print("Journal segment {} failed {} times, moved it aside to {} so the segments after it can be applied.".format(
+                    path, maxAttempts, journal.MoveAside(path)))
+                continue
+            attempts.pop(path, None)
+            if(rowCount > 0):
+                print("Applied journal segment of {} rows to {} tables, commit took {:.1f}ms".format(rowCount, len(groups), commitTime * 1000))
+            journal.Remove(path)
+        if(stopping):
+            return
+        event.wait(interval)
+
+def GroupRows(items):
+    """
+    Turn the readings in a list of queue items into rows, grouped by the table they are going into so each table gets one executemany.
+    Returns the groups and the number of rows in them.
+    """
+    groups = {}
+    rowCount = 0
+    for item in items:
+        for record in item.Records():
+            statement, row = insertRegistry.Row(record.sensorType, record.values, record.sensorID, record.timestamp)
+            if(row is not None):
+                groups.setdefault(statement, []).append(row)
+                rowCount += 1
+    return groups, rowCount
+
+def DrainQueue(queue, batchSize, batchTimeout):
+    """
+    Take items off the queue until they hold at least batchSize readings, waiting no longer than batchTimeout seconds after the first one.
+    Returns an empty list if nothing arrived within batchTimeout.
+    """
+    batch = []
+    try:
+        batch.append(queue.get(timeout=batchTimeout))
+    except Empty:
+        return batch
+
+    readingCount = batch[0].Count()
+    deadline = time.monotonic() + batchTimeout
+    while readingCount < batchSize:
+        remaining = deadline - time.monotonic()
+        if(remaining <= 0):
+            break
+        try:
+            item = queue.get(timeout=remaining)
+        except Empty:
+            break
+        batch.append(item)
+        readingCount += item.Count()
+    return batch
 
-def SQLFinder(sensor, line, sensorID):
+def SQLFinder(sensor, line, sensorID, timestamp=None):
     """
-    This function searches through the implemented sql insert statements to find the one for the sensor passed in.
-    If a match is found, it then inserts the line of data into the sql table.
+    This function looks up the sql insert statement for the sensor passed in from the insert registry.
+    If the line of data is valid for that sensor, it then inserts the line of data into the sql table.
     """
-    # Check the implemented list of queries and find the one implemented for the current sensor.
-    for queryIndex in range(len(SQLInsertQueries)):
-        if(SQLInsertQueries[queryIndex][0] == sensor):
-            newInsert = partial(SQLInsertQueries[queryIndex][1])
-            newInsert(line, sensorID)
-            print("Sensor {}, output {}".format(sensor,line))
+    statement, row = insertRegistry.Row(sensor, line, sensorID, timestamp)
+    if(row is not None):
+        Row_insert(statement, row)
 
 
 def AddSensor(newSensor, port, uniqueName):
@@ -106,6 +364,29 @@ def AddSensor(newSensor, port, uniqueName):
         print("That port is already taken. Please check your port selection again.")
     return "Not happy"
 
+def StartSensor(supervisor, pipeline, engine, asyncSensors, newSensor, finalSensor):
+    """
+    Check the sensor can be read from, then either start a thread for it, or open its port without blocking
+    and add it to the list of sensors for the async engine.
+    Raises an exception if the sensor could not be read from.
+    """
+    newSensor.sensorID = finalSensor[0]
+    if(engine == "async"):
+        serialReader = newSensor.OpenPort(timeout=0)
+        asyncSensors.append([newSensor, serialReader, finalSensor[1], finalSensor[0]])
+    else:
+        # Drivers which only yield one reading at a time have their readings wrapped in batches of one.
+        if(hasattr(newSensor, "BatchReading")):
+            sensor = newSensor.BatchReading()
+        else:
+            sensor = SingleLineBatches(newSensor.Reading(), finalSensor[1], finalSensor[0])
+        # Reading the first batch checks the sensor answers, and it goes on to the pipeline rather than being dropped.
+        firstBatch = next(sensor)
+        if(firstBatch is not None):
+            pipeline.put(firstBatch)
+        sensorObject = SensorThreader(finalSensor[1])
+        supervisor.Submit("{} ID:{}".format(finalSensor[1], finalSensor[0]), sensorObject.sensorThread, pipeline, supervisor.endEvent, sensor, finalSensor[1], finalSensor[0])
+
 def portFinder(port):
     for portIndex in range(len(portsTaken)):
         if(portsTaken[portIndex][1] == False):
@@ -114,12 +395,13 @@ def portFinder(port):
                 return portsTaken[portIndex][0]
     return "nope"
 
-def Main():
+def Main(supervisor=None):
     """
     The main function which is run when the program starts up.
     It reads in the sensors the user requested, and sorts through approving them, and checking them against ones already set up in the database,
     in the event that the software is being restarted.
     After ensuring all the sensors are set up in the database, it sends each sensor object into its own thread to read data.
+    The threads are then watched by the supervisor until the program is stopped.
     """
 
     portsTaken = [["ttyACM0",False],["ttyACM1",False],["ttyUSB0",False],["ttyUSB1",False]]
@@ -138,9 +420,7 @@ def Main():
     parser = ConfigParser()
     parser.read('Config.ini')
     for each_section in parser.sections():
-        if(each_section == "database" or each_section == "UserRequest"):
-            pass
-        elif(each_section == "sensorCounters"):
+        if(each_section == "sensorCounters"):
             configSensorTypeIndex['BB3'] = parser.get(each_section, 'BB3')
             configSensorTypeIndex['BB9'] = parser.get(each_section, 'BB9')
             configSensorTypeIndex['BB'] = parser.get(each_section, 'BB')
@@ -148,7 +428,8 @@ def Main():
             configSensorTypeIndex['GPS1'] = parser.get(each_section, 'GPS1')
             configSensorTypeIndex['GPS_ublox7'] = parser.get(each_section, 'GPS_ublox7')
             configSensorTypeIndex['RTK'] = parser.get(each_section, 'RTK')
-        else:
+        # Sections without a sensor option, such as database and writer, hold settings rather than sensors.
+        elif(parser.has_option(each_section, 'sensor')):
             requestedSensorList.append(parser.get(each_section, 'sensor'))
 
     sensorTypeList = []
@@ -206,41 +487,95 @@ def Main():
                 FinalListOfSensors.append(dbSensorTuple)
                 del sensorTypeList[approvedSensor]
                 break
-    threadExecutor = concurrent.futures.ThreadPoolExecutor()
-    pipeline = queue.Queue(maxsize=1000000)
-    endEvent = threading.Event()
-    threadExecutor.submit(DatabaseAccessor, pipeline, endEvent)  
+    # If this is running in the main thread, stop cleanly on SIGTERM and SIGINT. Otherwise whoever started it passes in the supervisor to stop.
+    if(supervisor is None):
+        supervisor = Supervisor()
+        InstallSignalHandlers(supervisor.Stop)
+    endEvent = supervisor.endEvent
+    journal = None
+    if(parser.getboolean('journal', 'enabled', fallback=False)):
+        # The readers append to the journal on disk, which the loader applies to the database, so a crash loses nothing.
+        journal = IngestJournal(parser.get('journal', 'directory', fallback='') or parser.get('database', 'connection') + "_journal",
+                                parser.getint('journal', 'segmentBytes', fallback=1048576),
+                                parser.getint('journal', 'syncInterval', fallback=200) / 1000)
+        journal.Open()
+        print("Readings are journalled to {}, the [writer] and [queue] settings are not used.".format(journal.directory))
+        pipeline = journal
+    else:
+        # The pipeline has a memory budget, and each sensor's section in the config file can say what to do with its readings when it is full.
+        pipeline = IngestQueue(parser.getint('queue', 'maxBytes', fallback=33554432),
+                               parser.get('queue', 'defaultPolicy', fallback=POLICY_BLOCK),
+                               parser.getfloat('queue', 'decimateThreshold', fallback=0.75))
+        for finalSensor in FinalListOfSensors:
+            sensorSection = "{}_{}".format(finalSensor[1], finalSensor[3])
+            if(parser.has_option(sensorSection, 'overloadPolicy')):
+                pipeline.SetPolicy(finalSensor[0], parser.get(sensorSection, 'overloadPolicy'), parser.getint(sensorSection, 'decimation', fallback=10))
+    supervisor.AddReport(pipeline.Report)
+    supervisor.AddReport(insertRegistry.Report)
+    # Rows written before the timestamp column existed are filled in a chunk at a time alongside the sensors.
+    supervisor.Submit("TimestampBackfill", TimestampBackfill, endEvent, parser.getint('database', 'backfillChunkSize', fallback=5000))
+    if(partitions.Enabled()):
+        supervisor.Submit("PartitionRotator", PartitionRotator, endEvent)
+    # Old readings are deleted a chunk at a time in the background, as set in the retention section of the config file.
+    retention = RetentionEngine(parser.getint('retention', 'rawDays', fallback=0),
+                                parser.getint('retention', 'nmeaDays', fallback=0),
+                                parser.getint('retention', 'chunkSize', fallback=2000),
+                                parser.getint('retention', 'interval', fallback=300),
+                                parser.getint('retention', 'vacuumPages', fallback=256))
+    supervisor.Submit("RetentionEngine", retention.Run, endEvent)
+    # Closed partitions are copied into the columnar archive for analysis and the web app's history views.
+    if(partitions.Enabled() and parser.getboolean('archive', 'enabled', fallback=True)):
+        supervisor.Submit("ArchiveExporter", ArchiveExporter, endEvent,
+                          parser.get('archive', 'directory', fallback='archive'),
+                          parser.getint('archive', 'interval', fallback=3600))
+    # The journal is applied a segment at a time, otherwise either write each reading as it arrives, or drain the queue in batches, as set in the config file.
+    if(journal is not None):
+        if(journal.syncInterval > 0):
+            supervisor.Submit("JournalSyncer", journal.Syncer, endEvent)
+        supervisor.Submit("JournalLoader", JournalLoader, journal, endEvent, parser.getint('journal', 'applyInterval', fallback=1000) / 1000,
+                          parser.getint('journal', 'maxAttempts', fallback=10))
+    elif(parser.get('writer', 'mode', fallback='single') == "batch"):
+        batchSize = parser.getint('writer', 'batchSize', fallback=500)
+        batchTimeout = parser.getint('writer', 'batchTimeout', fallback=250) / 1000
+        supervisor.Submit("BatchDatabaseAccessor", BatchDatabaseAccessor, pipeline, endEvent, batchSize, batchTimeout)
+    else:
+        supervisor.Submit("DatabaseAccessor", DatabaseAccessor, pipeline, endEvent)
     # portsTaken = [["ttyACM0",False],["ttyACM1",False],["ttyUSB0",False],["ttyUSB1",False]]
 
+    # Sensors either get a thread each, or are all read from one event loop by the async engine.
+    engine = parser.get('engine', 'type', fallback='thread')
+    asyncSensors = []
+
     for finalSensor in FinalListOfSensors:
-        newSensor = Sensor_Factory.factory(finalSensor[1],finalSensor[2])
+        # Each sensor's section in the config file can ask for its serial port to be read by blocking instead of polling.
+        readMode = parser.get("{}_{}".format(finalSensor[1], finalSensor[3]), 'readMode', fallback='poll')
+        newSensor = Sensor_Factory.factory(finalSensor[1],finalSensor[2],readMode)
         portIndex = portFinder(finalSensor)
         if(portIndex != "nope"):
-            sensor = newSensor.Reading()
-            line = next(sensor)                   
-            sensorObject = SensorThreader(finalSensor[1])
-            threadExecutor.submit(sensorObject.sensorThread, pipeline, endEvent, sensor, finalSensor[1], finalSensor[0])
+            StartSensor(supervisor, pipeline, engine, asyncSensors, newSensor, finalSensor)
             print("this port is {}".format(portIndex))
             continue
         else:
             for portIndex in range(len(portsTaken)):
                 if(portsTaken[portIndex][1] == False):
                     try:
-                        newSensor = Sensor_Factory.factory(finalSensor[1],portsTaken[portIndex][0])
-                        sensor = newSensor.Reading()
-                        line = next(sensor)
+                        newSensor = Sensor_Factory.factory(finalSensor[1],portsTaken[portIndex][0],readMode)
+                        StartSensor(supervisor, pipeline, engine, asyncSensors, newSensor, finalSensor)
                         portsTaken[portIndex][1] = True
-                        sensorObject = SensorThreader(finalSensor[1])
-                        threadExecutor.submit(sensorObject.sensorThread, pipeline, endEvent, sensor, finalSensor[1], finalSensor[0])
                         Sensors_Update(portsTaken[portIndex][0], finalSensor[0])
                         break
                     except Exception as error:
                         print("You have requested more sensors then there are plugged in, please check your port connections.")
                         print("Error was: {}".format(error))
                         #print("Nope. No idea. Explode!")
-        
-    while True:
-        pass
+
+    if(len(asyncSensors) > 0):
+        supervisor.Submit("AsyncEngine", AsyncEngine, asyncSensors, pipeline, endEvent)
+
+    supervisor.Report()
+    supervisor.Run()
+    if(journal is not None):
+        journal.Close()
 
 if __name__ == "__main__":
     Main()
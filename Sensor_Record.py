@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+"""
+The record each reading travels through the pipeline in, from the sensor reader to the database writer,
+and the batch the readings from one read of a serial port travel in together.
+"""
+
+import sys
+import time
+import struct
+import itertools
+import threading
+
+
+class SensorRecord(object):
+    """
+    One reading from a sensor: the type of sensor, its ID in the Sensors table, the tuple of values read
+    and the time it was read as milliseconds since the epoch, which defaults to the time the record is made.
+
+    This is how a reading is handed between the drivers, the queue and the writer. Readings waiting in the queue
+    are held packed in a SensorBatch, which is where the memory is saved, and are only records again when they are read back.
+    """
+    __slots__ = ("sensorType", "sensorID", "values", "timestamp")
+
+    def __init__(self, sensorType, sensorID, values, timestamp=None):
+        self.sensorType = sensorType
+        self.sensorID = sensorID
+        self.values = values
+        if(timestamp is None):
+            timestamp = time.time_ns() // 1000000
+        self.timestamp = timestamp
+
+    def Size(self):
+        """
+        Roughly how many bytes the record holds, counting the record, its timestamp, its tuple of values and each value in it.
+        The sensor type and ID are shared between every record from the same sensor, so are not counted.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.timestamp) + sys.getsizeof(self.values)
+        for value in self.values:
+            size += sys.getsizeof(value)
+        return size
+
+    def __repr__(self):
+        return "SensorRecord({!r}, {!r}, {!r}, {!r})".format(self.sensorType, self.sensorID, self.values, self.timestamp)
+
+    def Count(self):
+        """
+        The number of readings held, always one for a record.
+        """
+        return 1
+
+    def Records(self):
+        """
+        The readings held, as a sequence of records.
+        """
+        return (self,)
+
+
+# The struct code each type of value is packed as. Values of any other type, such as text, are kept as they are.
+PACKED_CODES = {int: "q", float: "d"}
+# Text up to this long, such as a meter's serial number or a compass direction, is shared between every reading holding the same text.
+# Longer text, such as a raw NMEA sentence, is rarely repeated so is kept as it is.
+SHARED_TEXT = 32
+# Each packed reading starts with the index of its layout and its timestamp.
+READING_HEADER = struct.Struct("<Hq")
+
+
+class ReadingLayout(object):
+    """
+    How the readings of one sensor type with one type for each value are packed: the struct of the reading's header and
+    its int and float values, and which values are packed and which are kept as objects.
+    """
+    __slots__ = ("index", "sensorType", "codes", "packer", "packedMask", "objectMask")
+
+    def __init__(self, index, sensorType, codes):
+        self.index = index
+        self.sensorType = sensorType
+        self.codes = codes
+        self.packer = struct.Struct(READING_HEADER.format + "".join([code for code in codes if code is not None]))
+        self.packedMask = [code is not None for code in codes]
+        self.objectMask = [code is None for code in codes]
+
+
+# Every layout in use, shared by all the batches so each batch only holds its readings.
+# There are only a few for each sensor type, as a type's readings nearly always have the same types of value.
+readingLayouts = []
+layoutKeys = {}
+layoutLock = threading.Lock()
+
+
+def Layout(sensorType, codes):
+    """
+    Return the layout for readings of sensorType with values of these struct codes, making it the first time it is asked for.
+    """
+    layout = layoutKeys.get((sensorType, codes))
+    if(layout is None):
+        with layoutLock:
+            layout = layoutKeys.get((sensorType, codes))
+            if(layout is None):
+                layout = ReadingLayout(len(readingLayouts), sensorType, codes)
+                readingLayouts.append(layout)
+                layoutKeys[(sensorType, codes)] = layout
+    return layout
+
+
+def ValueCode(value):
+    # The struct code a value is packed as, or None if it is kept as it is, checking an int fits in 64 bits.
+    if(type(value) is int and not -2 ** 63 <= value < 2 ** 63):
+        return None
+    return PACKED_CODES.get(type(value))
+
+
+class SensorBatch(object):
+    """
+    Every reading completed by one read from a sensor's serial port, travelling through the pipeline as one unit.
+
+    A sensor which has buffered dozens of lines hands them all on at once, so they cost one generator resume,
+    one lock on the queue and one wakeup of the writer between them, instead of one each.
+
+    The readings are packed as they are added rather than kept as records. Each reading's layout, timestamp and int and float
+    values are packed one after another into a single bytearray, and only its other values, such as text, are kept as objects,
+    with short repeated text shared. The layouts are shared by every batch, and readings are laid out by their sensor type
+    as well as the types of their values, so quarantined lines can travel in the same batch. Records turns them back into SensorRecords.
+    """
+    __slots__ = ("sensorType", "sensorID", "count", "packed", "objects")
+
+    def __init__(self, sensorType, sensorID, records):
+        self.sensorType = sensorType
+        self.sensorID = sensorID
+        self.count = 0
+        self.packed = bytearray()
+        self.objects = []
+        for record in records:
+            self.Add(record)
+
+    def Add(self, record):
+        """
+        Pack a record onto the end of the batch.
+        """
+        values = record.values
+        layout = Layout(record.sensorType, tuple(map(PACKED_CODES.get, map(type, values))))
+        try:
+            packed = layout.packer.pack(layout.index, record.timestamp, *itertools.compress(values, layout.packedMask))
+        except struct.error:
+            # An int too big for 64 bits is kept as it is instead.
+            layout = Layout(record.sensorType, tuple([ValueCode(value) for value in values]))
+            packed = layout.packer.pack(layout.index, record.timestamp, *itertools.compress(values, layout.packedMask))
+        self.packed += packed
+        for value in itertools.compress(values, layout.objectMask):
+            self.objects.append(sys.intern(value) if type(value) is str and len(value) <= SHARED_TEXT else value)
+        self.count += 1
+
+    def Size(self):
+        """
+        Roughly how many bytes the batch holds, counting the packed readings and every value kept as an object.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.packed) + sys.getsizeof(self.objects)
+        for value in self.objects:
+            size += sys.getsizeof(value)
+        return size
+
+    def Count(self):
+        """
+        The number of readings held.
+        """
+        return self.count
+
+    def Records(self):
+        """
+        The readings held, unpacked into a list of records in the order they were added.
+        """
+        records = []
+        offset = 0
+        objects = iter(self.objects)
+        for reading in range(self.count):
+            layout = readingLayouts[READING_HEADER.unpack_from(self.packed, offset)[0]]
+            packedValues = layout.packer.unpack_from(self.packed, offset)
+            offset += layout.packer.size
+            timestamp = packedValues[1]
+            packedValues = iter(packedValues[2:])
+            values = tuple([next(objects) if code is None else next(packedValues) for code in layout.codes])
+            records.append(SensorRecord(layout.sensorType, self.sensorID, values, timestamp))
+        return records
+
+    def __repr__(self):
+        return "SensorBatch({!r}, {!r}, {} records)".format(self.sensorType, self.sensorID, self.count)
+
+
+def SingleLineBatches(reading, sensorType, sensorID):
+    """
+    Generator which adapts a sensor reader yielding one reading at a time into one yielding batches,
+    so drivers without a BatchReading method can still be run by the sensor manager.
+
+    Readers which still yield plain lists of values have them wrapped in a record here.
+    """
+    for record in reading:
+        if(not isinstance(record, SensorRecord)):
+            record = SensorRecord(sensorType, sensorID, tuple(record))
+        yield SensorBatch(sensorType, sensorID, [record])
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+"""
+Keeps the Sensors table in memory, so looking a sensor up by its id, type, port or unique name is a dictionary lookup
+instead of a query on a new connection.
+
+The table is loaded the first time it is needed and kept until Sensors_insert or Sensors_Update change it.
+They also bump the generation in the SensorsGeneration table, which lets the sensor manager and the web app,
+which each have their own registry, notice changes made by the other.
+"""
+
+import time
+import threading
+from sqlite3 import Error, OperationalError
+
+
+class SensorRegistry(object):
+    """
+    Lookups of the rows of the Sensors table, each (id, sensorType, port, uniqueName).
+
+    The generation in the database is read at most once every recheckInterval seconds, so changes made by another process
+    are seen within that time. Changes made through this process are seen straight away, as they call Invalidate.
+    """
+
+    def __init__(self, manager, recheckInterval=1.0):
+        self.manager = manager
+        self.recheckInterval = recheckInterval
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.generation = None
+        self.lastCheck = 0
+        self.rows = []
+        self.byID = {}
+        self.byType = {}
+        self.byPort = {}
+        self.byUniqueName = {}
+
+    def Generation(self, conn):
+        try:
+            row = conn.execute("SELECT generation FROM SensorsGeneration").fetchone()
+        except OperationalError:
+            # The schema hasn't been migrated yet, so only changes made through this process are seen.
+            return None
+        return row[0] if row is not None else None
+
+    def Invalidate(self):
+        """
+        Drop the cached table, so it is loaded again by the next lookup.
+        """
+        with self.lock:
+            self.loaded = False
+
+    def _load(self):
+        if(self.loaded and time.monotonic() - self.lastCheck < self.recheckInterval):
+            return
+        with self.manager.Reader() as conn:
+            if(self.loaded):
+                self.lastCheck = time.monotonic()
+                if(self.Generation(conn) == self.generation):
+                    return
+            generation = self.Generation(conn)
+            rows = conn.execute("SELECT id, sensorType, port, uniqueName FROM Sensors ORDER BY id").fetchall()
+        byID, byType, byPort, byUniqueName = {}, {}, {}, {}
+        for row in rows:
+            byID[row[0]] = row
+            byType.setdefault(row[1], []).append(row)
+            byPort.setdefault(row[2], []).append(row)
+            byUniqueName[row[3]] = row
+        self.rows, self.byID, self.byType, self.byPort, self.byUniqueName = rows, byID, byType, byPort, byUniqueName
+        self.generation = generation
+        self.lastCheck = time.monotonic()
+        self.loaded = True
+
+    def Load(self):
+        """
+        Load the Sensors table if it isn't loaded or has been changed. Returns False if the database couldn't be read.
+        """
+        try:
+            with self.lock:
+                self._load()
+            return True
+        except Error as e:
+            print("Did not connect so couldn't load the sensors, error: {}".format(e))
+            return False
+
+    def All(self):
+        """
+        Every sensor, in the order they were added.
+        """
+        self.Load()
+        return list(self.rows)
+
+    def ByID(self, sensorID):
+        self.Load()
+        return self.byID.get(sensorID)
+
+    def ByType(self, sensorType):
+        self.Load()
+        return list(self.byType.get(sensorType, []))
+
+    def ByPort(self, port):
+        self.Load()
+        return list(self.byPort.get(port, []))
+
+    def ByUniqueName(self, uniqueName):
+        self.Load()
+        return self.byUniqueName.get(uniqueName)
@@ -10,6 +10,11 @@ import Restart
 from configparser import ConfigParser
 import sqlite3
 from sqlite3 import Error
+from SQL_queries import Latest_select
+from SQL_queries import NMEA_select
+from NMEA_Blocks import NMEA_COLUMNS
+from SQL_queries import sensorRegistry
+from Columnar_Archive import ArchiveReader
 
 import os
 import sys 
@@ -24,6 +29,7 @@ parser.read('Config.ini')
 
 Data = {}
 queue = []
+archive = ArchiveReader(parser.get('archive', 'directory', fallback='archive'))
 
 class my_dictionary(dict): 
   
@@ -155,38 +161,23 @@ def USBSockets():
     sys.exit(1)
 
 def GetSensorsFromDatabase():
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT sensorType FROM Sensors")
-        rows = cur.fetchall()
-        conn.close()
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
-    
-    try:
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT id FROM Sensors")
-        IDs = cur.fetchall()
-        conn.close()
-    except Error as e:
-        print("Did not connect, error: {}".format(e))
-  
-    Data = my_dictionary()     
-    for item in range(len(rows)):    
-        Data.add(str(IDs[item]),rows[item])          
+    # Served from the sensor registry, which only reads the Sensors table again once it has changed.
+    Data = my_dictionary()
+    for sensor in sensorRegistry.All():
+        Data.add(str((sensor[0],)), (sensor[1],))
     return Data
 
 def AssignValues(value):
     try:
         print("we got here")
-        conn=sqlite3.connect(parser.get('database','connection'))
-        cur=conn.cursor()       
-        cur.execute("SELECT EntryID, Time, Date, Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction, Number_Of_Satelites, GPRMC, GPVTG, GPGGA, GPGSA, GPGSV, GPGLL FROM GPS WHERE sensor_ID = {} ORDER BY EntryID DESC LIMIT 10".format(value))
-        rows = cur.fetchall()
+        # Newest first by the (sensor_ID, timestamp) index, attaching only the partitions needed to find ten rows.
+        fixes = Latest_select("GPS", value, 10, "timestamp, EntryID, Time, Date, Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction, Number_Of_Satelites") or []
+        # The raw sentences are only decompressed for the blocks holding these fixes.
+        sentences = {}
+        if(len(fixes) > 0):
+            sentences = dict(NMEA_select(value, min(fix[0] for fix in fixes), max(fix[0] for fix in fixes) + 1))
+        rows = [fix[1:] + sentences.get(fix[0], (None,) * len(NMEA_COLUMNS)) for fix in fixes]
         print(rows)
-        conn.close()
         print("we also got here")
     except Error as e:
         print("Did not connect, error: {}".format(e))  
@@ -242,6 +233,18 @@ def GetSensorData(ID):
     queue = AssignValues(ID)
     return jsonify(queue)
 
+@app.route('/archive/<table>/<int:sensorID>/<channel>/<int:start>/<int:end>',methods=['GET'])
+def GetArchivedData(table, sensorID, channel, start, end):
+    # Archived history is sliced straight out of the mapped files, taking every step-th reading to stay within the points asked for.
+    points = request.args.get('points', default=1000, type=int)
+    try:
+        total = sum(len(timestamps) for timestamps, values in archive.Slices(table, sensorID, channel, start, end))
+        timestamps, values = archive.Read(table, sensorID, channel, start, end, max(1, -(-total // max(1, points))))
+    except KeyError:
+        return jsonify({'error': "{} has no archived column {}".format(table, channel)}), 404
+    return jsonify({'timestamps': [int(timestamp) for timestamp in timestamps],
+                    'values': [None if value != value else float(value) for value in values]})
+
 @app.route('/list_of_sensors')
 def GetSensors():
     myDictionary = GetSensorsFromDatabase()
@@ -1,7 +1,6 @@
 import datetime
 import random     
 #import functools
-from functools import reduce
 import time
 import math
 
@@ -267,6 +266,28 @@ class DummyGPS (DummyByteSensor):
 
     delim = ','
     eol = '\r\n'
+
+    def _genLine(self):
+        """
+        Generate one fix as the GPS sends it, each sentence on its own line ending in the checksum of its characters.
+        The data definitions split the sentences with \\n\\r and carry a made up checksum, so they are rebuilt here.
+        Each fix is stamped one second after the last, starting from when the dummy was made, as a real GPS's are.
+        """
+        fixTime = datetime.datetime.fromtimestamp(self.fixTime, datetime.timezone.utc)
+        self.fixTime += 1
+        line = super()._genLine().decode(DummySensor.ENCODING_STRING)
+        line = line.replace("133408.00", fixTime.strftime("%H%M%S.00")).replace("260919", fixTime.strftime("%d%m%y"))
+        sentences = []
+        for sentence in line.split("\n\r"):
+            sentence = sentence.strip().rstrip(",")
+            if(sentence == ""):
+                continue
+            body = sentence[1:].split("*")[0]
+            checkSum = 0
+            for character in body.encode("ascii"):
+                checkSum ^= character
+            sentences.append("${}*{:02X}{}".format(body, checkSum, self.eol))
+        return bytes("".join(sentences), DummySensor.ENCODING_STRING)
     
     def __init__(self):
 
@@ -274,6 +295,7 @@ class DummyGPS (DummyByteSensor):
         
         self.Latitude = 50180
         self.Longitude = 4090
+        self.fixTime = int(time.time())
         
         self.data = [
 
@@ -1021,17 +1043,9 @@ class DummyBB9Sensor( DummyByteSensor ):
         return self.recordCount
 
     def checksumString(self, elems):
-        #print( elems )
-        #return 13
-        # getString representation of the line leading up to this point
-        line = reduce(lambda x,y: str(x) + self.delim + str(y), elems, "" )
-        # now reduce wasn't a perfect choice due to our inital value
-        # so we still need to move the \t from the begining to the end
-        #line = line[1:] + "\t" ## actually we don't as addition is commuatble
-        stringList = list( line )
-        byteList   = list( map( ord, stringList ))
-        hexList = list(map( lambda x: hex(x), byteList ))
-        checkSum = reduce(lambda x,y: x + y, byteList, 0)
+        # The sum of the bytes of every value so far followed by its tab, as the meter writes it.
+        line = "".join([str(elem) + self.delim for elem in elems])
+        checkSum = sum(line.encode("utf-8"))
         hexSum = "{:x}".format(checkSum)
         return hexSum
 
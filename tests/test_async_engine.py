@@ -0,0 +1,99 @@
+"""
+Checks a full pipeline only holds up the sensor whose readings are waiting for room, not the whole event loop.
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Async_Engine import AsyncEngine
+from Ingest_Queue import IngestQueue, POLICY_BLOCK, POLICY_DROP_OLDEST
+from Sensor_Record import SensorRecord, SensorBatch
+
+
+class PipePort(object):
+    """
+    A serial port opened without blocking, which reads whatever is written into the other end of a pipe.
+    """
+
+    def __init__(self):
+        self.readEnd, self.writeEnd = os.pipe()
+        os.set_blocking(self.readEnd, False)
+
+    @property
+    def in_waiting(self):
+        return 0
+
+    def read(self, size=1):
+        try:
+            return os.read(self.readEnd, 65536)
+        except BlockingIOError:
+            return b""
+
+    def fileno(self):
+        return self.readEnd
+
+    def Send(self, data):
+        os.write(self.writeEnd, data)
+
+    def close(self):
+        os.close(self.readEnd)
+        os.close(self.writeEnd)
+
+
+class LineSensor(object):
+    """
+    Turns each line sent to it into one reading.
+    """
+
+    def __init__(self, sensorID):
+        self.sensorID = sensorID
+
+    def Batch(self, bitOfData):
+        lines = bitOfData.split(b"\n")[:-1]
+        if(len(lines) == 0):
+            return None
+        return SensorBatch("NTU", self.sensorID, [SensorRecord("NTU", self.sensorID, (line.decode("utf-8"),)) for line in lines])
+
+
+class FullPipelineTests(unittest.TestCase):
+
+    def test_blocked_sensor_does_not_stop_the_others(self):
+        # Room for about one batch, which the blocked sensor's first line takes up.
+        pipeline = IngestQueue(300, POLICY_BLOCK)
+        pipeline.SetPolicy(2, POLICY_DROP_OLDEST)
+        blockedPort = PipePort()
+        otherPort = PipePort()
+        endEvent = threading.Event()
+        engine = threading.Thread(target=AsyncEngine, args=([[LineSensor(1), blockedPort, "NTU", 1], [LineSensor(2), otherPort, "NTU", 2]], pipeline, endEvent))
+        engine.start()
+        try:
+            blockedPort.Send(b"first\n")
+            time.sleep(0.1)
+            blockedPort.Send(b"second\n")
+            time.sleep(0.1)
+            otherPort.Send(b"other\n")
+            deadline = time.monotonic() + 2
+            seen = []
+            while time.monotonic() < deadline and "other" not in seen:
+                time.sleep(0.05)
+                with pipeline.lock:
+                    seen = [record.values[0] for item, size in pipeline.items for record in item.Records()]
+            self.assertIn("other", seen, "the other sensor was not read while the first waited for room")
+        finally:
+            endEvent.set()
+            # Make room for the blocked sensor's reading so its put can finish.
+            while engine.is_alive():
+                try:
+                    pipeline.get(timeout=0.1)
+                except Exception:
+                    pass
+            engine.join(5)
+
+
+if __name__ == "__main__":
+    unittest.main()
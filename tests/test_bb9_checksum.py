@@ -0,0 +1,71 @@
+"""
+The BB9 checksum summed off the frame bytes, one frame or a buffer of frames at a time,
+against the checksum as it was first worked out by joining the fields with reduce.
+"""
+
+import os
+import sys
+import unittest
+from functools import reduce
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BB9 import FrameChecksum, CheckFrame, CheckFrames
+from dummy_sensors import DummyBB9Sensor
+
+
+def ReduceChecksum(fields):
+    """
+    The BB9 checksum as it was worked out before, joining the fields with reduce and summing the ord of each character.
+    """
+    line = reduce(lambda x, y: str(x) + "\t" + str(y), fields, "")
+    return "{:x}".format(reduce(lambda x, y: x + y, list(map(ord, list(line))), 0))
+
+
+def ReduceCheck(line):
+    fields = line.split()
+    return fields[-1] == ReduceChecksum(fields[:-1])
+
+
+class BB9ChecksumTests(unittest.TestCase):
+
+    def setUp(self):
+        bb9 = DummyBB9Sensor()
+        self.frames = [bb9._genLine() for _ in range(50)]
+        # Every fourth frame has a digit of its first signal changed, so its checksum no longer matches.
+        self.frames = [frame.replace(b"\t412\t", b"\t413\t", 1) if index % 4 == 0 else frame for index, frame in enumerate(self.frames)]
+        self.lines = [frame.decode("utf-8").rstrip("\r\n") for frame in self.frames]
+        self.expected = [ReduceCheck(line) for line in self.lines]
+
+    def test_corrupted_digit_fails_the_reduce_checksum(self):
+        self.assertEqual(self.expected.count(False), (len(self.frames) + 3) // 4)
+
+    def test_frame_checksum_matches_reduce(self):
+        for line in self.lines:
+            body = line.rpartition("\t")[0] + "\t"
+            self.assertEqual(FrameChecksum(body.encode("utf-8")), ReduceChecksum(line.split()[:-1]))
+
+    def test_check_frame_on_text(self):
+        self.assertEqual([CheckFrame(line) for line in self.lines], self.expected)
+
+    def test_check_frame_on_bytes(self):
+        self.assertEqual([CheckFrame(frame.rstrip(b"\r\n")) for frame in self.frames], self.expected)
+
+    def test_check_frame_ignores_surrounding_whitespace(self):
+        self.assertEqual([CheckFrame("  " + line + " \r\n") for line in self.lines], self.expected)
+        self.assertEqual([CheckFrame(b" " + frame) for frame in self.frames], self.expected)
+
+    def test_check_frames_on_a_buffer(self):
+        self.assertEqual(CheckFrames(b"".join(self.frames)), self.expected)
+
+    def test_check_frames_leaves_out_a_partial_frame(self):
+        buffer = b"".join(self.frames) + self.frames[1][:20]
+        self.assertEqual(CheckFrames(buffer), self.expected)
+
+    def test_check_frames_ignores_surrounding_whitespace(self):
+        buffer = b"".join(b" " + frame.rstrip(b"\r\n") + b" \r\n" for frame in self.frames)
+        self.assertEqual(CheckFrames(buffer), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Checks the archive exporter writes NaN for values which aren't numbers instead of stopping.
+"""
+
+import os
+import sys
+import math
+import array
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Columnar_Archive import ExportTable
+
+
+class ExportTableTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_text_in_a_numeric_column_is_written_as_nan(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE NTU(id INTEGER PRIMARY KEY, sensor_ID NUMERIC, timestamp INTEGER, lambda NUMERIC, NTU_Signal NUMERIC)")
+        conn.executemany("INSERT INTO NTU(sensor_ID, timestamp, lambda, NTU_Signal) VALUES((?),(?),(?),(?))",
+                         [(1, 1000, 860, "12.5"), (1, 2000, "860x", None), (1, 3000, 860, b"\x01")])
+        self.assertEqual(ExportTable(conn, "main", "NTU", 0, 10000, self.directory), 3)
+        signals = array.array('d')
+        with open(os.path.join(self.directory, "NTU.NTU_Signal.f8"), "rb") as signalFile:
+            signals.frombytes(signalFile.read())
+        lambdas = array.array('d')
+        with open(os.path.join(self.directory, "NTU.lambda.f8"), "rb") as lambdaFile:
+            lambdas.frombytes(lambdaFile.read())
+        if(sys.byteorder != "little"):
+            signals.byteswap()
+            lambdas.byteswap()
+        self.assertEqual(signals[0], 12.5)
+        self.assertTrue(math.isnan(signals[1]) and math.isnan(signals[2]))
+        self.assertEqual(lambdas[0], 860)
+        self.assertTrue(math.isnan(lambdas[1]))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "NTU.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Checks the writer's checkpoints don't wait for readers while it holds the writer lock.
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Connection_Manager import ConnectionManager
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = os.path.join(self.directory, "test.db")
+        self.manager = ConnectionManager(self.database, profile={'journal_mode': 'WAL', 'busy_timeout': 2000}, checkpointInterval=0)
+        with self.manager.Writer() as conn:
+            conn.execute("CREATE TABLE readings (value INTEGER)")
+            conn.execute("INSERT INTO readings VALUES (1)")
+
+    def tearDown(self):
+        self.manager.Close()
+        shutil.rmtree(self.directory)
+
+    def test_checkpoint_does_not_wait_for_a_reader(self):
+        reader = sqlite3.connect(self.database)
+        reader.execute("BEGIN")
+        reader.execute("SELECT * FROM readings").fetchall()
+        with self.manager.Writer() as conn:
+            conn.execute("INSERT INTO readings VALUES (2)")
+        startTime = time.monotonic()
+        self.manager.Checkpoint()
+        self.assertLess(time.monotonic() - startTime, 1)
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
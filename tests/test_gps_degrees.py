@@ -0,0 +1,52 @@
+"""
+Checks GPS fixes keep the ddmm.mmmm the GPS sends and gain the same position in signed decimal degrees,
+both as they are parsed and for the fixes written before the decimal degree columns existed.
+"""
+
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NMEA_Parser import NMEAParser, NMEAChecksum
+from SQL_queries import GPSDegreesMigration, GPS_columns, GPS_TABLE_COLUMNS
+
+
+def Sentence(body):
+    return "${}*{:02X}\r\n".format(body, NMEAChecksum(body.encode("ascii"))).encode("ascii")
+
+
+class GPSDegreesTests(unittest.TestCase):
+
+    def test_parsed_fix_has_both(self):
+        parser = NMEAParser()
+        fixes, rejected = parser.Feed(Sentence("GPRMC,123519,A,4807.038,S,01131.000,W,022.4,084.4,230394,003.1,W")
+                                      + Sentence("GPGLL,4807.038,S,01131.000,W,123519,A"))
+        self.assertEqual(rejected, [])
+        fix = fixes[0]
+        self.assertEqual(fix[2:6], [4807.038, "S", 1131.0, "W"])
+        self.assertAlmostEqual(fix[7], -(48 + 7.038 / 60))
+        self.assertAlmostEqual(fix[8], -(11 + 31.0 / 60))
+        self.assertEqual(len(GPS_columns(fix, 1, 0)[:GPS_TABLE_COLUMNS]), GPS_TABLE_COLUMNS)
+
+    def test_migration_fills_in_old_fixes(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE GPS(EntryID INTEGER PRIMARY KEY AUTOINCREMENT, sensor_ID NUMERIC, timestamp INTEGER, Time TIME, Date DATE, "
+                     "Latitude_Value REAL, Latitude_Direction, Longitude_Value REAL, Longitude_Direction, Number_Of_Satelites INTEGER)")
+        conn.executemany("INSERT INTO GPS(Latitude_Value, Latitude_Direction, Longitude_Value, Longitude_Direction) VALUES((?),(?),(?),(?))",
+                         [("4807.038", "N", "01131.000", "E"), (4807.038, "S", 1131.0, "W"), ("", "", "", ""), (None, None, None, None)])
+        GPSDegreesMigration(conn)
+        rows = conn.execute("SELECT Latitude_Value, Latitude, Longitude FROM GPS ORDER BY EntryID").fetchall()
+        self.assertEqual(rows[0][0], 4807.038)
+        self.assertAlmostEqual(rows[0][1], 48 + 7.038 / 60)
+        self.assertAlmostEqual(rows[0][2], 11 + 31.0 / 60)
+        self.assertAlmostEqual(rows[1][1], -(48 + 7.038 / 60))
+        self.assertAlmostEqual(rows[1][2], -(11 + 31.0 / 60))
+        self.assertEqual(rows[2][1:], (None, None))
+        self.assertEqual(rows[3][1:], (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
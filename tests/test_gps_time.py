@@ -0,0 +1,41 @@
+"""
+Checks GPS dates and times are read back right, including the ones whose leading zero was dropped when they were stored as numbers.
+"""
+
+import os
+import sys
+import datetime
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SQL_queries import GPSTimeMillis
+
+
+def Millis(*reading):
+    return int(datetime.datetime(*reading, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+class GPSTimeMillisTests(unittest.TestCase):
+
+    def test_text_from_the_sentence(self):
+        self.assertEqual(GPSTimeMillis("230394", "123519.00"), Millis(1994, 3, 23, 12, 35, 19))
+
+    def test_times_before_ten_oclock(self):
+        self.assertEqual(GPSTimeMillis(230394, 10203), Millis(1994, 3, 23, 1, 2, 3))
+        self.assertEqual(GPSTimeMillis(230394, 10203.5), Millis(1994, 3, 23, 1, 2, 3))
+        self.assertEqual(GPSTimeMillis(230394, 1), Millis(1994, 3, 23, 0, 0, 1))
+        self.assertEqual(GPSTimeMillis(230394, 0), Millis(1994, 3, 23, 0, 0, 0))
+
+    def test_dates_before_the_tenth(self):
+        self.assertEqual(GPSTimeMillis(10394, 123519), Millis(1994, 3, 1, 12, 35, 19))
+        self.assertEqual(GPSTimeMillis("010394", "000000.00"), Millis(1994, 3, 1, 0, 0, 0))
+
+    def test_unreadable(self):
+        self.assertIsNone(GPSTimeMillis(None, 123519))
+        self.assertIsNone(GPSTimeMillis("", ""))
+        self.assertIsNone(GPSTimeMillis(230394, 996199))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Checks the IngestQueue keeps to its byte budget, and that each overload policy does what it says when a reading would go over it:
+block waits for room, dropOldest throws away the oldest readings, and decimate keeps one in every few readings once the queue is filling up.
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+from queue import Empty, Full
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Ingest_Queue import IngestQueue, POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DECIMATE
+from Sensor_Record import SensorRecord, SensorBatch
+
+
+def Record(sensorID, number):
+    return SensorRecord("NTU", sensorID, (number, 1.5), 1000 + number)
+
+
+RECORD_SIZE = Record(1, 0).Size()
+
+
+def Numbers(queue):
+    numbers = []
+    while not queue.empty():
+        numbers.extend(record.values[0] for record in queue.get_nowait().Records())
+    return numbers
+
+
+class IngestQueueTests(unittest.TestCase):
+
+    def test_bytes_held_follow_the_items(self):
+        queue = IngestQueue(10 * RECORD_SIZE)
+        batch = SensorBatch("NTU", 1, [Record(1, number) for number in range(3)])
+        queue.put(Record(1, 0))
+        queue.put(batch)
+        self.assertEqual(queue.Counters(), {'depth': 2, 'bytes': RECORD_SIZE + batch.Size(), 'dropped': 0, 'decimated': 0})
+        queue.get()
+        queue.get()
+        self.assertEqual(queue.Counters()['bytes'], 0)
+        self.assertRaises(Empty, queue.get_nowait)
+
+    def test_item_over_the_whole_budget_goes_into_an_empty_queue(self):
+        queue = IngestQueue(RECORD_SIZE // 2)
+        queue.put_nowait(Record(1, 0))
+        self.assertRaises(Full, queue.put_nowait, Record(1, 1))
+        self.assertEqual(Numbers(queue), [0])
+
+    def test_block_waits_for_room(self):
+        queue = IngestQueue(2 * RECORD_SIZE, POLICY_BLOCK)
+        queue.put(Record(1, 0))
+        queue.put(Record(1, 1))
+        self.assertRaises(Full, queue.put, Record(1, 2), timeout=0.05)
+        putter = threading.Thread(target=queue.put, args=(Record(1, 2),))
+        putter.start()
+        time.sleep(0.05)
+        self.assertTrue(putter.is_alive())
+        self.assertEqual(queue.get().values[0], 0)
+        putter.join(1)
+        self.assertFalse(putter.is_alive())
+        self.assertEqual(Numbers(queue), [1, 2])
+        self.assertEqual(queue.Counters()['dropped'], 0)
+
+    def test_drop_oldest_makes_room(self):
+        queue = IngestQueue(3 * RECORD_SIZE)
+        queue.SetPolicy(1, POLICY_DROP_OLDEST)
+        for number in range(5):
+            queue.put(Record(1, number))
+        self.assertEqual(queue.Counters()['dropped'], 2)
+        self.assertEqual(queue.Counters()['bytes'], 3 * RECORD_SIZE)
+        self.assertEqual(Numbers(queue), [2, 3, 4])
+
+    def test_drop_oldest_counts_every_reading_in_a_dropped_batch(self):
+        queue = IngestQueue(1)
+        queue.SetPolicy(1, POLICY_DROP_OLDEST)
+        queue.put(SensorBatch("NTU", 1, [Record(1, number) for number in range(4)]))
+        queue.put(Record(1, 4))
+        self.assertEqual(queue.dropped[1], 4)
+        self.assertEqual(Numbers(queue), [4])
+
+    def test_decimate_starts_at_the_threshold(self):
+        queue = IngestQueue(10 * RECORD_SIZE, decimateThreshold=0.2)
+        queue.SetPolicy(1, POLICY_DECIMATE, decimation=3)
+        queue.put(Record(1, 0))
+        queue.put(Record(1, 1))
+        self.assertEqual(queue.decimated[1], 0)
+        queue.put(Record(1, 2))
+        # From here the queue holds more than a fifth of its budget, so only every third reading is kept.
+        queue.put(SensorBatch("NTU", 1, [Record(1, number) for number in range(3, 9)]))
+        self.assertEqual(queue.decimated[1], 4)
+        self.assertEqual(Numbers(queue), [0, 1, 2, 5, 8])
+
+    def test_decimate_drops_what_it_keeps_when_full(self):
+        queue = IngestQueue(2 * RECORD_SIZE, decimateThreshold=0.5)
+        queue.SetPolicy(1, POLICY_DECIMATE, decimation=1)
+        queue.put(Record(1, 0))
+        queue.put(Record(1, 1))
+        queue.put(Record(1, 2))
+        self.assertEqual(queue.Counters()['dropped'], 1)
+        self.assertEqual(Numbers(queue), [0, 1])
+
+    def test_unknown_policy_is_refused(self):
+        self.assertRaises(ValueError, IngestQueue(1).SetPolicy, 1, "sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Checks the journal keeps each reading's sensor type, and the loader moves aside a segment which keeps failing.
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Ingest_Journal import IngestJournal, ReadSegment, EncodeBatch, DecodeBatch, FAILED_SUFFIX
+from Sensor_Record import SensorRecord, SensorBatch
+import Sensor_Manager
+from SQL_queries import ClaimSegment
+
+
+class JournalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_quarantined_lines_keep_their_type(self):
+        batch = SensorBatch("BB9", 2, [SensorRecord("BB9", 2, ("WETA", 21), 1000),
+                                       SensorRecord("Quarantine", 2, ("BB9", "bad line", "checksum does not match"), 1001)])
+        records = DecodeBatch(EncodeBatch(batch)).Records()
+        self.assertEqual([(record.sensorType, record.values, record.timestamp) for record in records],
+                         [("BB9", ("WETA", 21), 1000), ("Quarantine", ("BB9", "bad line", "checksum does not match"), 1001)])
+
+    def test_segment_names_sort_in_the_order_written(self):
+        journal = IngestJournal(self.directory, syncInterval=0)
+        journal.Open()
+        journal.put(SensorRecord("BB9", 1, (1,), 1))
+        first = journal.Seal()
+        journal.Close()
+        journal = IngestJournal(self.directory, syncInterval=0)
+        self.assertEqual(journal.Open(), 1)
+        journal.put(SensorRecord("BB9", 1, (2,), 2))
+        sealed = journal.Seal()
+        journal.Close()
+        self.assertEqual(sealed[0], first[0])
+        self.assertEqual(sealed, sorted(sealed))
+        self.assertEqual(len(set(sealed)), 2)
+
+    def test_failing_segment_is_moved_aside(self):
+        journal = IngestJournal(self.directory, syncInterval=0)
+        journal.Open()
+        journal.put(SensorRecord("BB9", 1, (1,), 1))
+        bad = journal.Seal()[0]
+        journal.put(SensorRecord("BB9", 1, (2,), 2))
+        good = journal.Seal()[1]
+        applied = []
+        failures = []
+        event = threading.Event()
+
+        def Insert(groups, segment):
+            if(segment in bad):
+                failures.append(segment)
+                return None
+            applied.append(segment)
+            event.set()
+            return 0.001
+
+        with mock.patch.object(Sensor_Manager, "Batch_insert", Insert), \
+                mock.patch.object(Sensor_Manager, "GroupRows", lambda items: ({"statement": list(items)}, 1)):
+            Sensor_Manager.JournalLoader(journal, event, 0, maxAttempts=3)
+        journal.Close()
+        self.assertEqual(len(failures), 3)
+        self.assertTrue(os.path.exists(bad + FAILED_SUFFIX))
+        self.assertFalse(os.path.exists(bad))
+        self.assertFalse(os.path.exists(good))
+        self.assertEqual(len(applied), 1)
+        self.assertEqual(list(ReadSegment(bad + FAILED_SUFFIX))[0].Records()[0].values, (1,))
+
+    def test_segment_is_claimed_once_per_database(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE JournalApplied(segment TEXT PRIMARY KEY, appliedAt INTEGER);")
+        self.assertTrue(ClaimSegment(conn, "a-0000000001"))
+        self.assertFalse(ClaimSegment(conn, "a-0000000001"))
+        self.assertTrue(ClaimSegment(conn, "a-0000000002"))
+        self.assertEqual(conn.execute("SELECT segment FROM JournalApplied").fetchall(), [("a-0000000002",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Checks the LineFramer hands back the same lines however the data is split across reads,
+including a terminator split between two reads, and keeps only the incomplete line between them.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BBX_Sensors import BBX, LineFramer
+
+
+DATA = b"WETA 1 412\r\nWETA 2 413\r\n\r\nWETA 3 414\r\nWETA 4"
+LINES = [b"WETA 1 412", b"WETA 2 413", b"", b"WETA 3 414"]
+
+
+def Feed(framer, pieces):
+    lines = []
+    for piece in pieces:
+        lines.extend(bytes(frame) for frame in framer.Frames(piece))
+    return lines
+
+
+class LineFramerTests(unittest.TestCase):
+
+    def test_one_read(self):
+        framer = LineFramer()
+        self.assertEqual(Feed(framer, [DATA]), LINES)
+        self.assertEqual(framer.buffer, bytearray(b"WETA 4"))
+
+    def test_every_split_into_two_reads(self):
+        for split in range(len(DATA) + 1):
+            framer = LineFramer()
+            self.assertEqual(Feed(framer, [DATA[:split], DATA[split:]]), LINES, "split at {}".format(split))
+            self.assertEqual(framer.buffer, bytearray(b"WETA 4"))
+
+    def test_one_byte_at_a_time(self):
+        framer = LineFramer()
+        self.assertEqual(Feed(framer, [DATA[i:i + 1] for i in range(len(DATA))]), LINES)
+        # Only the last byte, which could start a terminator, is searched again.
+        self.assertEqual(framer.scanFrom, len(b"WETA 4") - 1)
+
+    def test_terminator_split_across_reads(self):
+        framer = LineFramer()
+        self.assertEqual(Feed(framer, [b"WETA 1\r"]), [])
+        self.assertEqual(Feed(framer, [b"\nWETA 2\r"]), [b"WETA 1"])
+        self.assertEqual(Feed(framer, [b"\n"]), [b"WETA 2"])
+        self.assertEqual(framer.buffer, bytearray())
+
+    def test_stopping_early_keeps_the_rest(self):
+        framer = LineFramer()
+        frames = framer.Frames(DATA)
+        self.assertEqual(bytes(next(frames)), LINES[0])
+        frames.close()
+        self.assertEqual(Feed(framer, [b"\r\n"]), LINES[1:] + [b"WETA 4"])
+
+    def test_sensor_frames_are_text(self):
+        sensor = BBX("ttyUSB0")
+        self.assertEqual(sensor.Frames(b"WETA \xff 1\r\nWE"), ["WETA � 1"])
+        self.assertEqual(sensor.Frames(b"TA 2\r\n"), ["WETA 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Checks a reading written twice is stored and counted in the rollups once, left out by its table's unique natural key.
+"""
+
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SQL_queries import Write_groups, BB9_INSERT, GPS_INSERT, GPS_NATURAL_KEY, insertRegistry, schemaMigrations
+
+
+class NaturalKeyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        for migration in schemaMigrations:
+            migration.apply(self.conn)
+
+    def test_repeated_bb9_frame_is_written_and_rolled_up_once(self):
+        row = (1, 1000, "WETA", "BB90001", 21, 1, 5) + tuple(range(18)) + ("10b7",)
+        restarted = (1, 5000, "WETA", "BB90001", 21, 1, 5) + tuple(range(18)) + ("10b7",)
+        ignored = insertRegistry.ignored["BB9"]
+        with self.conn:
+            Write_groups(self.conn, {BB9_INSERT: [row, row]})
+        with self.conn:
+            Write_groups(self.conn, {BB9_INSERT: [row, restarted]})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM BB9").fetchone()[0], 2)
+        self.assertEqual(self.conn.execute("SELECT SUM(count) FROM Rollup_minute WHERE tableName = 'BB9' AND channel = 'Signal_1'").fetchone()[0], 2)
+        self.assertEqual(insertRegistry.ignored["BB9"] - ignored, 2)
+
+    def test_repeated_gps_fix_is_written_once(self):
+        fix = (1, 1000, "123519.00", "230394", 4807.038, "N", 1131.0, "E", 8, 48.1173, 11.5167)
+        noFix = (1, 2000, "", "", None, "", None, "", None, None, None)
+        with self.conn:
+            Write_groups(self.conn, {GPS_INSERT: [fix, fix, noFix, noFix]})
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM GPS").fetchone()[0], 3)
+
+    def test_rows_written_are_found_by_their_stored_key(self):
+        # The date and time are text in the rows, but stored as numbers by the table's NUMERIC columns.
+        first = (1, 1000, "010203.00", "010394", 4807.038, "N", 1131.0, "E", 8, 48.1173, 11.5167)
+        second = (1, 2000, "010204.00", "010394", 4807.038, "N", 1131.0, "E", 8, 48.1173, 11.5167)
+        noFix = (1, 3000, "", "", None, "", None, "", None, None, None)
+        with self.conn:
+            self.conn.execute(GPS_INSERT, first)
+        lastKey = GPS_NATURAL_KEY.LastKey(self.conn)
+        rows = [first, noFix, second, second, noFix]
+        with self.conn:
+            self.conn.executemany(GPS_INSERT, rows)
+        columnNames = insertRegistry.statements[GPS_INSERT].tableColumnNames
+        self.assertEqual(GPS_NATURAL_KEY.Inserted(self.conn, columnNames, rows, lastKey), [1, 2, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
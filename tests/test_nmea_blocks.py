@@ -0,0 +1,53 @@
+"""
+Checks the raw NMEA sentences stored with GPS rows wait uncompressed in GPS_NMEA_staged until a sensor has a full block,
+and that each block is compressed and written once.
+"""
+
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NMEA_Blocks import UnpackBlock
+from SQL_queries import GPS_INSERT, GPS_TABLE_COLUMNS, NMEA_BLOCK_FIXES, NMEA_store, schemaMigrations
+
+
+def GPSRow(sensorID, timestamp):
+    sentences = ("$GPRMC,{}*00".format(timestamp), None, "$GPGGA,{}*00".format(timestamp), None, None, None)
+    return (sensorID, timestamp) + (None,) * (GPS_TABLE_COLUMNS - 2) + sentences
+
+
+class NMEABlockTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        for migration in schemaMigrations:
+            migration.apply(self.conn)
+        self.statements = []
+        self.conn.set_trace_callback(self.statements.append)
+
+    def test_blocks_are_written_once_when_full(self):
+        fixes = 2 * NMEA_BLOCK_FIXES + 22
+        for first in range(0, fixes, 10):
+            NMEA_store(self.conn, {GPS_INSERT: [GPSRow(1, timestamp) for timestamp in range(first, min(first + 10, fixes))]})
+        self.assertFalse([statement for statement in self.statements if statement.startswith("UPDATE")])
+        blocks = self.conn.execute("SELECT firstTimestamp, lastTimestamp, fixCount, dictionary, data FROM GPS_NMEA ORDER BY firstTimestamp").fetchall()
+        self.assertEqual([block[:3] for block in blocks],
+                         [(0, NMEA_BLOCK_FIXES - 1, NMEA_BLOCK_FIXES), (NMEA_BLOCK_FIXES, 2 * NMEA_BLOCK_FIXES - 1, NMEA_BLOCK_FIXES)])
+        unpacked = UnpackBlock(blocks[1][4], blocks[1][3])
+        self.assertEqual(unpacked[0], (NMEA_BLOCK_FIXES, GPSRow(1, NMEA_BLOCK_FIXES)[GPS_TABLE_COLUMNS:]))
+        staged = self.conn.execute("SELECT timestamp FROM GPS_NMEA_staged ORDER BY timestamp").fetchall()
+        self.assertEqual([row[0] for row in staged], list(range(2 * NMEA_BLOCK_FIXES, fixes)))
+
+    def test_sensors_fill_their_own_blocks(self):
+        NMEA_store(self.conn, {GPS_INSERT: [GPSRow(sensorID, timestamp) for timestamp in range(NMEA_BLOCK_FIXES) for sensorID in (1, 2)]
+                               + [GPSRow(3, 0)]})
+        self.assertEqual(self.conn.execute("SELECT sensor_ID, fixCount FROM GPS_NMEA ORDER BY sensor_ID").fetchall(),
+                         [(1, NMEA_BLOCK_FIXES), (2, NMEA_BLOCK_FIXES)])
+        self.assertEqual(self.conn.execute("SELECT sensor_ID FROM GPS_NMEA_staged").fetchall(), [(3,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Checks the NMEAParser shared by the GPS drivers turns an epoch of sentences into one fix however the bytes are split across reads,
+rejects sentences which fail their checksum, and drops sentences cut short or belonging to an epoch whose $GPRMC was missed.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NMEA_Parser import NMEAParser, NMEAChecksum, SENTENCES_START
+
+
+def Sentence(body):
+    return "${}*{:02X}\r\n".format(body, NMEAChecksum(body.encode("ascii"))).encode("ascii")
+
+
+RMC = Sentence("GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W")
+VTG = Sentence("GPVTG,084.4,T,,M,022.4,N,041.5,K,A")
+GGA = Sentence("GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,")
+GSA = Sentence("GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1")
+GSV1 = Sentence("GPGSV,2,1,08,01,40,083,46,02,17,308,41,12,07,344,39,14,22,228,45")
+GSV2 = Sentence("GPGSV,2,2,08,15,11,059,37,17,58,040,48,24,66,269,47,25,09,181,36")
+TXT = Sentence("GPTXT,01,01,02,ANTSTATUS=OK")
+GLL = Sentence("GPGLL,4807.038,N,01131.000,E,123519,A")
+EPOCH = RMC + VTG + GGA + GSA + GSV1 + GSV2 + TXT + GLL
+
+
+def Text(sentence):
+    return sentence.rstrip().decode("ascii")
+
+
+class NMEAParserTests(unittest.TestCase):
+
+    def test_one_epoch_is_one_fix(self):
+        parser = NMEAParser()
+        fixes, rejected = parser.Feed(EPOCH)
+        self.assertEqual(rejected, [])
+        self.assertEqual(len(fixes), 1)
+        fix = fixes[0]
+        self.assertEqual(fix[:7], ["123519", "230394", 4807.038, "N", 1131.0, "E", 8])
+        self.assertAlmostEqual(fix[7], 48 + 7.038 / 60)
+        self.assertAlmostEqual(fix[8], 11 + 31.0 / 60)
+        self.assertEqual(fix[SENTENCES_START:], [Text(RMC), Text(VTG), Text(GGA), Text(GSA), Text(GSV1) + Text(GSV2), Text(GLL)])
+        self.assertEqual(parser.fixes, 1)
+
+    def test_split_at_every_byte(self):
+        expected = NMEAParser().Feed(EPOCH + EPOCH)[0]
+        for split in range(1, 2 * len(EPOCH)):
+            parser = NMEAParser()
+            data = EPOCH + EPOCH
+            fixes = parser.Feed(data[:split])[0] + parser.Feed(data[split:])[0]
+            self.assertEqual(fixes, expected, "split at {}".format(split))
+
+    def test_one_byte_at_a_time(self):
+        parser = NMEAParser()
+        fixes = []
+        for i in range(len(EPOCH)):
+            fixes += parser.Feed(EPOCH[i:i + 1])[0]
+        self.assertEqual(fixes, NMEAParser().Feed(EPOCH)[0])
+
+    def test_bad_checksum_is_rejected(self):
+        parser = NMEAParser()
+        corrupted = GGA.replace(b"545.4", b"545.5")
+        withoutChecksum = b"$GPVTG,084.4,T,,M,022.4,N,041.5,K,A\r\n"
+        fixes, rejected = parser.Feed(RMC + corrupted + withoutChecksum + GLL)
+        self.assertEqual([sentence for sentence, reason in rejected], [Text(corrupted), Text(withoutChecksum)])
+        self.assertEqual(parser.badChecksums, 2)
+        # The rest of the epoch still makes a fix, without the sentences which were rejected.
+        self.assertEqual(len(fixes), 1)
+        self.assertIsNone(fixes[0][6])
+        self.assertEqual(fixes[0][SENTENCES_START + 1:SENTENCES_START + 3], ["", ""])
+
+    def test_sentence_cut_short_is_dropped(self):
+        parser = NMEAParser()
+        fixes, rejected = parser.Feed(RMC + GGA[:30] + GSA + GLL)
+        self.assertEqual(rejected, [])
+        self.assertEqual(fixes[0][6], None)
+        self.assertEqual(fixes[0][SENTENCES_START + 3], Text(GSA))
+
+    def test_sentences_before_the_first_rmc_are_dropped(self):
+        parser = NMEAParser()
+        fixes, rejected = parser.Feed(GGA + GSV1 + GLL + RMC)
+        self.assertEqual((fixes, rejected), ([], []))
+        self.assertEqual(parser.orphans, 3)
+        # The next $GPRMC finishes the open epoch even though its $GPGLL was lost.
+        fixes = parser.Feed(RMC)[0]
+        self.assertEqual(len(fixes), 1)
+        self.assertEqual(fixes[0][SENTENCES_START:], [Text(RMC), "", "", "", "", ""])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Checks the PartitionManager sends each row to the partition of its day, keeps the catalog of partitions in the main database,
+finds the partitions which have expired or overlap a window from it, and reads a partition's rows through ATTACH.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Partition_Manager
+from Partition_Manager import PartitionManager, DAY, WEEK
+from Connection_Manager import ConnectionManager
+
+INSERT = "INSERT INTO readings(sensor_ID, timestamp, value) VALUES((?),(?),(?))"
+SCHEMA = ["CREATE TABLE IF NOT EXISTS readings(sensor_ID INTEGER, timestamp INTEGER, value REAL);"]
+# Thursday the 26th of September 2019 at midnight UTC.
+MIDNIGHT = 1569456000000
+
+
+class PartitionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        database = os.path.join(self.directory, "sensordata")
+        self.manager = ConnectionManager(database, profile={'journal_mode': 'WAL'}, checkpointInterval=0)
+        patcher = mock.patch.object(Partition_Manager, "manager", self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.partitions = PartitionManager(database, "day", {'journal_mode': 'WAL'}, SCHEMA)
+
+    def tearDown(self):
+        self.partitions.Close()
+        self.manager.Close()
+        shutil.rmtree(self.directory)
+
+    def Write(self, rows):
+        for start, groups in self.partitions.Split({INSERT: rows}).items():
+            with self.partitions.Writer(start) as conn:
+                for statement, partitionRows in groups.items():
+                    conn.executemany(statement, partitionRows)
+
+    def test_split_by_day(self):
+        rows = [(1, MIDNIGHT - 1, 1.0), (1, MIDNIGHT, 2.0), (2, MIDNIGHT + DAY - 1, 3.0), (1, MIDNIGHT + DAY, 4.0)]
+        self.assertEqual(self.partitions.Split({INSERT: rows}), {
+            MIDNIGHT - DAY: {INSERT: rows[:1]},
+            MIDNIGHT: {INSERT: rows[1:3]},
+            MIDNIGHT + DAY: {INSERT: rows[3:]}
+        })
+        self.assertEqual(os.path.basename(self.partitions.Path(MIDNIGHT)), "sensordata_20190926")
+
+    def test_weeks_start_on_monday(self):
+        weekly = PartitionManager("sensordata", "week", {}, SCHEMA)
+        # Monday the 23rd of September 2019.
+        self.assertEqual(weekly.Start(MIDNIGHT), MIDNIGHT - 3 * DAY)
+        self.assertEqual(weekly.Start(MIDNIGHT - 3 * DAY - 1), MIDNIGHT - 3 * DAY - WEEK)
+
+    def test_writes_are_catalogued_and_expire(self):
+        self.Write([(1, MIDNIGHT - 1, 1.0), (1, MIDNIGHT, 2.0), (1, MIDNIGHT + 1, 3.0)])
+        with self.manager.Reader() as conn:
+            catalog = conn.execute("SELECT path, startTime, endTime FROM Partitions ORDER BY startTime").fetchall()
+            self.assertEqual(catalog, [(self.partitions.Path(MIDNIGHT - DAY), MIDNIGHT - DAY, MIDNIGHT),
+                                       (self.partitions.Path(MIDNIGHT), MIDNIGHT, MIDNIGHT + DAY)])
+            # A partition has only expired once every reading it could hold is from before the cutoff.
+            self.assertEqual(self.partitions.Expired(conn, MIDNIGHT - 1), [])
+            self.assertEqual(self.partitions.Expired(conn, MIDNIGHT), [(self.partitions.Path(MIDNIGHT - DAY), MIDNIGHT - DAY)])
+            self.assertEqual(len(self.partitions.Expired(conn, MIDNIGHT + DAY)), 2)
+
+    def test_overlapping_partitions_are_read_through_attach(self):
+        self.Write([(1, MIDNIGHT - 1, 1.0), (1, MIDNIGHT, 2.0), (1, MIDNIGHT + DAY, 3.0)])
+        values = []
+        with self.manager.Reader() as conn:
+            paths = self.partitions.Overlapping(conn, MIDNIGHT - 1, MIDNIGHT + 1)
+            self.assertEqual(paths, [self.partitions.Path(MIDNIGHT - DAY), self.partitions.Path(MIDNIGHT)])
+            for path in paths:
+                with self.partitions.Attached(conn, path):
+                    values.extend(row[0] for row in conn.execute(
+                        "SELECT value FROM part.readings WHERE timestamp >= (?) AND timestamp < (?)", (MIDNIGHT - 1, MIDNIGHT + 1)))
+            self.assertEqual([row[1] for row in conn.execute("PRAGMA database_list")], ["main"])
+        self.assertEqual(values, [1.0, 2.0])
+
+    def test_release_closes_the_writer(self):
+        self.Write([(1, MIDNIGHT, 2.0)])
+        self.assertIn(MIDNIGHT, self.partitions.writers)
+        self.partitions.Release(MIDNIGHT)
+        self.assertNotIn(MIDNIGHT, self.partitions.writers)
+
+
+if __name__ == "__main__":
+    unittest.main()
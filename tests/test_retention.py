@@ -0,0 +1,109 @@
+"""
+Checks retention deletes expired rows a chunk at a time in transactions of their own, keeps rows from the cutoff on,
+and merges the rollups of an expired partition into the main database before removing the partition.
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Retention_Manager
+from Retention_Manager import RetentionEngine
+from Connection_Manager import ConnectionManager
+from SQL_queries import ROLLUP_UPSERT, schemaMigrations
+
+CUTOFF = 1000
+
+
+def Migrate(conn):
+    for migration in schemaMigrations:
+        migration.apply(conn)
+    conn.commit()
+
+
+class ChunkedDeleteTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        Migrate(self.conn)
+        self.transactions = 0
+        self.engine = RetentionEngine(chunkSize=3, vacuumPages=0, pause=0)
+
+    @contextmanager
+    def Writer(self):
+        self.transactions += 1
+        with self.conn:
+            yield self.conn
+
+    def test_expired_rows_are_deleted_in_chunks(self):
+        # Rows without a timestamp were written before the column existed, so go with the expired rows after them.
+        timestamps = [None, None, 10, 20, None, 30, 40, 50, CUTOFF, None, 20]
+        self.conn.executemany("INSERT INTO NTU(id, sensor_ID, timestamp) VALUES((?), 1, (?))", enumerate(timestamps, 1))
+        deleted = self.engine.DeleteExpired(self.Writer, "NTU", "id", CUTOFF, threading.Event())
+        self.assertEqual(deleted, 8)
+        self.assertEqual(self.transactions, 3)
+        # Deleting stops at the first row which is kept, even if older rows come after it.
+        self.assertEqual(self.conn.execute("SELECT id FROM NTU ORDER BY id").fetchall(), [(9,), (10,), (11,)])
+
+    def test_set_event_stops_between_chunks(self):
+        self.conn.executemany("INSERT INTO NTU(id, sensor_ID, timestamp) VALUES((?), 1, 1)", [(rowKey,) for rowKey in range(1, 10)])
+        event = threading.Event()
+        event.wait = lambda timeout=None: event.set()
+        self.assertEqual(self.engine.DeleteExpired(self.Writer, "NTU", "id", CUTOFF, event), 3)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM NTU").fetchone()[0], 6)
+
+    def test_nmea_blocks_and_staged_sentences_expire(self):
+        self.conn.executemany("INSERT INTO GPS_NMEA(sensor_ID, firstTimestamp, lastTimestamp, fixCount, dictionary, data) VALUES(1, (?), (?), 64, 1, x'')",
+                              [(timestamp, timestamp + 10) for timestamp in (0, 100, 200, 300, CUTOFF)])
+        self.conn.executemany("INSERT INTO GPS_NMEA_staged(sensor_ID, timestamp) VALUES(1, (?))", [(CUTOFF - 1,), (CUTOFF,)])
+        self.assertEqual(self.engine.DeleteNMEA(self.Writer, CUTOFF, threading.Event()), 4)
+        self.assertEqual(self.conn.execute("SELECT firstTimestamp FROM GPS_NMEA").fetchall(), [(CUTOFF,)])
+        self.assertEqual(self.conn.execute("SELECT timestamp FROM GPS_NMEA_staged").fetchall(), [(CUTOFF,)])
+
+
+class DropPartitionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manager = ConnectionManager(os.path.join(self.directory, "sensordata"), profile={'journal_mode': 'WAL'}, checkpointInterval=0)
+        self.partitions = mock.Mock()
+        for name, value in (("manager", self.manager), ("partitions", self.partitions)):
+            patcher = mock.patch.object(Retention_Manager, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.path = os.path.join(self.directory, "sensordata_20190926")
+        with self.manager.Writer() as conn:
+            Migrate(conn)
+            conn.execute("INSERT INTO Partitions VALUES((?), 0, 100)", (self.path,))
+            conn.execute(ROLLUP_UPSERT.format("hour"), ("NTU", 1, "NTU_Signal", 0, 2, 1.0, 3.0, 4.0, 3.0, 50))
+        part = sqlite3.connect(self.path)
+        Migrate(part)
+        part.executemany(ROLLUP_UPSERT.format("hour"), [("NTU", 1, "NTU_Signal", 0, 1, 0.5, 0.5, 0.5, 0.5, 20),
+                                                        ("NTU", 1, "NTU_Signal", 3600000, 1, 7.0, 7.0, 7.0, 7.0, 3600001)])
+        part.commit()
+        part.close()
+
+    def tearDown(self):
+        self.manager.Close()
+        shutil.rmtree(self.directory)
+
+    def test_rollups_are_merged_before_the_partition_goes(self):
+        RetentionEngine().DropPartition(self.path, 0)
+        self.partitions.Release.assert_called_once_with(0)
+        self.assertFalse(os.path.exists(self.path))
+        with self.manager.Reader() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM Partitions").fetchone()[0], 0)
+            self.assertEqual(conn.execute("SELECT bucket, count, min, max, sum, last, lastTimestamp FROM Rollup_hour ORDER BY bucket").fetchall(),
+                             [(0, 3, 0.5, 3.0, 4.5, 3.0, 50), (3600000, 1, 7.0, 7.0, 7.0, 7.0, 3600001)])
+
+
+if __name__ == "__main__":
+    unittest.main()
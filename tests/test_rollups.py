@@ -0,0 +1,62 @@
+"""
+Checks the minute and hour rollups of the rows being inserted: a batch is aggregated into one row per bucket, split where it crosses a bucket boundary,
+and a later batch is merged into the buckets already stored, keeping the last value by timestamp rather than by when it arrived.
+"""
+
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SQL_queries import NTU_INSERT, Rollup_upsert, schemaMigrations
+
+MINUTE = 60 * 1000
+HOUR = 60 * MINUTE
+# The start of an hour, so the minute and hour buckets line up.
+START = 1569456000000
+
+
+def NTURow(timestamp, signal, thermistor=20.0):
+    return (2, timestamp, "", "", 700, signal, thermistor)
+
+
+class RollupTests(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        for migration in schemaMigrations:
+            migration.apply(self.conn)
+
+    def Buckets(self, resolution, channel="NTU_Signal"):
+        return self.conn.execute("SELECT bucket, count, min, max, sum, last, lastTimestamp FROM Rollup_{} "
+                                 "WHERE tableName = 'NTU' AND sensor_ID = 2 AND channel = (?) ORDER BY bucket".format(resolution), (channel,)).fetchall()
+
+    def test_batch_across_a_minute_boundary(self):
+        Rollup_upsert(self.conn, {NTU_INSERT: [NTURow(START + MINUTE - 2000, 5), NTURow(START + MINUTE - 1, 1),
+                                               NTURow(START + MINUTE, 7), NTURow(START + MINUTE + 1000, 3)]})
+        self.assertEqual(self.Buckets("minute"), [
+            (START, 2, 1.0, 5.0, 6.0, 1.0, START + MINUTE - 1),
+            (START + MINUTE, 2, 3.0, 7.0, 10.0, 3.0, START + MINUTE + 1000)
+        ])
+        self.assertEqual(self.Buckets("hour"), [(START, 4, 1.0, 7.0, 16.0, 3.0, START + MINUTE + 1000)])
+        self.assertEqual(self.Buckets("hour", "Thermistor"), [(START, 4, 20.0, 20.0, 80.0, 20.0, START + MINUTE + 1000)])
+
+    def test_later_batches_merge_into_stored_buckets(self):
+        Rollup_upsert(self.conn, {NTU_INSERT: [NTURow(START + 1000, 4), NTURow(START + 5000, 6)]})
+        # A reading arriving late keeps the last value of the bucket, a newer one replaces it.
+        Rollup_upsert(self.conn, {NTU_INSERT: [NTURow(START + 2000, -1)]})
+        self.assertEqual(self.Buckets("minute"), [(START, 3, -1.0, 6.0, 9.0, 6.0, START + 5000)])
+        Rollup_upsert(self.conn, {NTU_INSERT: [NTURow(START + 6000, 10), NTURow(START + HOUR, 2)]})
+        self.assertEqual(self.Buckets("minute"), [(START, 4, -1.0, 10.0, 19.0, 10.0, START + 6000), (START + HOUR, 1, 2.0, 2.0, 2.0, 2.0, START + HOUR)])
+        self.assertEqual(self.Buckets("hour"), [(START, 4, -1.0, 10.0, 19.0, 10.0, START + 6000), (START + HOUR, 1, 2.0, 2.0, 2.0, 2.0, START + HOUR)])
+
+    def test_values_which_are_not_numbers_are_left_out(self):
+        Rollup_upsert(self.conn, {NTU_INSERT: [NTURow(START, "", 21.5), NTURow(START + 1000, 8, None)]})
+        self.assertEqual(self.Buckets("minute"), [(START, 1, 8.0, 8.0, 8.0, 8.0, START + 1000)])
+        self.assertEqual(self.Buckets("minute", "Thermistor"), [(START, 1, 21.5, 21.5, 21.5, 21.5, START)])
+
+
+if __name__ == "__main__":
+    unittest.main()
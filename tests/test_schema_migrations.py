@@ -0,0 +1,38 @@
+"""
+Checks the schema migrations, each run from the statements frozen inside it, bring a new database to the tables of SQLSchema.
+"""
+
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SQL_queries import SQLSchema, schemaMigrations
+
+
+def Tables(conn):
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    return {name: [column[1:3] for column in conn.execute("PRAGMA table_info({})".format(name))] for name in names}
+
+
+class SchemaMigrationTests(unittest.TestCase):
+
+    def test_migrations_make_the_current_tables(self):
+        migrated = sqlite3.connect(":memory:")
+        for migration in schemaMigrations:
+            migration.apply(migrated)
+        current = sqlite3.connect(":memory:")
+        for table, statement in SQLSchema:
+            current.execute(statement)
+        migratedTables = Tables(migrated)
+        for table, columns in Tables(current).items():
+            self.assertEqual(migratedTables.get(table), columns, table)
+
+    def test_versions_count_up(self):
+        self.assertEqual([migration.version for migration in schemaMigrations], list(range(1, len(schemaMigrations) + 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Checks a SensorBatch gives back exactly the readings packed into it, and that the batch read when a sensor is started reaches the pipeline.
+"""
+
+import os
+import sys
+import queue
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Sensor_Record import SensorRecord, SensorBatch
+from Sensor_Manager import StartSensor
+
+
+def Readings(records):
+    return [(record.sensorType, record.sensorID, record.values, record.timestamp) for record in records]
+
+
+class SensorBatchTests(unittest.TestCase):
+
+    def test_records_come_back_as_they_went_in(self):
+        records = [
+            SensorRecord("BB9", 3, ("WETA", "BB90001", 21, 412, 186, "10b7"), 1000),
+            SensorRecord("BB9", 3, ("WETA", "BB90001", 22, 413, 187, "10b9"), 1001),
+            SensorRecord("Quarantine", 3, ("BB9", "WETA\tbad line", "checksum does not match"), 1002),
+            SensorRecord("GPS_UBLOX7", 3, ("123519", "230394", -48.1173, "S", 11.5167, "E", None, "$GPRMC,..."), 1003),
+            SensorRecord("BB9", 3, (2 ** 70, -2 ** 63, 1.5, True), 1004),
+        ]
+        batch = SensorBatch("BB9", 3, records)
+        self.assertEqual(batch.Count(), len(records))
+        self.assertEqual(Readings(batch.Records()), Readings(records))
+
+    def test_added_records_follow_the_first(self):
+        batch = SensorBatch("BB3", 1, [])
+        self.assertEqual(batch.Records(), [])
+        batch.Add(SensorRecord("BB3", 1, (1, 2.5, "x"), 7))
+        batch.Add(SensorRecord("BB3", 1, (2, 3.5, "y"), 8))
+        self.assertEqual(Readings(batch.Records()), [("BB3", 1, (1, 2.5, "x"), 7), ("BB3", 1, (2, 3.5, "y"), 8)])
+
+
+class BatchSensor(object):
+    """
+    A driver whose batch reader yields the batches it was given, then keeps yielding None.
+    """
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def BatchReading(self):
+        for batch in self.batches:
+            yield batch
+        while True:
+            yield None
+
+
+class RecordingSupervisor(object):
+    """
+    Keeps the threads it is asked to start instead of starting them.
+    """
+
+    def __init__(self):
+        self.endEvent = threading.Event()
+        self.submitted = []
+
+    def Submit(self, name, function, *args):
+        self.submitted.append((name, args))
+
+
+class StartSensorTests(unittest.TestCase):
+
+    def Start(self, batches):
+        pipeline = queue.Queue()
+        supervisor = RecordingSupervisor()
+        StartSensor(supervisor, pipeline, "threads", [], BatchSensor(batches), [4, "BB9"])
+        return pipeline, supervisor
+
+    def test_first_batch_reaches_the_pipeline(self):
+        first = SensorBatch("BB9", 4, [SensorRecord("BB9", 4, ("WETA", 1), 1000)])
+        second = SensorBatch("BB9", 4, [SensorRecord("BB9", 4, ("WETA", 2), 1001)])
+        pipeline, supervisor = self.Start([first, second])
+        self.assertIs(pipeline.get_nowait(), first)
+        self.assertTrue(pipeline.empty())
+        self.assertEqual(supervisor.submitted[0][0], "BB9 ID:4")
+        # The thread carries on from the batch after the first.
+        self.assertIs(next(supervisor.submitted[0][1][2]), second)
+
+    def test_idle_first_read_puts_nothing(self):
+        pipeline, supervisor = self.Start([None])
+        self.assertTrue(pipeline.empty())
+        self.assertEqual(len(supervisor.submitted), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Checks the SensorRegistry only reads the Sensors table again after it has been changed: straight away for changes made
+through Sensors_insert and Sensors_Update in this process, and within recheckInterval for changes another process made.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SQL_queries
+from SQL_queries import Sensors_insert, Sensors_Update, schemaMigrations
+from Sensor_Registry import SensorRegistry
+from Connection_Manager import ConnectionManager
+
+
+class CountingManager(object):
+    """
+    Passes readers through from a ConnectionManager, counting how many are borrowed.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.reads = 0
+
+    @contextmanager
+    def Reader(self):
+        self.reads += 1
+        with self.manager.Reader() as conn:
+            yield conn
+
+
+class SensorRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manager = ConnectionManager(os.path.join(self.directory, "sensordata"), profile={'journal_mode': 'WAL'}, checkpointInterval=0)
+        with self.manager.Writer() as conn:
+            for migration in schemaMigrations:
+                migration.apply(conn)
+            conn.execute("INSERT INTO Sensors(sensorType, port, uniqueName) VALUES('BB9', 'ttyUSB0', 'first')")
+        self.counter = CountingManager(self.manager)
+        self.registry = SensorRegistry(self.counter, recheckInterval=3600)
+        for name, value in (("manager", self.manager), ("sensorRegistry", self.registry)):
+            patcher = mock.patch.object(SQL_queries, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.manager.Close()
+        shutil.rmtree(self.directory)
+
+    def test_lookups_share_one_load(self):
+        self.assertEqual(self.registry.ByUniqueName("first"), (1, "BB9", "ttyUSB0", "first"))
+        self.assertEqual(self.registry.ByType("BB9"), [(1, "BB9", "ttyUSB0", "first")])
+        self.assertEqual(self.registry.ByPort("ttyUSB0"), [(1, "BB9", "ttyUSB0", "first")])
+        self.assertIsNone(self.registry.ByID(2))
+        self.assertEqual(self.counter.reads, 1)
+
+    def test_changes_through_this_process_are_seen_straight_away(self):
+        self.registry.All()
+        Sensors_insert("NTU", "ttyUSB1", "second")
+        self.assertEqual(self.registry.ByID(2), (2, "NTU", "ttyUSB1", "second"))
+        Sensors_Update("ttyACM0", 2)
+        self.assertEqual(self.registry.ByPort("ttyACM0"), [(2, "NTU", "ttyACM0", "second")])
+        self.assertEqual(self.registry.ByPort("ttyUSB1"), [])
+        reads = self.counter.reads
+        # Moving a sensor to the port it is already on changes nothing, so the table isn't read again.
+        Sensors_Update("ttyACM0", 2)
+        self.registry.All()
+        self.assertEqual(self.counter.reads, reads)
+
+    def test_changes_by_another_process_are_seen_after_the_recheck(self):
+        other = SensorRegistry(self.counter, recheckInterval=0)
+        self.assertEqual(len(other.All()), 1)
+        self.assertEqual(len(self.registry.All()), 1)
+        Sensors_insert("NTU", "ttyUSB1", "second")
+        self.assertEqual(len(other.All()), 2)
+        self.assertEqual(other.generation, 1)
+        # Rechecking the generation when nothing has changed borrows a reader, but keeps the rows already loaded.
+        rows = other.rows
+        reads = self.counter.reads
+        other.All()
+        self.assertIs(other.rows, rows)
+        self.assertEqual(self.counter.reads, reads + 1)
+
+    def test_generation_is_only_rechecked_after_the_interval(self):
+        other = SensorRegistry(self.counter, recheckInterval=3600)
+        other.All()
+        with self.manager.Writer() as conn:
+            conn.execute("INSERT INTO Sensors(sensorType, port, uniqueName) VALUES('NTU', 'ttyUSB1', 'second')")
+            conn.execute("UPDATE SensorsGeneration SET generation = generation + 1")
+        self.assertEqual(len(other.All()), 1)
+        other.lastCheck -= 3600
+        self.assertEqual(len(other.All()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Checks the sensor manager stops promptly when asked, even while a sensor is sending nothing,
+that the supervisor starts every task it is given, and that it gives up on threads which won't stop.
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BBX_Sensors import BBX, ReadChunks
+from Sensor_Manager import Supervisor, SensorThreader, StopAndWait
+
+
+class IdlePort(object):
+    """
+    A serial port with a sensor that sends nothing, so every read waits for the timeout and comes back empty.
+    """
+    in_waiting = 0
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def read(self, size=1):
+        time.sleep(self.timeout)
+        return b""
+
+
+class IdleSensor(BBX):
+    sensorType = "NTU"
+
+    def OpenPort(self, timeout=None):
+        return IdlePort(0.05)
+
+
+class IdleSensorTests(unittest.TestCase):
+
+    def test_read_chunks_yields_on_timeout(self):
+        self.assertEqual(next(ReadChunks(IdlePort(0.01))), b"")
+
+    def test_blocking_reading_yields_none_when_idle(self):
+        self.assertIsNone(next(IdleSensor("ttyUSB0", "blocking").BatchReading()))
+
+    def StopWithIdleSensor(self, readMode):
+        # Returns how long the supervisor took to finish after being stopped.
+        supervisor = Supervisor()
+        sensor = IdleSensor("ttyUSB0", readMode).BatchReading()
+        supervisor.Submit("NTU ID:1", SensorThreader("NTU").sensorThread, queue.Queue(), supervisor.endEvent, sensor, "NTU", 1)
+        runner = threading.Thread(target=supervisor.Run)
+        runner.start()
+        time.sleep(0.2)
+        startTime = time.monotonic()
+        supervisor.Stop()
+        runner.join(5)
+        self.assertFalse(runner.is_alive(), "supervisor still running 5s after Stop with an idle {} sensor".format(readMode))
+        return time.monotonic() - startTime
+
+    def test_supervisor_stops_with_idle_blocking_sensor(self):
+        self.assertLess(self.StopWithIdleSensor("blocking"), 1)
+
+    def test_supervisor_stops_with_idle_polling_sensor(self):
+        # A polling sensor checks its port once a second to begin with.
+        self.assertLess(self.StopWithIdleSensor("poll"), 2)
+
+
+class SupervisorTests(unittest.TestCase):
+
+    def test_every_task_starts(self):
+        # More long lived tasks than a default thread pool has workers for on a Raspberry Pi.
+        supervisor = Supervisor()
+        started = threading.Semaphore(0)
+
+        def Task(event):
+            started.release()
+            event.wait()
+
+        for task in range(40):
+            supervisor.Submit("Task {}".format(task), Task, supervisor.endEvent)
+        try:
+            for task in range(40):
+                self.assertTrue(started.acquire(timeout=5), "only {} of 40 tasks started".format(task))
+        finally:
+            supervisor.Stop()
+            supervisor.Run()
+        self.assertEqual(set(state for name, state in supervisor.ThreadStates()), {"finished"})
+
+    def test_run_gives_up_on_stuck_threads(self):
+        supervisor = Supervisor(stopTimeout=0.2)
+        release = threading.Event()
+        supervisor.Submit("Stuck", release.wait)
+        supervisor.Stop()
+        startTime = time.monotonic()
+        supervisor.Run()
+        release.set()
+        self.assertLess(time.monotonic() - startTime, 2)
+
+
+class StopAndWaitTests(unittest.TestCase):
+    """
+    The signal handler in ProgramController stops the sensor manager with StopAndWait.
+    """
+
+    def test_stops_with_idle_sensor(self):
+        supervisor = Supervisor()
+        sensor = IdleSensor("ttyUSB0", "blocking").BatchReading()
+        supervisor.Submit("NTU ID:1", SensorThreader("NTU").sensorThread, queue.Queue(), supervisor.endEvent, sensor, "NTU", 1)
+        mainThread = threading.Thread(target=supervisor.Run)
+        mainThread.start()
+        time.sleep(0.2)
+        self.assertTrue(StopAndWait(supervisor, mainThread, 5))
+
+    def test_gives_up_after_timeout(self):
+        supervisor = Supervisor()
+        release = threading.Event()
+        mainThread = threading.Thread(target=release.wait, daemon=True)
+        mainThread.start()
+        startTime = time.monotonic()
+        self.assertFalse(StopAndWait(supervisor, mainThread, 0.2))
+        self.assertLess(time.monotonic() - startTime, 2)
+        release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+Checks Stream_select's keyset pagination hands back every row once, in order, when chunks end in the middle of rows sharing a timestamp.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SQL_queries
+from SQL_queries import Stream_select, schemaMigrations
+from Connection_Manager import ConnectionManager
+from Partition_Manager import PartitionManager
+
+
+class StreamSelectTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        database = os.path.join(self.directory, "sensordata")
+        self.manager = ConnectionManager(database, profile={'journal_mode': 'WAL'}, checkpointInterval=0)
+        for name, value in (("manager", self.manager), ("partitions", PartitionManager(database, "none", {}, []))):
+            patcher = mock.patch.object(SQL_queries, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Sensor 1 sends bursts of readings with the same timestamp, written out of time order, and sensor 2 is interleaved with it.
+        timestamps = [30, 10, 10, 10, 20, 20, 10, 30, 30, 20]
+        self.rows = [(rowKey, 1 + rowKey % 2, timestamp) for rowKey, timestamp in enumerate(timestamps, 1)]
+        with self.manager.Writer() as conn:
+            for migration in schemaMigrations:
+                migration.apply(conn)
+            conn.executemany("INSERT INTO NTU(id, sensor_ID, timestamp) VALUES((?),(?),(?))", self.rows)
+
+    def tearDown(self):
+        self.manager.Close()
+        shutil.rmtree(self.directory)
+
+    def test_equal_timestamps_across_chunks(self):
+        expected = sorted([row for row in self.rows if 10 <= row[2] < 30], key=lambda row: (row[2], row[0]))
+        for chunkSize in range(1, len(self.rows) + 2):
+            rows = list(Stream_select("NTU", "id, sensor_ID, timestamp", start=10, end=30, chunkSize=chunkSize))
+            self.assertEqual(rows, expected, "chunkSize {}".format(chunkSize))
+
+    def test_one_sensor_in_time_order(self):
+        expected = sorted([row for row in self.rows if row[1] == 1], key=lambda row: (row[2], row[0]))
+        self.assertEqual(list(Stream_select("NTU", "id, sensor_ID, timestamp", sensorID=1, start=0, chunkSize=2)), expected)
+
+    def test_without_a_window_rows_come_in_the_order_written(self):
+        self.assertEqual(list(Stream_select("NTU", "id, sensor_ID, timestamp", chunkSize=3)), self.rows)
+
+    def test_only_sensor_tables(self):
+        self.assertRaises(ValueError, list, Stream_select("Sensors"))
+
+
+if __name__ == "__main__":
+    unittest.main()